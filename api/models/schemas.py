@@ -32,12 +32,23 @@ class FileStats(BaseModel):
     size_kb: float = Field(..., description="File size in KB")
     non_empty_lines: Optional[int] = Field(None, description="Number of non-empty lines")
 
+class ChunkInfo(BaseModel):
+    """One section of a large file explained separately"""
+    name: str = Field(..., description="Definition name(s) covered by the chunk")
+    kind: str = Field(..., description="Chunk kind (function, class, group, ...)")
+    start_line: int = Field(..., description="First line of the chunk")
+    end_line: int = Field(..., description="Last line of the chunk")
+    cached: bool = Field(False, description="Whether the chunk explanation came from cache")
+    status: Optional[str] = Field(None, description="added, changed or unchanged since the session's last request")
+
 class ExplanationResponse(BaseModel):
     """Response model for code explanations"""
     explanation: str = Field(..., description="Generated explanation")
     filename: Optional[str] = Field(None, description="Original filename if from file")
     detected_language: Optional[str] = Field(None, description="Detected programming language")
     file_stats: Optional[FileStats] = Field(None, description="File statistics")
+    chunks: Optional[List[ChunkInfo]] = Field(None, description="Sections explained separately for large files")
+    removed_chunks: Optional[List[str]] = Field(None, description="Definitions removed since the session's last request")
     processing_time: Optional[float] = Field(None, description="Processing time in seconds")
 
 class CodeGenerationResponse(BaseModel):
@@ -55,6 +66,7 @@ class BatchExplanationResult(BaseModel):
     detected_language: Optional[str] = Field(None, description="Detected language")
     explanation: Optional[str] = Field(None, description="Generated explanation")
     file_stats: Optional[FileStats] = Field(None, description="File statistics")
+    chunks: Optional[List[ChunkInfo]] = Field(None, description="Sections explained separately for large files")
     error: Optional[str] = Field(None, description="Error message if failed")
 
 class BatchExplanationResponse(BaseModel):
@@ -77,6 +89,35 @@ class APIResponse(BaseModel):
     error: Optional[str] = Field(None, description="Error message if failed")
     timestamp: Optional[str] = Field(None, description="Response timestamp")
 
+class LessonResponse(BaseModel):
+    """Response model for learning mode"""
+    lesson: str = Field(..., description="Generated lesson")
+    context: List[Dict[str, Any]] = Field(..., description="Session context after this lesson")
+    context_stats: Dict[str, int] = Field(..., description="Token accounting for the context sent")
+
+# Endpoint-specific envelopes: routes build `data` as the typed model, so it is
+# accepted as-is instead of being tried against every member of APIResponse's
+# union. `data` is still {} when a request fails.
+class ExplainAPIResponse(APIResponse):
+    data: Union[ExplanationResponse, Dict[str, Any]] = Field(
+        ..., union_mode="left_to_right", description="Response data"
+    )
+
+class BatchExplainAPIResponse(APIResponse):
+    data: Union[BatchExplanationResponse, Dict[str, Any]] = Field(
+        ..., union_mode="left_to_right", description="Response data"
+    )
+
+class GenerateAPIResponse(APIResponse):
+    data: Union[CodeGenerationResponse, Dict[str, Any]] = Field(
+        ..., union_mode="left_to_right", description="Response data"
+    )
+
+class LearnAPIResponse(APIResponse):
+    data: Union[LessonResponse, Dict[str, Any]] = Field(
+        ..., union_mode="left_to_right", description="Response data"
+    )
+
 class FollowUpRequest(BaseModel):
     """Request model for follow-up questions"""
     question: str = Field(..., description="Follow-up question about the code")
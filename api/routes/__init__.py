@@ -1 +1 @@
-from . import explain, generate, learn
\ No newline at end of file
+from . import explain, generate, learn, jobs
\ No newline at end of file
@@ -1,10 +1,23 @@
 from fastapi import APIRouter, Depends, File, UploadFile, Form, HTTPException
-from fastapi.responses import JSONResponse
 from typing import Optional, List
+import asyncio
 import os
 import tempfile
-from api.models.schemas import ExplainRequest, APIResponse
-from api.services.llm_provider import LLMProvider, get_provider
+import time
+from api.models.schemas import (
+    BatchExplainAPIResponse, BatchExplanationResponse, BatchExplanationResult,
+    ExplainAPIResponse, ExplainRequest, ExplanationResponse, FileExplainRequest, FileStats
+)
+from api.services.chunking import definition_segments
+from api.services.explainer import (
+    explain_chunked, explain_incremental, needs_chunking
+)
+from api.services import tracing
+from api.services.llm_provider import get_router
+from api.services.routing import ProviderRouter
+from api.services.serialization import FastJSONResponse
+from api.services.streaming import sse_response
+from api.services.tiering import classify_request
 
 router = APIRouter()
 
@@ -12,6 +25,7 @@ router = APIRouter()
 ALLOWED_EXTENSIONS = {'.py', '.js', '.cpp', '.c', '.java', '.html', '.css', '.go', 
                      '.sql', '.rb', '.rs', '.php', '.ts', '.jsx', '.tsx'}
 MAX_FILE_SIZE = 500 * 1024  # 500KB
+BATCH_CONCURRENCY = int(os.getenv("EXPLAIN_BATCH_CONCURRENCY", "5"))
 
 def validate_uploaded_file(file: UploadFile) -> bool:
     """Validate uploaded file"""
@@ -48,10 +62,9 @@ def detect_language_from_filename(filename: str) -> str:
     }
     return language_map.get(ext, 'python')
 
-@router.post("/explain", response_model=APIResponse)
-async def explain_code(request: ExplainRequest, provider: LLMProvider = Depends(get_provider)):
-    """Original explain endpoint for direct code input"""
-    messages = [
+def build_explain_messages(request: ExplainRequest) -> list:
+    """Prompt for direct code explanation, shared by the plain and streaming routes"""
+    return [
         {"role": "system", "content": "You are a coding expert who explains code clearly and concisely."},
         {"role": "user", "content": f"""
             Explain this {request.language} code:
@@ -63,26 +76,89 @@ async def explain_code(request: ExplainRequest, provider: LLMProvider = Depends(
             {'Include examples' if request.include_examples else 'No examples needed'}
         """}
     ]
+
+def build_file_explain_messages(
+    code_content: str,
+    filename: str,
+    detected_language: str,
+    difficulty: str,
+    focus_areas_list: List[str],
+    line_by_line: bool,
+    include_examples: bool
+) -> list:
+    """Prompt for explaining an uploaded file in one call"""
+    return [
+        {"role": "system", "content": "You are a coding expert who explains code clearly and concisely."},
+        {"role": "user", "content": f"""
+            Explain this {detected_language} code from file '{filename}':
+            
+            {code_content}
+            
+            Difficulty level: {difficulty}
+            Focus areas: {', '.join(focus_areas_list)}
+            {'Explain line by line' if line_by_line else 'Provide overview'}
+            {'Include examples' if include_examples else 'No examples needed'}
+            
+            Please provide a comprehensive explanation that covers the code's purpose, 
+            key components, and any notable patterns or techniques used.
+        """}
+    ]
+
+@router.post("/explain", response_model=ExplainAPIResponse)
+async def explain_code(
+    request: ExplainRequest,
+    provider: ProviderRouter = Depends(get_router),
+    session_id: str = None
+):
+    """Original explain endpoint for direct code input"""
+    tracing.mark_parsed(code_chars=len(request.code))
+    decision = classify_request("explain", request.code, request.difficulty, request.focus_areas)
+    provider = provider.using(request.provider, tier=decision.tier)
+    segments = definition_segments(request.code, request.language) if session_id else []
+    if len(segments) > 1:
+        # Definitions are explained one by one so later edits only re-explain what changed
+        try:
+            data = await explain_incremental(provider, segments, request, session_id)
+            return ExplainAPIResponse(success=True, data=ExplanationResponse(**data), error=None)
+        except Exception as e:
+            return ExplainAPIResponse(success=False, data={}, error=str(e))
+
+    with tracing.span("prompt.build"):
+        messages = build_explain_messages(request)
     try:
-        response = await provider.generate_completion(messages)
-        return APIResponse(
-            success=True,
-            data={"explanation": response["choices"][0]["message"]["content"]},
-            error=None
-        )
+        response = await provider.generate_completion(messages, max_tokens=decision.max_tokens)
+        with tracing.span("response.validate"):
+            return ExplainAPIResponse(
+                success=True,
+                data=ExplanationResponse(explanation=response["choices"][0]["message"]["content"]),
+                error=None
+            )
     except Exception as e:
-        return APIResponse(success=False, data={}, error=str(e))
+        return ExplainAPIResponse(success=False, data={}, error=str(e))
+
+@router.post("/explain/stream")
+async def explain_code_stream(request: ExplainRequest, provider: ProviderRouter = Depends(get_router)):
+    """Explain code, relaying tokens as Server-Sent Events"""
+    decision = classify_request("explain", request.code, request.difficulty, request.focus_areas)
+    provider = provider.using(request.provider, tier=decision.tier)
+    messages = build_explain_messages(request)
+    return sse_response(
+        provider.stream_completion(messages, max_tokens=decision.max_tokens),
+        lambda content: ExplanationResponse(explanation=content).model_dump(mode="json")
+    )
 
-@router.post("/explain/file", response_model=APIResponse)
+@router.post("/explain/file", response_model=ExplainAPIResponse)
 async def explain_code_from_file(
     file: UploadFile = File(...),
     difficulty: Optional[str] = Form("intermediate"),
     focus_areas: Optional[str] = Form("Logic Flow"),
     line_by_line: Optional[bool] = Form(False),
     include_examples: Optional[bool] = Form(True),
-    provider: LLMProvider = Depends(get_provider)
+    provider: ProviderRouter = Depends(get_router)
 ):
     """Enhanced explain endpoint that accepts file uploads"""
+    # Multipart parsing happens in the framework before this handler runs
+    tracing.mark_parsed(filename=file.filename)
     
     # Validate file
     if not validate_uploaded_file(file):
@@ -94,7 +170,9 @@ async def explain_code_from_file(
     
     try:
         # Read file content
-        content = await file.read()
+        with tracing.span("file.read") as read_span:
+            content = await file.read()
+            read_span.set(bytes=len(content))
         
         # Check file size
         if len(content) > MAX_FILE_SIZE:
@@ -104,16 +182,19 @@ async def explain_code_from_file(
             )
         
         # Decode content
-        try:
-            code_content = content.decode('utf-8')
-        except UnicodeDecodeError:
+        with tracing.span("file.decode") as decode_span:
             try:
-                code_content = content.decode('latin-1')
+                code_content = content.decode('utf-8')
+                decode_span.set(encoding="utf-8")
             except UnicodeDecodeError:
-                raise HTTPException(
-                    status_code=400,
-                    detail="Could not decode file. Please ensure it's a valid text file."
-                )
+                try:
+                    code_content = content.decode('latin-1')
+                    decode_span.set(encoding="latin-1")
+                except UnicodeDecodeError:
+                    raise HTTPException(
+                        status_code=400,
+                        detail="Could not decode file. Please ensure it's a valid text file."
+                    )
         
         # Detect language from filename
         detected_language = detect_language_from_filename(file.filename)
@@ -121,155 +202,190 @@ async def explain_code_from_file(
         # Parse focus areas (comma-separated string to list)
         focus_areas_list = [area.strip() for area in focus_areas.split(",") if area.strip()]
         
-        # Create explanation prompt
-        messages = [
-            {"role": "system", "content": "You are a coding expert who explains code clearly and concisely."},
-            {"role": "user", "content": f"""
-                Explain this {detected_language} code from file '{file.filename}':
-                
-                {code_content}
-                
-                Difficulty level: {difficulty}
-                Focus areas: {', '.join(focus_areas_list)}
-                {'Explain line by line' if line_by_line else 'Provide overview'}
-                {'Include examples' if include_examples else 'No examples needed'}
-                
-                Please provide a comprehensive explanation that covers the code's purpose, 
-                key components, and any notable patterns or techniques used.
-            """}
-        ]
-        
-        # Get explanation from LLM
-        response = await provider.generate_completion(messages)
-        explanation = response["choices"][0]["message"]["content"]
+        chunks = None
+        if needs_chunking(code_content):
+            # Large files: explain definition-sized chunks, then merge
+            result = await explain_chunked(provider, code_content, FileExplainRequest(
+                filename=file.filename,
+                detected_language=detected_language,
+                difficulty=difficulty,
+                focus_areas=focus_areas_list,
+                line_by_line=line_by_line,
+                include_examples=include_examples
+            ))
+            explanation, chunks = result["explanation"], result["chunks"]
+        else:
+            # Create explanation prompt
+            with tracing.span("prompt.build"):
+                messages = build_file_explain_messages(
+                    code_content, file.filename, detected_language, difficulty,
+                    focus_areas_list, line_by_line, include_examples
+                )
+            
+            # Get explanation from LLM
+            decision = classify_request("explain", code_content, difficulty, focus_areas_list)
+            response = await provider.using(tier=decision.tier).generate_completion(
+                messages, max_tokens=decision.max_tokens
+            )
+            explanation = response["choices"][0]["message"]["content"]
         
-        return APIResponse(
-            success=True,
-            data={
-                "explanation": explanation,
-                "filename": file.filename,
-                "detected_language": detected_language,
-                "file_stats": {
-                    "lines": len(code_content.split('\n')),
-                    "characters": len(code_content),
-                    "size_kb": round(len(content) / 1024, 2)
-                }
-            },
-            error=None
-        )
+        with tracing.span("response.validate"):
+            return ExplainAPIResponse(
+                success=True,
+                data=ExplanationResponse(
+                    explanation=explanation,
+                    filename=file.filename,
+                    detected_language=detected_language,
+                    file_stats=FileStats(
+                        lines=len(code_content.split('\n')),
+                        characters=len(code_content),
+                        size_kb=round(len(content) / 1024, 2)
+                    ),
+                    chunks=chunks
+                ),
+                error=None
+            )
         
     except HTTPException:
         raise
     except Exception as e:
-        return APIResponse(
+        return ExplainAPIResponse(
             success=False, 
             data={}, 
             error=f"Error processing file: {str(e)}"
         )
 
-@router.post("/explain/batch", response_model=APIResponse)
-async def explain_multiple_files(
-    files: List[UploadFile] = File(...),
-    difficulty: Optional[str] = Form("intermediate"),
-    focus_areas: Optional[str] = Form("Logic Flow"),
-    provider: LLMProvider = Depends(get_provider)
-):
-    """Explain multiple code files at once"""
-    
-    if len(files) > 5:  # Limit to 5 files max
-        raise HTTPException(
-            status_code=400,
-            detail="Maximum 5 files allowed per batch"
-        )
-    
-    results = []
-    
-    for file in files:
+async def _explain_batch_file(
+    file: UploadFile,
+    focus_areas_list: List[str],
+    provider: ProviderRouter,
+    semaphore: asyncio.Semaphore
+) -> BatchExplanationResult:
+    """Validate, decode and explain a single batch file, isolating its failures"""
+    async with semaphore:
         try:
             # Validate file
             if not validate_uploaded_file(file):
-                results.append({
-                    "filename": file.filename,
-                    "success": False,
-                    "error": "Invalid file type or size"
-                })
-                continue
+                return BatchExplanationResult(
+                    filename=file.filename,
+                    success=False,
+                    error="Invalid file type or size"
+                )
             
             # Read and process file
             content = await file.read()
             
             if len(content) > MAX_FILE_SIZE:
-                results.append({
-                    "filename": file.filename,
-                    "success": False,
-                    "error": f"File too large (max {MAX_FILE_SIZE // 1024}KB)"
-                })
-                continue
+                return BatchExplanationResult(
+                    filename=file.filename,
+                    success=False,
+                    error=f"File too large (max {MAX_FILE_SIZE // 1024}KB)"
+                )
             
             # Decode content
             try:
                 code_content = content.decode('utf-8')
             except UnicodeDecodeError:
-                results.append({
-                    "filename": file.filename,
-                    "success": False,
-                    "error": "Could not decode file"
-                })
-                continue
+                return BatchExplanationResult(
+                    filename=file.filename,
+                    success=False,
+                    error="Could not decode file"
+                )
             
             # Detect language and get explanation
             detected_language = detect_language_from_filename(file.filename)
-            focus_areas_list = [area.strip() for area in focus_areas.split(",")]
             
-            # Create concise explanation for batch processing
-            messages = [
-                {"role": "system", "content": "You are a coding expert. Provide concise but informative code explanations."},
-                {"role": "user", "content": f"""
-                    Briefly explain this {detected_language} code from '{file.filename}':
-                    
-                    {code_content[:2000]}{"..." if len(code_content) > 2000 else ""}
-                    
-                    Focus on: {', '.join(focus_areas_list)}
-                    Keep the explanation concise but informative.
-                """}
-            ]
-            
-            response = await provider.generate_completion(messages)
-            explanation = response["choices"][0]["message"]["content"]
+            chunks = None
+            if needs_chunking(code_content):
+                # Large files are chunked and merged instead of truncated
+                result = await explain_chunked(provider, code_content, FileExplainRequest(
+                    filename=file.filename,
+                    detected_language=detected_language,
+                    focus_areas=focus_areas_list
+                ), brief=True)
+                explanation, chunks = result["explanation"], result["chunks"]
+            else:
+                # Create concise explanation for batch processing
+                messages = [
+                    {"role": "system", "content": "You are a coding expert. Provide concise but informative code explanations."},
+                    {"role": "user", "content": f"""
+                        Briefly explain this {detected_language} code from '{file.filename}':
+                        
+                        {code_content}
+                        
+                        Focus on: {', '.join(focus_areas_list)}
+                        Keep the explanation concise but informative.
+                    """}
+                ]
+                
+                decision = classify_request("explain", code_content, focus_areas=focus_areas_list)
+                response = await provider.using(tier=decision.tier).generate_completion(
+                    messages, max_tokens=decision.max_tokens
+                )
+                explanation = response["choices"][0]["message"]["content"]
             
-            results.append({
-                "filename": file.filename,
-                "success": True,
-                "detected_language": detected_language,
-                "explanation": explanation,
-                "file_stats": {
-                    "lines": len(code_content.split('\n')),
-                    "size_kb": round(len(content) / 1024, 2)
-                }
-            })
+            return BatchExplanationResult(
+                filename=file.filename,
+                success=True,
+                detected_language=detected_language,
+                explanation=explanation,
+                file_stats=FileStats(
+                    lines=len(code_content.split('\n')),
+                    characters=len(code_content),
+                    size_kb=round(len(content) / 1024, 2)
+                ),
+                chunks=chunks
+            )
             
         except Exception as e:
-            results.append({
-                "filename": file.filename,
-                "success": False,
-                "error": str(e)
-            })
+            return BatchExplanationResult(
+                filename=file.filename,
+                success=False,
+                error=str(e)
+            )
+
+@router.post("/explain/batch", response_model=BatchExplainAPIResponse)
+async def explain_multiple_files(
+    files: List[UploadFile] = File(...),
+    difficulty: Optional[str] = Form("intermediate"),
+    focus_areas: Optional[str] = Form("Logic Flow"),
+    provider: ProviderRouter = Depends(get_router)
+):
+    """Explain multiple code files at once"""
+    
+    if len(files) > 5:  # Limit to 5 files max
+        raise HTTPException(
+            status_code=400,
+            detail="Maximum 5 files allowed per batch"
+        )
+    
+    focus_areas_list = [area.strip() for area in focus_areas.split(",")]
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+    start_time = time.perf_counter()
+
+    # Files are processed concurrently; gather keeps results in input order
+    results = await asyncio.gather(*[
+        _explain_batch_file(file, focus_areas_list, provider, semaphore)
+        for file in files
+    ])
+    processing_time = round(time.perf_counter() - start_time, 3)
     
-    return APIResponse(
+    return BatchExplainAPIResponse(
         success=True,
-        data={
-            "batch_results": results,
-            "total_files": len(files),
-            "successful": len([r for r in results if r["success"]]),
-            "failed": len([r for r in results if not r["success"]])
-        },
+        data=BatchExplanationResponse(
+            batch_results=results,
+            total_files=len(files),
+            successful=len([r for r in results if r.success]),
+            failed=len([r for r in results if not r.success]),
+            processing_time=processing_time
+        ),
         error=None
     )
 
 @router.get("/explain/supported-types")
 async def get_supported_file_types():
     """Get list of supported file types for upload"""
-    return JSONResponse({
+    return FastJSONResponse({
         "supported_extensions": sorted(list(ALLOWED_EXTENSIONS)),
         "max_file_size_kb": MAX_FILE_SIZE // 1024,
         "max_batch_files": 5
@@ -1,13 +1,16 @@
+import re
 from fastapi import APIRouter, Depends
-from api.models.schemas import GenerateRequest, APIResponse
-from api.services.llm_provider import LLMProvider, get_provider
+from api.models.schemas import CodeGenerationResponse, GenerateAPIResponse, GenerateRequest
+from api.services.llm_provider import get_router
+from api.services.routing import HEDGE_GENERATE, ProviderRouter
+from api.services.streaming import sse_response
+from api.services.tiering import classify_request
 
 router = APIRouter()
 
-@router.post("/generate", response_model=APIResponse)
-async def generate_code(request: GenerateRequest, provider: LLMProvider = Depends(get_provider)):
+def build_generate_messages(request: GenerateRequest) -> list:
     # Prompt LLM for code and complexity
-    messages = [
+    return [
         {"role": "system", "content": "You are an expert programmer who writes clean, efficient code and analyzes its complexity."},
         {"role": "user", "content": (
             f"Generate {request.language} code for:\n{request.description}\n\n"
@@ -20,27 +23,57 @@ async def generate_code(request: GenerateRequest, provider: LLMProvider = Depend
             "Space Complexity: <complexity>"
         )}
     ]
+
+def parse_generated_content(content: str) -> dict:
+    """Parse code and complexities from the LLM response"""
+    code_match = re.search(r"```[\w]*\n(.*?)```", content, re.DOTALL)
+    code = code_match.group(1).strip() if code_match else content.strip()
+    time_match = re.search(r"Time Complexity:\s*(.*)", content)
+    space_match = re.search(r"Space Complexity:\s*(.*)", content)
+    time_complexity = time_match.group(1).strip() if time_match else "N/A"
+    space_complexity = space_match.group(1).strip() if space_match else "N/A"
+    return {
+        "generated_code": code,
+        "time_complexity": time_complexity,
+        "space_complexity": space_complexity
+    }
+
+def build_generation_response(content: str, request: GenerateRequest) -> CodeGenerationResponse:
+    """The /generate payload; the stream's `done` event carries the same one"""
+    return CodeGenerationResponse(
+        **parse_generated_content(content),
+        language=request.language,
+        description=request.description
+    )
+
+@router.post("/generate", response_model=GenerateAPIResponse)
+async def generate_code(request: GenerateRequest, provider: ProviderRouter = Depends(get_router)):
+    decision = classify_request("generate", request.description, request.difficulty)
+    provider = provider.using(tier=decision.tier)
+    messages = build_generate_messages(request)
     try:
-        response = await provider.generate_completion(messages)
+        # options.hedge turns hedging on or off per request; LLM_HEDGE_GENERATE sets the default
+        if request.options.get("hedge", HEDGE_GENERATE):
+            response = await provider.hedged_completion(messages, max_tokens=decision.max_tokens)
+        else:
+            response = await provider.generate_completion(messages, max_tokens=decision.max_tokens)
         content = response["choices"][0]["message"]["content"]
 
-        # Parse code and complexities from the LLM response
-        import re
-        code_match = re.search(r"```[\w]*\n(.*?)```", content, re.DOTALL)
-        code = code_match.group(1).strip() if code_match else content.strip()
-        time_match = re.search(r"Time Complexity:\s*(.*)", content)
-        space_match = re.search(r"Space Complexity:\s*(.*)", content)
-        time_complexity = time_match.group(1).strip() if time_match else "N/A"
-        space_complexity = space_match.group(1).strip() if space_match else "N/A"
-
-        return APIResponse(
+        return GenerateAPIResponse(
             success=True,
-            data={
-                "generated_code": code,
-                "time_complexity": time_complexity,
-                "space_complexity": space_complexity
-            },
+            data=build_generation_response(content, request),
             error=None
         )
     except Exception as e:
-        return APIResponse(success=False, data={}, error=str(e))
\ No newline at end of file
+        return GenerateAPIResponse(success=False, data={}, error=str(e))
+
+@router.post("/generate/stream")
+async def generate_code_stream(request: GenerateRequest, provider: ProviderRouter = Depends(get_router)):
+    """Generate code, relaying tokens as Server-Sent Events"""
+    decision = classify_request("generate", request.description, request.difficulty)
+    provider = provider.using(tier=decision.tier)
+    messages = build_generate_messages(request)
+    return sse_response(
+        provider.stream_completion(messages, max_tokens=decision.max_tokens),
+        lambda content: build_generation_response(content, request).model_dump(mode="json")
+    )
\ No newline at end of file
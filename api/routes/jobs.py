@@ -0,0 +1,105 @@
+import asyncio
+import io
+from fastapi import APIRouter, Depends, File, UploadFile, Form, HTTPException
+from typing import Optional, List
+from api.models.schemas import APIResponse
+from api.routes.explain import MAX_FILE_SIZE, explain_code_from_file, explain_multiple_files
+from api.services.job_queue import CallbackURLError, Job, QueueFullError, check_callback_url, job_queue
+from api.services.llm_provider import get_router
+from api.services.serialization import FastJSONResponse
+from api.services.routing import ProviderRouter
+
+router = APIRouter()
+
+async def validate_callback_url(callback_url: Optional[str] = Form(None)) -> Optional[str]:
+    """
+    Only http(s) callbacks to public hosts (or allow-listed ones) are accepted.
+    Declared ahead of the provider dependency so a bad URL is always a 400.
+    """
+    if not callback_url:
+        return None
+    try:
+        await asyncio.to_thread(check_callback_url, callback_url)
+    except CallbackURLError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return callback_url
+
+async def _buffer_upload(file: UploadFile) -> UploadFile:
+    """
+    Copy an upload into memory; the request's file is closed once we respond.
+    One byte past MAX_FILE_SIZE is enough for the job to report it as too large.
+    """
+    content = await file.read(MAX_FILE_SIZE + 1)
+    return UploadFile(file=io.BytesIO(content), filename=file.filename, size=len(content))
+
+async def _submit(kind: str, fn, callback_url: Optional[str], size: int = 0) -> FastJSONResponse:
+    try:
+        job = await job_queue.submit(kind, fn, callback_url, size)
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "30"})
+    return FastJSONResponse(
+        status_code=202,
+        content=APIResponse(
+            success=True,
+            data={"job_id": job.id, "status": job.status, "status_url": f"/api/jobs/{job.id}"},
+            error=None
+        ).model_dump()
+    )
+
+@router.post("/jobs/explain/file", status_code=202)
+async def submit_explain_file_job(
+    file: UploadFile = File(...),
+    difficulty: Optional[str] = Form("intermediate"),
+    focus_areas: Optional[str] = Form("Logic Flow"),
+    line_by_line: Optional[bool] = Form(False),
+    include_examples: Optional[bool] = Form(True),
+    callback_url: Optional[str] = Depends(validate_callback_url),
+    provider: ProviderRouter = Depends(get_router)
+):
+    """Queue a file explanation and return a job id immediately"""
+    upload = await _buffer_upload(file)
+
+    async def run():
+        response = await explain_code_from_file(
+            file=upload,
+            difficulty=difficulty,
+            focus_areas=focus_areas,
+            line_by_line=line_by_line,
+            include_examples=include_examples,
+            provider=provider
+        )
+        return response.model_dump()
+
+    return await _submit("explain_file", run, callback_url, upload.size)
+
+@router.post("/jobs/explain/batch", status_code=202)
+async def submit_explain_batch_job(
+    files: List[UploadFile] = File(...),
+    difficulty: Optional[str] = Form("intermediate"),
+    focus_areas: Optional[str] = Form("Logic Flow"),
+    callback_url: Optional[str] = Depends(validate_callback_url),
+    provider: ProviderRouter = Depends(get_router)
+):
+    """Queue a batch explanation and return a job id immediately"""
+    if len(files) > 5:
+        raise HTTPException(status_code=400, detail="Maximum 5 files allowed per batch")
+    uploads = [await _buffer_upload(file) for file in files]
+
+    async def run():
+        response = await explain_multiple_files(
+            files=uploads,
+            difficulty=difficulty,
+            focus_areas=focus_areas,
+            provider=provider
+        )
+        return response.model_dump()
+
+    return await _submit("explain_batch", run, callback_url, sum(upload.size for upload in uploads))
+
+@router.get("/jobs/{job_id}", response_model=APIResponse)
+async def get_job(job_id: str):
+    """Poll a job's status and, once finished, its result"""
+    job: Optional[Job] = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    return APIResponse(success=True, data=job.to_dict(), error=None)
\ No newline at end of file
@@ -1,11 +1,16 @@
 from fastapi import APIRouter, Depends, Request
-from api.models.schemas import LearnRequest, APIResponse
-from api.services.llm_provider import LLMProvider, get_provider
+from api.models.schemas import LearnAPIResponse, LearnRequest, LessonResponse
+from api.services.llm_provider import get_router
+from api.services.routing import ProviderRouter
+from api.services.context_window import context_window, llm_summarizer
+from api.services.session_store import create_session_store
+from api.services.streaming import sse_response
+from api.services.tiering import classify_request
 
 router = APIRouter()
 
-# In-memory context store (for demo; use Redis/DB for production)
-SESSION_CONTEXT = {}
+# Bounded context store; LEARN_SESSION_STORE=sqlite shares it across workers
+session_store = create_session_store()
 
 LEARN_PROMPT_TEMPLATES = {
     "basic": "Teach me about {main_topic} in {language} at a {difficulty} level.",
@@ -15,42 +20,92 @@ LEARN_PROMPT_TEMPLATES = {
     "analogy": "Explain {main_topic} in {language} at a {difficulty} level using a real-world analogy."
 }
 
-@router.post("/learn", response_model=APIResponse)
-async def learn_concept(
-    request: LearnRequest,
-    fastapi_request: Request,
-    provider: LLMProvider = Depends(get_provider),
-    template: str = "basic",
-    session_id: str = None
-):
-    # Identify session (use cookie, header, or explicit session_id)
-    session_key = session_id or fastapi_request.client.host
-    context = SESSION_CONTEXT.get(session_key, [])
-
+def build_learn_prompt(request: LearnRequest, template: str) -> str:
     prompt_template = LEARN_PROMPT_TEMPLATES.get(template, LEARN_PROMPT_TEMPLATES["basic"])
-    user_prompt = prompt_template.format(
+    return prompt_template.format(
         main_topic=request.main_topic,
         language=request.language,
         difficulty=request.difficulty
     )
 
+def classify_learn_request(request: LearnRequest):
+    topic = " ".join([request.main_topic, *(request.sub_topics or [])])
+    return classify_request("learn", topic, request.difficulty)
+
+def build_learn_messages(context: list, user_prompt: str) -> list:
     # Add previous context to messages
     messages = [{"role": "system", "content": "You are an expert programming tutor."}]
-    messages += context
+    messages += [{"role": m["role"], "content": m["content"]} for m in context]
     messages.append({"role": "user", "content": user_prompt})
+    return messages
+
+async def update_context(
+    session_key: str,
+    context: list,
+    user_prompt: str,
+    answer: str,
+    provider: ProviderRouter
+) -> list:
+    context.append({"role": "user", "content": user_prompt})
+    context.append({"role": "assistant", "content": answer})
+    # Keep recent turns within the token budget, fold older ones into a summary
+    context = await context_window.compact(context, llm_summarizer(provider))
+    await session_store.set(session_key, context)
+    return context
+
+@router.post("/learn", response_model=LearnAPIResponse)
+async def learn_concept(
+    request: LearnRequest,
+    fastapi_request: Request,
+    provider: ProviderRouter = Depends(get_router),
+    template: str = "basic",
+    session_id: str = None
+):
+    decision = classify_learn_request(request)
+    provider = provider.using(request.provider, tier=decision.tier)
+    # Identify session (use cookie, header, or explicit session_id)
+    session_key = session_id or fastapi_request.client.host
+    context = await session_store.get(session_key)
+
+    user_prompt = build_learn_prompt(request, template)
+    messages = build_learn_messages(context, user_prompt)
+    context_stats = context_window.report(context)
 
     try:
-        response = await provider.generate_completion(messages)
+        response = await provider.generate_completion(messages, max_tokens=decision.max_tokens)
         answer = response["choices"][0]["message"]["content"]
         # Update context
-        context.append({"role": "user", "content": user_prompt})
-        context.append({"role": "assistant", "content": answer})
-        SESSION_CONTEXT[session_key] = context[-10:]  # Keep last 10 exchanges
+        context = await update_context(session_key, context, user_prompt, answer, provider)
 
-        return APIResponse(
+        return LearnAPIResponse(
             success=True,
-            data={"lesson": answer, "context": context},
+            data=LessonResponse(lesson=answer, context=context, context_stats=context_stats),
             error=None
         )
     except Exception as e:
-        return APIResponse(success=False, data={}, error=str(e))
\ No newline at end of file
+        return LearnAPIResponse(success=False, data={}, error=str(e))
+
+@router.post("/learn/stream")
+async def learn_concept_stream(
+    request: LearnRequest,
+    fastapi_request: Request,
+    provider: ProviderRouter = Depends(get_router),
+    template: str = "basic",
+    session_id: str = None
+):
+    """Learning mode, relaying tokens as Server-Sent Events"""
+    decision = classify_learn_request(request)
+    provider = provider.using(request.provider, tier=decision.tier)
+    session_key = session_id or fastapi_request.client.host
+    context = await session_store.get(session_key)
+
+    user_prompt = build_learn_prompt(request, template)
+    messages = build_learn_messages(context, user_prompt)
+    context_stats = context_window.report(context)
+
+    async def finalize(answer: str) -> dict:
+        # Context is only updated once the full lesson has streamed
+        updated = await update_context(session_key, context, user_prompt, answer, provider)
+        return {"lesson": answer, "context": updated, "context_stats": context_stats}
+
+    return sse_response(provider.stream_completion(messages, max_tokens=decision.max_tokens), finalize)
\ No newline at end of file
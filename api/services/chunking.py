@@ -0,0 +1,213 @@
+import ast
+import hashlib
+import re
+from typing import List, NamedTuple
+
+# Target upper bound for one chunk sent to the LLM (~1500 tokens)
+DEFAULT_MAX_CHUNK_CHARS = 6000
+
+_BLOCK_START = re.compile(
+    r"^(export\s+)?(public|private|protected|static|async|def|class|function|func|fn|impl|"
+    r"struct|enum|interface|type|module|namespace|template|void|int|const|let|var|pub)\b"
+)
+
+
+class CodeChunk(NamedTuple):
+    """A contiguous slice of a source file, usually one top-level definition"""
+    name: str
+    kind: str
+    start_line: int
+    end_line: int
+    source: str
+
+    @property
+    def content_hash(self) -> str:
+        return hashlib.sha256(self.source.encode("utf-8")).hexdigest()
+
+
+def _python_segments(source: str) -> List[CodeChunk]:
+    """
+    Top-level statements of a Python module, one segment per definition.
+    Comments and blank lines before a definition belong to it, so the
+    segments always reassemble into the original source.
+    """
+    tree = ast.parse(source)
+    lines = source.splitlines(keepends=True)
+    segments = []
+    prev_end = 0
+    for index, node in enumerate(tree.body):
+        start = prev_end + 1
+        end = len(lines) if index == len(tree.body) - 1 else node.end_lineno
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            name, kind = node.name, "function"
+        elif isinstance(node, ast.ClassDef):
+            name, kind = node.name, "class"
+        else:
+            name, kind = "module", "statements"
+        segments.append(CodeChunk(name, kind, start, end, "".join(lines[start - 1:end])))
+        prev_end = end
+    return segments
+
+
+def _generic_segments(source: str) -> List[CodeChunk]:
+    """
+    Brace/indent heuristic for languages without a parser here: a segment
+    ends when brace depth returns to zero and the next non-blank line
+    starts at column zero.
+    """
+    lines = source.splitlines(keepends=True)
+
+    # Index of the next non-blank line after each line, computed back to front
+    next_code = [None] * len(lines)
+    upcoming = None
+    for i in range(len(lines) - 1, -1, -1):
+        next_code[i] = upcoming
+        if lines[i].strip():
+            upcoming = i
+
+    segments = []
+    depth = 0
+    start = 0
+    for i, line in enumerate(lines):
+        stripped = line.strip()
+        depth = max(0, depth + stripped.count("{") - stripped.count("}"))
+        next_line = lines[next_code[i]] if next_code[i] is not None else None
+        at_boundary = (
+            depth == 0
+            and next_line is not None
+            and not next_line[0].isspace()
+            and not next_line.lstrip().startswith(("}", ")", "]"))
+            and (stripped.endswith(("}", ";")) or stripped == "end")
+        )
+        if at_boundary or i == len(lines) - 1:
+            block = lines[start:i + 1]
+            first = next((l.strip() for l in block if l.strip()), "")
+            if first:
+                kind = "block" if _BLOCK_START.match(first) else "statements"
+                segments.append(CodeChunk(first[:60], kind, start + 1, i + 1, "".join(block)))
+            elif segments:
+                # Trailing blank lines stay with the last segment
+                last = segments[-1]
+                segments[-1] = last._replace(end_line=i + 1, source=last.source + "".join(block))
+            start = i + 1
+    return segments
+
+
+def _split_python_class(segment: CodeChunk) -> List[CodeChunk]:
+    """Split a large Python class into one segment per member"""
+    tree = ast.parse(segment.source)
+    cls = next(n for n in tree.body if isinstance(n, ast.ClassDef))
+    lines = segment.source.splitlines(keepends=True)
+    parts = []
+    prev_end = 0
+    for index, member in enumerate(cls.body):
+        end = len(lines) if index == len(cls.body) - 1 else member.end_lineno
+        if isinstance(member, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            name, kind = f"{cls.name}.{member.name}", "method"
+        else:
+            name, kind = cls.name, "class"
+        parts.append(CodeChunk(
+            name, kind, segment.start_line + prev_end, segment.start_line + end - 1,
+            "".join(lines[prev_end:end])
+        ))
+        prev_end = end
+    return parts
+
+
+def _split_lines(segment: CodeChunk, max_chars: int) -> List[CodeChunk]:
+    """Last resort for a single definition larger than max_chars: split by lines"""
+    parts = []
+    lines = segment.source.splitlines(keepends=True)
+    buf, buf_start = [], segment.start_line
+    for offset, line in enumerate(lines):
+        if buf and sum(len(l) for l in buf) + len(line) > max_chars:
+            parts.append(CodeChunk(
+                f"{segment.name} (part {len(parts) + 1})", segment.kind,
+                buf_start, buf_start + len(buf) - 1, "".join(buf)
+            ))
+            buf, buf_start = [], segment.start_line + offset
+        buf.append(line)
+    if buf:
+        parts.append(CodeChunk(
+            f"{segment.name} (part {len(parts) + 1})", segment.kind,
+            buf_start, buf_start + len(buf) - 1, "".join(buf)
+        ))
+    return parts
+
+
+def _split_oversized(segment: CodeChunk, language: str, max_chars: int) -> List[CodeChunk]:
+    parts = [segment]
+    if language.lower() == "python" and segment.kind == "class":
+        try:
+            parts = _split_python_class(segment)
+        except (SyntaxError, StopIteration):
+            pass
+    result = []
+    for part in parts:
+        result.extend(_split_lines(part, max_chars) if len(part.source) > max_chars else [part])
+    return result
+
+
+def split_definitions(source: str, language: str) -> List[CodeChunk]:
+    """Split source into top-level definitions (ast for Python, heuristic otherwise)"""
+    segments = None
+    if language.lower() == "python":
+        try:
+            segments = _python_segments(source)
+        except SyntaxError:
+            pass
+    if segments is None:
+        segments = _generic_segments(source)
+    if not segments and source:
+        # No statements at all (e.g. only comments): keep the text as one segment
+        segments = [CodeChunk("module", "statements", 1, max(1, len(source.splitlines())), source)]
+    return segments
+
+
+def chunk_source(source: str, language: str, max_chars: int = DEFAULT_MAX_CHUNK_CHARS) -> List[CodeChunk]:
+    """Pack consecutive definitions into chunks of at most max_chars"""
+    chunks: List[CodeChunk] = []
+    pending: List[CodeChunk] = []
+
+    def flush():
+        if not pending:
+            return
+        if len(pending) == 1:
+            chunks.append(pending[0])
+        else:
+            names = [p.name for p in pending if p.kind != "statements"] or ["module"]
+            chunks.append(CodeChunk(
+                ", ".join(dict.fromkeys(names)), "group", pending[0].start_line, pending[-1].end_line,
+                "".join(p.source for p in pending)
+            ))
+        pending.clear()
+
+    segments = []
+    for segment in split_definitions(source, language):
+        if len(segment.source) > max_chars:
+            segments.extend(_split_oversized(segment, language, max_chars))
+        else:
+            segments.append(segment)
+
+    for segment in segments:
+        if pending and sum(len(p.source) for p in pending) + len(segment.source) > max_chars:
+            flush()
+        pending.append(segment)
+    flush()
+    return chunks
+
+
+def definition_segments(source: str, language: str) -> List[CodeChunk]:
+    """
+    One segment per top-level definition, with runs of loose statements
+    (imports, constants) merged so each can be fingerprinted and explained
+    on its own.
+    """
+    segments: List[CodeChunk] = []
+    for segment in split_definitions(source, language):
+        if segments and segment.kind == "statements" and segments[-1].kind == "statements":
+            last = segments[-1]
+            segments[-1] = last._replace(end_line=segment.end_line, source=last.source + segment.source)
+        else:
+            segments.append(segment)
+    return segments
@@ -0,0 +1,310 @@
+import os
+import zlib
+from typing import Dict, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import JSONResponse
+
+try:
+    import brotli
+except ImportError:
+    try:
+        import brotlicffi as brotli
+    except ImportError:  # optional; without it only gzip is offered
+        brotli = None
+
+COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "true").lower() == "true"
+# Responses smaller than this (bytes) are sent as-is; streams are always compressed
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "5"))
+# Cap on a decompressed request body, so a small upload cannot expand without bound
+REQUEST_MAX_DECOMPRESSED_BYTES = int(os.getenv("REQUEST_MAX_DECOMPRESSED_BYTES", str(10 * 1024 * 1024)))
+
+COMPRESSIBLE_TYPES = ("text/", "application/json", "application/javascript", "application/xml")
+
+
+def available_encodings() -> tuple:
+    """Response encodings in order of preference"""
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def negotiate(accept_encoding: str) -> Optional[str]:
+    """Pick a response encoding from an Accept-Encoding header (q-values honoured)"""
+    weights: Dict[str, float] = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name.strip()] = q
+    best, best_q = None, 0.0
+    for encoding in available_encodings():
+        q = weights.get(encoding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+class _GzipEncoder:
+    def __init__(self):
+        self._compressor = zlib.compressobj(COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush(zlib.Z_FINISH)
+
+
+class _BrotliEncoder:
+    def __init__(self):
+        self._compressor = brotli.Compressor(quality=COMPRESSION_BROTLI_QUALITY)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush()
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+
+ENCODERS = {"gzip": _GzipEncoder, "br": _BrotliEncoder}
+
+
+class DecompressionError(Exception):
+    pass
+
+
+class BodyTooLarge(DecompressionError):
+    pass
+
+
+def decompress(body: bytes, encoding: str, limit: int = REQUEST_MAX_DECOMPRESSED_BYTES) -> bytes:
+    """Decode a request body sent with Content-Encoding, refusing output above `limit`"""
+    if encoding in ("gzip", "x-gzip", "deflate"):
+        # 47 = auto-detect gzip or zlib header
+        decompressor = zlib.decompressobj(47 if encoding != "deflate" else zlib.MAX_WBITS)
+        try:
+            data = decompressor.decompress(body, limit + 1)
+        except zlib.error as e:
+            raise DecompressionError(f"Invalid {encoding} body: {e}")
+        if not decompressor.eof and not decompressor.unconsumed_tail and len(data) <= limit:
+            raise DecompressionError(f"Truncated {encoding} body")
+    elif encoding == "br" and brotli is not None:
+        data = _brotli_decompress(body, limit)
+    else:
+        raise ValueError(encoding)
+    if len(data) > limit:
+        raise BodyTooLarge(f"Decompressed body exceeds {limit} bytes")
+    return data
+
+
+def _brotli_decompress(body: bytes, limit: int, step: int = 64 * 1024) -> bytes:
+    """Streaming brotli decode that stops as soon as the output passes `limit`"""
+    decompressor = brotli.Decompressor()
+    chunks, size = [], 0
+    try:
+        if hasattr(decompressor, "can_accept_more_data"):
+            # brotli >= 1.1: bound each call's output, drain with empty input
+            pending = body
+            while True:
+                data = decompressor.process(pending, output_buffer_limit=step)
+                pending = b""
+                chunks.append(data)
+                size += len(data)
+                if size > limit:
+                    raise BodyTooLarge(f"Decompressed body exceeds {limit} bytes")
+                if decompressor.can_accept_more_data():
+                    break
+        else:
+            # Older brotli / brotlicffi: feed small input slices and check as we go
+            for offset in range(0, len(body), 1024):
+                data = decompressor.process(body[offset:offset + 1024])
+                chunks.append(data)
+                size += len(data)
+                if size > limit:
+                    raise BodyTooLarge(f"Decompressed body exceeds {limit} bytes")
+    except brotli.error as e:
+        raise DecompressionError(f"Invalid br body: {e}")
+    if not decompressor.is_finished():
+        raise DecompressionError("Truncated br body")
+    return b"".join(chunks)
+
+
+def _compressible(headers: MutableHeaders) -> bool:
+    content_type = headers.get("content-type", "")
+    return "content-encoding" not in headers and content_type.startswith(COMPRESSIBLE_TYPES)
+
+
+def _is_event_stream(headers: MutableHeaders) -> bool:
+    return headers.get("content-type", "").startswith("text/event-stream")
+
+
+class _CompressingSend:
+    """
+    Wraps `send`: holds the response start (and up to `minimum_size` bytes of
+    body) until it is clear whether to compress. Server-Sent Events are
+    compressed from the first chunk and flushed after every chunk, so each
+    event reaches the client as soon as it is produced.
+    """
+
+    def __init__(self, send, encoding: str, minimum_size: int):
+        self.send = send
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.start_message = None
+        self.headers: Optional[MutableHeaders] = None
+        self.pending: list = []
+        self.pending_size = 0
+        self.encoder = None
+        self.passthrough = False
+
+    async def __call__(self, message):
+        if message["type"] == "http.response.start":
+            self.start_message = message
+            self.headers = MutableHeaders(raw=list(message["headers"]))
+            self.passthrough = not _compressible(self.headers)
+            return
+        if message["type"] != "http.response.body":
+            if self.encoder is None:
+                self.passthrough = True
+                await self._flush_pending(more_body=True)
+            return await self.send(message)
+        if self.passthrough and self.start_message is None:
+            return await self.send(message)
+        if self.encoder is not None:
+            return await self.send(self._compress(message.get("body", b""), message.get("more_body", False)))
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        self.pending.append(body)
+        self.pending_size += len(body)
+        if self.passthrough or (not more_body and self.pending_size < self.minimum_size):
+            self.passthrough = True
+            return await self._flush_pending(more_body)
+        if more_body and self.pending_size < self.minimum_size and not _is_event_stream(self.headers):
+            return
+
+        self.encoder = ENCODERS[self.encoding]()
+        compressed = self._compress(b"".join(self.pending), more_body)
+        self.pending, self.pending_size = [], 0
+        self.headers["Content-Encoding"] = self.encoding
+        self.headers.add_vary_header("Accept-Encoding")
+        if more_body:
+            del self.headers["Content-Length"]
+        else:
+            self.headers["Content-Length"] = str(len(compressed["body"]))
+        await self._send_start()
+        await self.send(compressed)
+
+    async def _send_start(self):
+        start, self.start_message = self.start_message, None
+        if start is not None:
+            start["headers"] = self.headers.raw
+            await self.send(start)
+
+    async def _flush_pending(self, more_body: bool):
+        """Send the start and any held-back body uncompressed"""
+        await self._send_start()
+        if self.pending or not more_body:
+            body, self.pending, self.pending_size = b"".join(self.pending), [], 0
+            await self.send({"type": "http.response.body", "body": body, "more_body": more_body})
+
+    def _compress(self, body: bytes, more_body: bool) -> dict:
+        data = self.encoder.compress(body)
+        data += self.encoder.flush() if more_body else self.encoder.finish()
+        return {"type": "http.response.body", "body": data, "more_body": more_body}
+
+
+class CompressionMiddleware:
+    """
+    Negotiated gzip/brotli for responses above `minimum_size` (streams
+    included), and gzip/deflate/brotli-encoded request bodies.
+    """
+
+    def __init__(
+        self,
+        app,
+        minimum_size: int = COMPRESSION_MIN_SIZE,
+        max_request_bytes: int = REQUEST_MAX_DECOMPRESSED_BYTES
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.max_request_bytes = max_request_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        headers = Headers(scope=scope)
+
+        request_encoding = headers.get("content-encoding", "identity").strip().lower()
+        if request_encoding != "identity":
+            supported = ("gzip", "x-gzip", "deflate") + (("br",) if brotli is not None else ())
+            if request_encoding not in supported:
+                response = JSONResponse(
+                    {"detail": f"Unsupported Content-Encoding: {request_encoding}"}, status_code=415
+                )
+                return await response(scope, receive, send)
+            try:
+                # The compressed body is capped too, not only what it expands to
+                body = await _read_body(receive, self.max_request_bytes)
+                body = decompress(body, request_encoding, self.max_request_bytes)
+            except DecompressionError as e:
+                status_code = 413 if isinstance(e, BodyTooLarge) else 400
+                return await JSONResponse({"detail": str(e)}, status_code=status_code)(scope, receive, send)
+            scope = _with_body_headers(scope, len(body))
+            receive = _replay(body, receive)
+
+        encoding = negotiate(headers.get("accept-encoding", ""))
+        if encoding is None:
+            return await self.app(scope, receive, send)
+        await self.app(scope, receive, _CompressingSend(send, encoding, self.minimum_size))
+
+
+async def _read_body(receive, limit: int) -> bytes:
+    chunks, size = [], 0
+    while True:
+        message = await receive()
+        if message["type"] == "http.request":
+            chunks.append(message.get("body", b""))
+            size += len(chunks[-1])
+            if size > limit:
+                raise BodyTooLarge(f"Request body exceeds {limit} bytes")
+            if not message.get("more_body", False):
+                return b"".join(chunks)
+        elif message["type"] == "http.disconnect":
+            return b"".join(chunks)
+
+
+def _replay(body: bytes, receive):
+    sent = False
+
+    async def replay():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        return await receive()
+    return replay
+
+
+def _with_body_headers(scope: dict, length: int) -> dict:
+    """Drop Content-Encoding and fix Content-Length for the decoded body"""
+    raw = [
+        (name, value) for name, value in scope["headers"]
+        if name not in (b"content-encoding", b"content-length")
+    ]
+    raw.append((b"content-length", str(length).encode()))
+    return {**scope, "headers": raw}
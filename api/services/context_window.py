@@ -0,0 +1,146 @@
+import os
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+# Token budget for prior turns sent with each learn request. The default
+# leaves room in the 8192-token context window for the reply and prompt.
+CONTEXT_TOKEN_BUDGET = int(os.getenv("LEARN_CONTEXT_TOKENS", "3072"))
+SUMMARY_MAX_TOKENS = int(os.getenv("LEARN_SUMMARY_MAX_TOKENS", "300"))
+
+# Per-message framing overhead of the chat format
+MESSAGE_OVERHEAD_TOKENS = 4
+
+SUMMARY_PREFIX = "Summary of the earlier lesson: "
+
+Summarizer = Callable[[str, List[Dict[str, Any]]], Awaitable[str]]
+
+
+def count_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token for English and code)"""
+    return (len(text) + 3) // 4
+
+
+def message_tokens(message: Dict[str, Any]) -> int:
+    return count_tokens(message.get("content", "")) + MESSAGE_OVERHEAD_TOKENS
+
+
+def split_summary(context: List[Dict[str, Any]]) -> Tuple[Optional[Dict[str, Any]], List[Dict[str, Any]]]:
+    """Separate the stored running-summary message from the raw turns"""
+    if context and context[0].get("summary"):
+        return context[0], context[1:]
+    return None, context
+
+
+def summary_text(summary: Optional[Dict[str, Any]]) -> str:
+    if summary is None:
+        return ""
+    return summary["content"][len(SUMMARY_PREFIX):]
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    max_chars = max_tokens * 4
+    return text if len(text) <= max_chars else text[-max_chars:]
+
+
+class ContextWindowManager:
+    """
+    Keep the most recent learn turns inside a token budget and fold older
+    turns into a running summary that is stored with the session, so it is
+    only recomputed when more turns fall out of the window.
+    """
+
+    def __init__(self, budget: int = CONTEXT_TOKEN_BUDGET, summary_max_tokens: int = SUMMARY_MAX_TOKENS):
+        self.budget = budget
+        self.summary_max_tokens = summary_max_tokens
+
+    async def compact(self, context: List[Dict[str, Any]], summarize: Summarizer) -> List[Dict[str, Any]]:
+        summary, turns = split_summary(context)
+        used = message_tokens(summary) if summary else 0
+
+        # Walk back over whole user/assistant exchanges; always keep the latest,
+        # trimmed to what is left of the budget when it is too large on its own
+        kept_from = len(turns)
+        while kept_from > 0:
+            start = max(0, kept_from - 2)
+            exchange_tokens = sum(message_tokens(m) for m in turns[start:kept_from])
+            if used + exchange_tokens > self.budget:
+                if kept_from < len(turns):
+                    break
+                # Older turns will all be folded, so leave room for the summary they become
+                reserved = self.summary_tokens_cap() if start > 0 else used
+                turns = turns[:start] + self._fit(turns[start:], self.budget - max(used, reserved))
+                kept_from = start
+                break
+            used += exchange_tokens
+            kept_from = start
+
+        overflow = turns[:kept_from]
+        if not overflow:
+            return ([summary] if summary else []) + turns
+
+        previous = summary_text(summary)
+        try:
+            text = await summarize(previous, overflow)
+        except Exception:
+            # Degrade to an extractive summary rather than losing the turns
+            text = " ".join([previous] + [m["content"] for m in overflow]).strip()
+        text = truncate_to_tokens(text, self.summary_max_tokens)
+
+        folded = (summary or {}).get("folded_tokens", 0) + sum(message_tokens(m) for m in overflow)
+        new_summary = {
+            "role": "system",
+            "content": SUMMARY_PREFIX + text,
+            "summary": True,
+            "folded_tokens": folded
+        }
+        return [new_summary] + turns[kept_from:]
+
+    def summary_tokens_cap(self) -> int:
+        """Most tokens a stored summary message can take"""
+        return count_tokens(SUMMARY_PREFIX) + self.summary_max_tokens + MESSAGE_OVERHEAD_TOKENS
+
+    @staticmethod
+    def _fit(messages: List[Dict[str, Any]], available: int) -> List[Dict[str, Any]]:
+        """Copies of `messages` trimmed, longest first, to about `available` tokens"""
+        fitted = [dict(m) for m in messages]
+        excess = sum(message_tokens(m) for m in fitted) - available
+        for message in sorted(fitted, key=message_tokens, reverse=True):
+            if excess <= 0:
+                break
+            tokens = count_tokens(message["content"])
+            keep = max(0, tokens - excess)
+            message["content"] = truncate_to_tokens(message["content"], keep) if keep else ""
+            excess -= tokens - count_tokens(message["content"])
+        return fitted
+
+    def report(self, context: List[Dict[str, Any]]) -> Dict[str, int]:
+        """Token accounting for the context sent with a request"""
+        summary, turns = split_summary(context)
+        summary_tokens = message_tokens(summary) if summary else 0
+        folded = summary.get("folded_tokens", 0) if summary else 0
+        return {
+            "context_tokens": summary_tokens + sum(message_tokens(m) for m in turns),
+            "summary_tokens": summary_tokens,
+            "folded_tokens": folded,
+            "prompt_tokens_saved": max(0, folded - summary_tokens)
+        }
+
+
+def llm_summarizer(provider, max_tokens: int = SUMMARY_MAX_TOKENS) -> Summarizer:
+    """Summarize folded turns with the same provider that serves the lesson"""
+    async def summarize(previous: str, turns: List[Dict[str, Any]]) -> str:
+        transcript = "\n".join(f"{m['role']}: {m['content']}" for m in turns)
+        messages = [
+            {"role": "system", "content": "You condense tutoring conversations into short, factual notes."},
+            {"role": "user", "content": (
+                f"Existing summary:\n{previous or '(none)'}\n\n"
+                f"New conversation turns:\n{transcript}\n\n"
+                "Update the summary so it covers everything the student has been taught "
+                "and asked so far. Reply with the summary only."
+            )}
+        ]
+        response = await provider.generate_completion(messages, max_tokens=max_tokens)
+        return response["choices"][0]["message"]["content"].strip()
+    return summarize
+
+
+context_window = ContextWindowManager()
@@ -0,0 +1,263 @@
+import asyncio
+import hashlib
+import json
+import os
+from typing import Any, Dict, List, Tuple
+
+from api.models.schemas import ExplainRequest, FileExplainRequest
+from api.services.cache import CACHE_TTL, LRUCache
+from api.services.chunking import CodeChunk, chunk_source
+from api.services.session_store import create_session_store
+
+# Files above this size are explained chunk by chunk and then merged
+CHUNK_THRESHOLD_CHARS = int(os.getenv("EXPLAIN_CHUNK_THRESHOLD", "12000"))
+CHUNK_MAX_CHARS = int(os.getenv("EXPLAIN_CHUNK_MAX_CHARS", "6000"))
+CHUNK_CONCURRENCY = int(os.getenv("EXPLAIN_CHUNK_CONCURRENCY", "4"))
+CHUNK_MAX_TOKENS = 600
+REDUCE_MAX_TOKENS = 1500
+# Upper bound on the per-chunk explanations merged by one reduce call
+REDUCE_MAX_CHARS = 24000
+
+# Per-chunk explanations keyed by chunk content hash and explain settings
+chunk_cache = LRUCache(max_entries=4096, max_bytes=32 * 1024 * 1024, ttl=CACHE_TTL)
+
+# Definition fingerprints from the previous /explain request of each session,
+# kept apart from learning sessions so explain traffic cannot evict them
+explain_sessions = create_session_store(
+    backend=os.getenv("EXPLAIN_SESSION_STORE", "memory").lower(),
+    path=os.getenv("EXPLAIN_SESSION_DB", "explain_sessions.db"),
+    max_sessions=int(os.getenv("EXPLAIN_MAX_SESSIONS", "1000")),
+    ttl=float(os.getenv("EXPLAIN_SESSION_TTL", "3600")),
+    max_bytes=int(os.getenv("EXPLAIN_SESSION_MAX_BYTES", str(8 * 1024 * 1024))),
+    table="explain_sessions"
+)
+
+SYSTEM_PROMPT = "You are a coding expert who explains code clearly and concisely."
+
+
+def needs_chunking(source: str) -> bool:
+    return len(source) > CHUNK_THRESHOLD_CHARS
+
+
+def _settings_key(request: FileExplainRequest, brief: bool) -> str:
+    return json.dumps([
+        request.detected_language, request.difficulty, request.focus_areas,
+        request.line_by_line, request.include_examples, brief
+    ])
+
+
+def chunk_cache_key(chunk: CodeChunk, model: str, settings_key: str) -> str:
+    return hashlib.sha256(f"{chunk.content_hash}:{model}:{settings_key}".encode("utf-8")).hexdigest()
+
+
+def _chunk_messages(chunk: CodeChunk, request: FileExplainRequest, brief: bool) -> list:
+    style = (
+        "Keep the explanation concise but informative."
+        if brief else
+        ('Explain line by line' if request.line_by_line else 'Provide overview')
+    )
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": f"""
+            Explain this section ({chunk.kind} `{chunk.name}`, lines {chunk.start_line}-{chunk.end_line})
+            of the {request.detected_language} file '{request.filename}':
+
+            {chunk.source}
+
+            Difficulty level: {request.difficulty}
+            Focus areas: {', '.join(request.focus_areas)}
+            {style}
+            Only describe this section; it will be combined with explanations of the rest of the file.
+        """}
+    ]
+
+
+def _reduce_messages(sections: List[str], request: FileExplainRequest, brief: bool) -> list:
+    joined = "\n\n".join(sections)
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": f"""
+            Below are explanations of consecutive sections of the {request.detected_language}
+            file '{request.filename}'. Merge them into one coherent explanation of the whole file.
+
+            {joined}
+
+            Difficulty level: {request.difficulty}
+            Focus areas: {', '.join(request.focus_areas)}
+            {'Keep the explanation concise but informative.' if brief else
+             "Cover the code's purpose, key components, and any notable patterns or techniques used."}
+            {'Include examples' if request.include_examples and not brief else 'No examples needed'}
+        """}
+    ]
+
+
+async def _explain_chunk(
+    provider,
+    chunk: CodeChunk,
+    request: FileExplainRequest,
+    brief: bool,
+    settings_key: str,
+    semaphore: asyncio.Semaphore
+) -> Tuple[str, bool]:
+    cached = chunk_cache.get(chunk_cache_key(chunk, provider.model, settings_key))
+    if cached is not None:
+        return cached, True
+    async with semaphore:
+        response = await provider.generate_completion(
+            _chunk_messages(chunk, request, brief), max_tokens=CHUNK_MAX_TOKENS
+        )
+    explanation = response["choices"][0]["message"]["content"]
+    # After a failover the answer comes from another model; file it under that one
+    model = response.get("routed_model", provider.model)
+    chunk_cache.set(chunk_cache_key(chunk, model, settings_key), explanation, len(explanation))
+    return explanation, False
+
+
+async def _reduce(provider, sections: List[str], request: FileExplainRequest, brief: bool) -> str:
+    """Merge section explanations, in several rounds when they exceed one prompt"""
+    while len(sections) > 1 and sum(len(s) for s in sections) > REDUCE_MAX_CHARS:
+        groups, current = [], []
+        for section in sections:
+            if current and sum(len(s) for s in current) + len(section) > REDUCE_MAX_CHARS:
+                groups.append(current)
+                current = []
+            current.append(section)
+        groups.append(current)
+        if len(groups) == len(sections):
+            break
+        sections = await asyncio.gather(*[
+            _reduce_once(provider, group, request, brief) for group in groups
+        ])
+    return await _reduce_once(provider, sections, request, brief)
+
+
+async def _reduce_once(provider, sections: List[str], request: FileExplainRequest, brief: bool) -> str:
+    response = await provider.generate_completion(
+        _reduce_messages(sections, request, brief), max_tokens=REDUCE_MAX_TOKENS
+    )
+    return response["choices"][0]["message"]["content"]
+
+
+async def explain_chunked(
+    provider,
+    source: str,
+    request: FileExplainRequest,
+    brief: bool = False
+) -> Dict[str, Any]:
+    """
+    Map-reduce explanation for large files: split at definition boundaries,
+    explain chunks concurrently (each cached by content hash), then merge.
+    """
+    chunks = chunk_source(source, request.detected_language, CHUNK_MAX_CHARS)
+    settings_key = _settings_key(request, brief)
+    semaphore = asyncio.Semaphore(CHUNK_CONCURRENCY)
+    results = await asyncio.gather(*[
+        _explain_chunk(provider, chunk, request, brief, settings_key, semaphore)
+        for chunk in chunks
+    ])
+    sections = [
+        f"### {chunk.name} (lines {chunk.start_line}-{chunk.end_line})\n{explanation}"
+        for chunk, (explanation, _) in zip(chunks, results)
+    ]
+    explanation = await _reduce(provider, sections, request, brief)
+    return {
+        "explanation": explanation,
+        "chunks": [
+            {
+                "name": chunk.name,
+                "kind": chunk.kind,
+                "start_line": chunk.start_line,
+                "end_line": chunk.end_line,
+                "cached": cached
+            }
+            for chunk, (_, cached) in zip(chunks, results)
+        ]
+    }
+
+
+def _segment_ids(segments: List[CodeChunk]) -> List[str]:
+    """Stable identity per segment: its name, numbered when names repeat"""
+    seen: Dict[str, int] = {}
+    ids = []
+    for segment in segments:
+        count = seen.get(segment.name, 0)
+        seen[segment.name] = count + 1
+        ids.append(segment.name if count == 0 else f"{segment.name}#{count + 1}")
+    return ids
+
+
+def _session_key(session_id: str) -> str:
+    return f"explain:{session_id}"
+
+
+async def session_fingerprint(session_id: str) -> Dict[str, str]:
+    """Segment id -> content hash from the session's previous request (empty if none)"""
+    return {entry["id"]: entry["hash"] for entry in await explain_sessions.get(_session_key(session_id))}
+
+
+async def remember_fingerprint(session_id: str, segments: List[CodeChunk]):
+    await explain_sessions.set(_session_key(session_id), [
+        {"id": segment_id, "hash": segment.content_hash}
+        for segment_id, segment in zip(_segment_ids(segments), segments)
+    ])
+
+
+async def explain_incremental(
+    provider,
+    segments: List[CodeChunk],
+    request: ExplainRequest,
+    session_id: str
+) -> Dict[str, Any]:
+    """
+    Explain code definition by definition. Unchanged definitions are served
+    from the chunk cache; only edited or new ones go to the LLM. The result
+    stitches the per-definition explanations back together and reports,
+    relative to the session's previous request, what changed. A session's
+    first request explains every definition, which fills the chunk cache so
+    that editing one definition later costs a single call.
+    """
+    file_request = FileExplainRequest(
+        filename="snippet",
+        detected_language=request.language,
+        difficulty=request.difficulty,
+        focus_areas=request.focus_areas,
+        line_by_line=request.line_by_line,
+        include_examples=request.include_examples
+    )
+    settings_key = _settings_key(file_request, False)
+    semaphore = asyncio.Semaphore(CHUNK_CONCURRENCY)
+    results = await asyncio.gather(*[
+        _explain_chunk(provider, segment, file_request, False, settings_key, semaphore)
+        for segment in segments
+    ])
+
+    previous = await session_fingerprint(session_id)
+    ids = _segment_ids(segments)
+    await remember_fingerprint(session_id, segments)
+
+    chunks = []
+    for segment_id, segment, (_, cached) in zip(ids, segments, results):
+        if segment_id not in previous:
+            status = "added"
+        elif previous[segment_id] == segment.content_hash:
+            status = "unchanged"
+        else:
+            status = "changed"
+        chunks.append({
+            "name": segment_id,
+            "kind": segment.kind,
+            "start_line": segment.start_line,
+            "end_line": segment.end_line,
+            "cached": cached,
+            "status": status
+        })
+
+    explanation = "\n\n".join(
+        f"### {segment_id} (lines {segment.start_line}-{segment.end_line})\n{text}"
+        for segment_id, segment, (text, _) in zip(ids, segments, results)
+    )
+    return {
+        "explanation": explanation,
+        "chunks": chunks,
+        "removed_chunks": [segment_id for segment_id in previous if segment_id not in ids]
+    }
@@ -0,0 +1,246 @@
+import asyncio
+import ipaddress
+import logging
+import os
+import socket
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_QUEUE_MAX_DEPTH = int(os.getenv("JOB_QUEUE_MAX_DEPTH", "100"))
+JOB_RESULT_TTL = float(os.getenv("JOB_RESULT_TTL", "3600"))
+# Finished jobs kept for polling; the oldest are dropped first past this count
+JOB_MAX_FINISHED = int(os.getenv("JOB_MAX_FINISHED", "1000"))
+# Upload bytes held by queued and running jobs before new submissions get 429
+JOB_MAX_BUFFERED_BYTES = int(os.getenv("JOB_MAX_BUFFERED_BYTES", str(64 * 1024 * 1024)))
+JOB_CALLBACK_TIMEOUT = float(os.getenv("JOB_CALLBACK_TIMEOUT", "10"))
+# Hosts callbacks may target even when they resolve to private addresses
+JOB_CALLBACK_ALLOWED_HOSTS = {
+    h.strip().lower() for h in os.getenv("JOB_CALLBACK_ALLOWED_HOSTS", "").split(",") if h.strip()
+}
+
+logger = logging.getLogger(__name__)
+
+JobFn = Callable[[], Awaitable[Dict[str, Any]]]
+
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while the queue is at max depth"""
+
+
+class CallbackURLError(ValueError):
+    """Raised for callback URLs the server must not POST to"""
+
+
+def _public_address(address: str) -> bool:
+    ip = ipaddress.ip_address(address.split("%", 1)[0])
+    if isinstance(ip, ipaddress.IPv6Address) and ip.ipv4_mapped:
+        ip = ip.ipv4_mapped
+    return ip.is_global and not ip.is_multicast
+
+
+def check_callback_url(url: str):
+    """
+    Reject callback targets other than public http(s) hosts, so a client
+    cannot make the server call loopback, private or link-local services.
+    Hosts in JOB_CALLBACK_ALLOWED_HOSTS skip the address check. Resolves
+    DNS, so call it off the event loop.
+    """
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise CallbackURLError("callback_url must be an http(s) URL")
+    host = parts.hostname.lower()
+    if host in JOB_CALLBACK_ALLOWED_HOSTS:
+        return
+    try:
+        infos = socket.getaddrinfo(host, parts.port or (443 if parts.scheme == "https" else 80))
+    except (socket.gaierror, UnicodeError):
+        raise CallbackURLError(f"callback_url host cannot be resolved: {host}")
+    if not all(_public_address(info[4][0]) for info in infos):
+        raise CallbackURLError("callback_url must not point to a private or local address")
+
+
+class Job:
+    def __init__(self, kind: str, fn: JobFn, callback_url: Optional[str] = None, size: int = 0):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.fn = fn
+        self.callback_url = callback_url
+        # Bytes of buffered input the job holds until it finishes
+        self.size = size
+        self.status = "queued"
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.callback_status: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("succeeded", "failed")
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "result": self.result,
+            "error": self.error,
+            "callback_url": self.callback_url,
+            "callback_status": self.callback_status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at
+        }
+
+
+class JobQueue:
+    """
+    Bounded in-process job queue drained by a fixed pool of asyncio workers.
+    Finished jobs are kept for `result_ttl` seconds (at most `max_finished`
+    of them) so clients can poll them. Job state lives in this process only,
+    so every poll must reach the worker that accepted the job.
+    """
+
+    def __init__(
+        self,
+        workers: int = JOB_WORKERS,
+        max_depth: int = JOB_QUEUE_MAX_DEPTH,
+        result_ttl: float = JOB_RESULT_TTL,
+        max_finished: int = JOB_MAX_FINISHED,
+        max_buffered_bytes: int = JOB_MAX_BUFFERED_BYTES
+    ):
+        self.worker_count = workers
+        self.max_depth = max_depth
+        self.result_ttl = result_ttl
+        self.max_finished = max_finished
+        self.max_buffered_bytes = max_buffered_bytes
+        self.buffered_bytes = 0
+        self.jobs: Dict[str, Job] = {}
+        self.rejected = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._callback_client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def running(self) -> bool:
+        return bool(self._workers) and not all(w.done() for w in self._workers)
+
+    async def start(self):
+        if self.running and self._loop is asyncio.get_running_loop():
+            return
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue(maxsize=self.max_depth)
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.worker_count)]
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._queue = None
+        self._loop = None
+        if self._callback_client is not None:
+            await self._callback_client.aclose()
+            self._callback_client = None
+
+    async def submit(self, kind: str, fn: JobFn, callback_url: Optional[str] = None, size: int = 0) -> Job:
+        # Started by the app lifespan; also started lazily if that did not run
+        await self.start()
+        self._prune()
+        if self.buffered_bytes + size > self.max_buffered_bytes:
+            self.rejected += 1
+            raise QueueFullError("Job queue is holding too much uploaded data; try again shortly")
+        job = Job(kind, fn, callback_url, size)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise QueueFullError(f"Job queue is full ({self.max_depth} pending jobs)")
+        self.buffered_bytes += size
+        self.jobs[job.id] = job
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        self._prune()
+        return self.jobs.get(job_id)
+
+    def stats(self) -> Dict[str, Any]:
+        counts: Dict[str, int] = {}
+        for job in self.jobs.values():
+            counts[job.status] = counts.get(job.status, 0) + 1
+        return {
+            "workers": self.worker_count if self.running else 0,
+            "depth": self._queue.qsize() if self._queue else 0,
+            "max_depth": self.max_depth,
+            "buffered_bytes": self.buffered_bytes,
+            "rejected": self.rejected,
+            "jobs": counts
+        }
+
+    def _prune(self):
+        cutoff = time.time() - self.result_ttl
+        finished = sorted((job for job in self.jobs.values() if job.done), key=lambda job: job.finished_at)
+        excess = len(finished) - self.max_finished
+        for index, job in enumerate(finished):
+            if index < excess or job.finished_at < cutoff:
+                del self.jobs[job.id]
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._run(job)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: Job):
+        job.status = "running"
+        job.started_at = time.time()
+        try:
+            job.result = await job.fn()
+            job.status = "succeeded"
+        except asyncio.CancelledError:
+            job.status = "failed"
+            job.error = "Job cancelled"
+            raise
+        except Exception as e:
+            job.status = "failed"
+            job.error = getattr(e, "detail", None) or str(e)
+        finally:
+            job.finished_at = time.time()
+            # Dropping the closure releases the buffered uploads
+            job.fn = None
+            self.buffered_bytes -= job.size
+            self._prune()
+        if job.callback_url:
+            await self._notify(job)
+
+    @property
+    def callback_client(self) -> httpx.AsyncClient:
+        """Callbacks get their own client so they never hold LLM pool connections"""
+        if self._callback_client is None or self._callback_client.is_closed:
+            self._callback_client = httpx.AsyncClient(
+                timeout=JOB_CALLBACK_TIMEOUT, follow_redirects=False,
+                limits=httpx.Limits(max_connections=self.worker_count)
+            )
+        return self._callback_client
+
+    async def _notify(self, job: Job):
+        try:
+            # Checked again at delivery, since DNS may have changed since submission
+            await asyncio.to_thread(check_callback_url, job.callback_url)
+            response = await self.callback_client.post(job.callback_url, json=job.to_dict())
+            job.callback_status = f"delivered ({response.status_code})"
+        except Exception as e:
+            job.callback_status = f"failed ({e.__class__.__name__})"
+            logger.warning("Job %s callback to %s failed: %s", job.id, job.callback_url, e)
+
+
+job_queue = JobQueue()
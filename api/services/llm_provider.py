@@ -1,36 +1,437 @@
+import asyncio
+import json
+import math
 import os
+import time
+from typing import AsyncIterator, Optional
+
 import httpx
 from fastapi import HTTPException
 
+from api.services.cache import ResponseCache, cache_key, response_cache
+from api.services.coalesce import SingleFlight, inflight_requests
+from api.services import metrics, tracing
+from api.services.rate_limiter import CapacityExceeded, Governor, estimate_tokens, governor
+from api.services.resilience import (
+    RETRYABLE_STATUS, CircuitOpenError, RetryPolicy, get_breaker, parse_retry_after
+)
+from api.services.routing import ModelLatency, ProviderRouter
+
+# Connection pool settings for the shared upstream client
+POOL_MAX_CONNECTIONS = int(os.getenv("LLM_POOL_MAX_CONNECTIONS", "100"))
+POOL_MAX_KEEPALIVE = int(os.getenv("LLM_POOL_MAX_KEEPALIVE", "20"))
+KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "30"))
+HTTP2_ENABLED = os.getenv("LLM_HTTP2", "true").lower() in ("1", "true", "yes")
+REQUEST_TIMEOUT = float(os.getenv("LLM_REQUEST_TIMEOUT", "30"))
+
+# Providers the router may use, in order of preference
+LLM_PROVIDERS = [p.strip() for p in os.getenv("LLM_PROVIDERS", "groq").split(",") if p.strip()]
+
+# Known OpenAI-compatible upstreams: base URL, API key variable, default model
+PROVIDER_SPECS = {
+    "groq": {
+        "api_base": "https://api.groq.com/openai/v1",
+        "api_key_env": "GROQ_API_KEY",
+        "model": "llama-3.3-70b-versatile",
+        "fast_model": os.getenv("GROQ_FAST_MODEL", "llama-3.1-8b-instant")
+    },
+    "openai": {
+        "api_base": os.getenv("OPENAI_COMPAT_BASE_URL", ""),
+        "api_key_env": "OPENAI_COMPAT_API_KEY",
+        "model": os.getenv("OPENAI_COMPAT_MODEL", "gpt-4o-mini"),
+        "fast_model": os.getenv("OPENAI_COMPAT_FAST_MODEL", "")
+    }
+}
+
+_http_client: Optional[httpx.AsyncClient] = None
+_provider: Optional["LLMProvider"] = None
+_router: Optional[ProviderRouter] = None
+
+
+def _http2_available() -> bool:
+    """HTTP/2 needs the optional h2 package; fall back to HTTP/1.1 without it"""
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def create_http_client() -> httpx.AsyncClient:
+    """Build the pooled keep-alive client used for all upstream LLM calls"""
+    return httpx.AsyncClient(
+        http2=HTTP2_ENABLED and _http2_available(),
+        limits=httpx.Limits(
+            max_connections=POOL_MAX_CONNECTIONS,
+            max_keepalive_connections=POOL_MAX_KEEPALIVE,
+            keepalive_expiry=KEEPALIVE_EXPIRY
+        ),
+        timeout=REQUEST_TIMEOUT
+    )
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Return the app-scoped client, creating it lazily if startup did not run"""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = create_http_client()
+    return _http_client
+
+
+async def init_http_client():
+    """Create the shared client when the application starts"""
+    get_http_client()
+
+
+async def close_http_client():
+    """Close the shared client and drop the cached provider on shutdown"""
+    global _http_client, _provider, _router
+    if _http_client is not None:
+        await _http_client.aclose()
+    _http_client = None
+    _provider = None
+    _router = None
+
+
 class LLMProvider:
-    def __init__(self, provider_name: str = "groq"):
-        self.api_key = os.getenv("GROQ_API_KEY")
-        if not self.api_key:
+    def __init__(
+        self,
+        provider_name: str = "groq",
+        client: Optional[httpx.AsyncClient] = None,
+        cache: Optional[ResponseCache] = None,
+        inflight: Optional[SingleFlight] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        rate_governor: Optional[Governor] = None
+    ):
+        spec = PROVIDER_SPECS.get(provider_name)
+        if spec is None:
+            raise HTTPException(status_code=500, detail=f"Unknown LLM provider: {provider_name}")
+        self.name = provider_name
+        self.api_key = os.getenv(spec["api_key_env"])
+        # Self-hosted OpenAI-compatible servers often run without a key
+        if not self.api_key and provider_name == "groq":
             raise HTTPException(status_code=500, detail="GROQ_API_KEY not found in environment variables")
-        self.api_base = "https://api.groq.com/openai/v1"
-        self.model = "llama-3.3-70b-versatile"
+        self.api_base = spec["api_base"].rstrip("/")
+        self.model = spec["model"]
+        # Model for the "fast" tier; providers without one use `model` for both
+        self.fast_model = spec.get("fast_model") or spec["model"]
+        self._client = client
+        self.cache = cache if cache is not None else response_cache
+        self.inflight = inflight if inflight is not None else inflight_requests
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.breaker = get_breaker(provider_name)
+        if rate_governor is not None:
+            self.governor = rate_governor
+        elif provider_name == "groq":
+            self.governor = governor
+        else:
+            # LLM_RPM_LIMIT/LLM_TPM_LIMIT describe the Groq plan; elsewhere only cap concurrency
+            self.governor = Governor(rpm=0, tpm=0, name=provider_name)
+        self.latency = ModelLatency()
 
-    async def generate_completion(self, messages: list, max_tokens: int = 1000):
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
+    @property
+    def client(self) -> httpx.AsyncClient:
+        return self._client or get_http_client()
+
+    def _headers(self) -> dict:
+        headers = {"Content-Type": "application/json"}
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+        return headers
+
+    def model_for(self, tier: str) -> str:
+        return self.fast_model if tier == "fast" else self.model
+
+    def _payload(self, messages: list, max_tokens: int, stream: bool = False, model: Optional[str] = None) -> dict:
+        payload = {
+            "model": model or self.model,
+            "messages": messages,
+            "max_tokens": max_tokens
         }
+        if stream:
+            payload["stream"] = True
+        return payload
+
+    async def generate_completion(
+        self,
+        messages: list,
+        max_tokens: int = 1000,
+        coalesce: bool = True,
+        tier: str = "quality"
+    ):
+        model = self.model_for(tier)
+        with tracing.span("llm.completion", provider=self.name, model=model, max_tokens=max_tokens) as span:
+            key = cache_key(model, messages, max_tokens)
+            cached = await self.cache.get(key)
+            span.set(cache_hit=cached is not None)
+            if cached is not None:
+                return cached
+            if not coalesce:
+                # Hedged calls must really go upstream instead of joining the call they race
+                return await self._fetch_and_store(key, messages, max_tokens, model)
+            # Identical concurrent requests share one upstream call
+            return await self.inflight.do(key, lambda: self._fetch_and_store(key, messages, max_tokens, model))
+
+    async def _fetch_and_store(self, key: str, messages: list, max_tokens: int, model: Optional[str] = None):
+        result = await self._request_completion(messages, max_tokens, model)
+        await self.cache.set(key, result)
+        return result
+
+    async def _request_completion(self, messages: list, max_tokens: int, model: Optional[str] = None):
+        """POST with retries on 429/5xx/transport errors, guarded by the circuit breaker"""
+        policy = self.retry_policy
+        deadline = time.monotonic() + policy.deadline
+        reserved = estimate_tokens(messages, max_tokens)
+        # TPM is reserved once per call; retries only take another request slot
+        held = 0
+        attempt = 0
+        try:
+            while True:
+                attempt += 1
+                # Client-side RPM/TPM budget and concurrency cap before going upstream
+                try:
+                    await self.governor.acquire(reserved - held)
+                except CapacityExceeded as e:
+                    metrics.errors.inc("capacity_exceeded")
+                    raise HTTPException(status_code=503, detail=f"LLM API Error: {str(e)}")
+                held = reserved
+                try:
+                    self.breaker.before_call()
+                except CircuitOpenError as e:
+                    self.governor.release()
+                    # Nothing went upstream, so the request slot is returned too
+                    self.governor.refund(0, requests=1)
+                    metrics.errors.inc("circuit_open")
+                    raise HTTPException(status_code=503, detail=f"LLM API Error: {str(e)}")
+
+                retry_after = None
+                model = model or self.model
+                metrics.llm_in_flight.inc(self.name)
+                started = time.monotonic()
+                try:
+                    with tracing.span("llm.upstream", provider=self.name, model=model, attempt=attempt) as span:
+                        response = await self.client.post(
+                            f"{self.api_base}/chat/completions",
+                            headers=self._headers(),
+                            json=self._payload(messages, max_tokens, model=model),
+                            timeout=min(REQUEST_TIMEOUT, max(0.1, deadline - time.monotonic()))
+                        )
+                        span.set(status_code=response.status_code)
+                        response.raise_for_status()
+                        result = response.json()
+                except httpx.HTTPStatusError as e:
+                    status = e.response.status_code
+                    if status >= 500:
+                        self.breaker.record_failure()
+                    else:
+                        # 4xx (including 429 quota) says nothing about upstream health
+                        self.breaker.release()
+                    self.latency.record(model, time.monotonic() - started, False)
+                    metrics.llm_latency.observe(time.monotonic() - started, self.name, model, "error")
+                    metrics.errors.inc(metrics.upstream_error_type(status=status))
+                    if status not in RETRYABLE_STATUS:
+                        raise HTTPException(status_code=500, detail=f"LLM API Error: {str(e)}")
+                    error = e
+                    retry_after = parse_retry_after(e.response.headers.get("retry-after"))
+                except httpx.TransportError as e:
+                    self.breaker.record_failure()
+                    self.latency.record(model, time.monotonic() - started, False)
+                    metrics.llm_latency.observe(time.monotonic() - started, self.name, model, "error")
+                    metrics.errors.inc(metrics.upstream_error_type(exc=e))
+                    error = e
+                except asyncio.CancelledError:
+                    self.breaker.release()
+                    raise
+                except Exception as e:
+                    self.breaker.release()
+                    metrics.errors.inc("upstream_invalid_response")
+                    raise HTTPException(status_code=500, detail=f"LLM API Error: {str(e)}")
+                else:
+                    self.breaker.record_success()
+                    self.latency.record(model, time.monotonic() - started, True)
+                    metrics.llm_latency.observe(time.monotonic() - started, self.name, model, "success")
+                    metrics.record_usage(self.name, model, result.get("usage"))
+                    held = 0
+                    self.governor.settle(reserved, result.get("usage"))
+                    return result
+                finally:
+                    metrics.llm_in_flight.dec(self.name)
+                    self.governor.release()
+
+                if policy.waits_too_long(retry_after, deadline):
+                    # Retrying sooner than the server asked would only be throttled again
+                    raise HTTPException(
+                        status_code=503,
+                        detail=f"LLM API Error: upstream asked to retry after {retry_after:g}s: {str(error)}",
+                        headers={"Retry-After": str(math.ceil(retry_after))}
+                    )
+                delay = policy.backoff(attempt, retry_after)
+                if attempt >= policy.max_attempts or time.monotonic() + delay >= deadline:
+                    raise HTTPException(status_code=500, detail=f"LLM API Error: {str(error)}")
+                await asyncio.sleep(delay)
+        finally:
+            # A reservation no response settled (errors, cancellation) goes back to the budget
+            self.governor.refund(held)
+
+    async def stream_completion(
+        self,
+        messages: list,
+        max_tokens: int = 1000,
+        tier: str = "quality"
+    ) -> AsyncIterator[str]:
+        """Yield content deltas from a streamed (stream: true) chat completion"""
+        reserved = estimate_tokens(messages, max_tokens)
+        try:
+            await self.governor.acquire(reserved)
+        except CapacityExceeded as e:
+            metrics.errors.inc("capacity_exceeded")
+            raise HTTPException(status_code=503, detail=f"LLM API Error: {str(e)}")
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    f"{self.api_base}/chat/completions",
-                    headers=headers,
-                    json={
-                        "model": self.model,
-                        "messages": messages,
-                        "max_tokens": max_tokens
-                    },
-                    timeout=30.0
-                )
+            self.breaker.before_call()
+        except CircuitOpenError as e:
+            self.governor.release()
+            self.governor.refund(reserved, requests=1)
+            metrics.errors.inc("circuit_open")
+            raise HTTPException(status_code=503, detail=f"LLM API Error: {str(e)}")
+        model = self.model_for(tier)
+        metrics.llm_in_flight.inc(self.name)
+        started = time.monotonic()
+        first_token = True
+        usage = None
+        answered = False
+        try:
+            async with self.client.stream(
+                "POST",
+                f"{self.api_base}/chat/completions",
+                headers=self._headers(),
+                json=self._payload(messages, max_tokens, stream=True, model=model),
+                timeout=REQUEST_TIMEOUT
+            ) as response:
                 response.raise_for_status()
-                return response.json()
+                answered = True
+                self.breaker.record_success()
+                self.latency.record(model, time.monotonic() - started, True)
+                metrics.llm_latency.observe(time.monotonic() - started, self.name, model, "success")
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    chunk = line[len("data:"):].strip()
+                    if chunk == "[DONE]":
+                        break
+                    frame = json.loads(chunk)
+                    # Groq reports usage on the last frame under x_groq
+                    frame_usage = frame.get("usage") or (frame.get("x_groq") or {}).get("usage")
+                    if frame_usage:
+                        usage = frame_usage
+                        metrics.record_usage(self.name, model, usage)
+                    choices = frame.get("choices") or [{}]
+                    content = choices[0].get("delta", {}).get("content")
+                    if content:
+                        if first_token:
+                            first_token = False
+                            metrics.llm_ttft.observe(time.monotonic() - started, self.name, model)
+                        yield content
         except Exception as e:
+            if isinstance(e, httpx.TransportError) or (
+                isinstance(e, httpx.HTTPStatusError) and e.response.status_code >= 500
+            ):
+                self.breaker.record_failure()
+                self.latency.record(model, time.monotonic() - started, False)
+            if isinstance(e, httpx.HTTPStatusError):
+                metrics.errors.inc(metrics.upstream_error_type(status=e.response.status_code))
+            elif isinstance(e, httpx.TransportError):
+                metrics.errors.inc(metrics.upstream_error_type(exc=e))
+            else:
+                metrics.errors.inc("upstream_invalid_response")
             raise HTTPException(status_code=500, detail=f"LLM API Error: {str(e)}")
+        finally:
+            metrics.llm_in_flight.dec(self.name)
+            self.breaker.release()
+            self.governor.release()
+            if usage:
+                self.governor.settle(reserved, usage)
+            elif not answered:
+                # Upstream rejected the call, so none of the reservation was used
+                self.governor.refund(reserved)
+
+class LocalStubProvider:
+    """
+    Offline provider that answers without any network call. Useful for local
+    development and as a last-resort fallback; responses are clearly marked.
+    """
+
+    fallback_only = True
+
+    def __init__(self, provider_name: str = "local"):
+        self.name = provider_name
+        self.model = "local-stub"
+        self.breaker = get_breaker(provider_name)
+        self.latency = ModelLatency()
+
+    def model_for(self, tier: str) -> str:
+        return self.model
+
+    def _answer(self, messages: list) -> str:
+        prompt = next((m["content"] for m in reversed(messages) if m.get("role") == "user"), "")
+        summary = " ".join(prompt.split())[:200]
+        return f"[local stub] No LLM upstream was available to answer: {summary}"
+
+    async def generate_completion(
+        self,
+        messages: list,
+        max_tokens: int = 1000,
+        coalesce: bool = True,
+        tier: str = "quality"
+    ):
+        content = self._answer(messages)
+        self.latency.record(self.model, 0.0, True)
+        return {
+            "choices": [{"message": {"role": "assistant", "content": content}}],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+        }
+
+    async def stream_completion(
+        self,
+        messages: list,
+        max_tokens: int = 1000,
+        tier: str = "quality"
+    ) -> AsyncIterator[str]:
+        self.latency.record(self.model, 0.0, True)
+        for word in self._answer(messages).split(" "):
+            yield word + " "
+
+
+def build_providers(names: Optional[list] = None) -> list:
+    """Instantiate the configured providers, skipping ones without credentials"""
+    providers = []
+    for name in names or LLM_PROVIDERS:
+        if name == "groq" and os.getenv("GROQ_API_KEY"):
+            providers.append(get_provider())
+        elif name == "openai" and PROVIDER_SPECS["openai"]["api_base"]:
+            providers.append(LLMProvider("openai"))
+        elif name == "local":
+            providers.append(LocalStubProvider())
+    if not providers:
+        raise HTTPException(status_code=500, detail="GROQ_API_KEY not found in environment variables")
+    return providers
+
 
 def get_provider():
-    return LLMProvider()
\ No newline at end of file
+    """Hand out the shared provider instance instead of building one per request"""
+    global _provider
+    if _provider is None:
+        _provider = LLMProvider()
+    return _provider
+
+
+def get_router() -> ProviderRouter:
+    """Shared router over every configured provider; routes depend on this"""
+    global _router
+    if _router is None:
+        _router = ProviderRouter(build_providers())
+    return _router
+
+
+def router_stats() -> Optional[dict]:
+    """Routing stats for /api/status; None until the first routed request"""
+    return _router.stats() if _router is not None else None
@@ -0,0 +1,232 @@
+import bisect
+import math
+import threading
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from api.services.cache import response_cache
+from api.services.coalesce import inflight_requests
+
+# Prometheus text exposition format, version 0.0.4
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class _Value(_Metric):
+    """A single number per label set, optionally read from a callback at scrape time"""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        collect: Optional[Callable[[], Dict[LabelValues, float]]] = None
+    ):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self._collect = collect
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0.0)
+
+    def render(self) -> List[str]:
+        values = self._collect() if self._collect else self._values
+        lines = self._header()
+        for labels, value in sorted(values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Value):
+    kind = "counter"
+
+
+class Gauge(_Value):
+    kind = "gauge"
+
+    def dec(self, *labels: str, amount: float = 1.0):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, value: float, *labels: str):
+        self._values[labels] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: non-cumulative bucket counts (last slot is +Inf), sum
+        self._series: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, *labels: str):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = ([0] * (len(self.buckets) + 1), [0.0])
+            series[0][index] += 1
+            series[1][0] += value
+
+    def count(self, *labels: str) -> int:
+        series = self._series.get(labels)
+        return sum(series[0]) if series else 0
+
+    def render(self) -> List[str]:
+        lines = self._header()
+        for labels, (counts, total) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(
+                    f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}"
+                )
+            label_str = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_str} {_format_value(total[0])}")
+            lines.append(f"{self.name}_count{label_str} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+# HTTP layer (middleware)
+http_requests = registry.register(Counter(
+    "synthex_http_requests_total", "HTTP requests by route, method and status", ("route", "method", "status")
+))
+http_latency = registry.register(Histogram(
+    "synthex_http_request_duration_seconds",
+    "Time until the response starts, by route (streams: time to headers)", ("route", "method")
+))
+http_in_flight = registry.register(Gauge(
+    "synthex_http_requests_in_flight", "HTTP requests currently being handled"
+))
+errors = registry.register(Counter(
+    "synthex_errors_total", "Errors by type (unhandled exceptions and upstream failures)", ("type",)
+))
+
+# Upstream LLM calls (LLMProvider hooks)
+llm_latency = registry.register(Histogram(
+    "synthex_llm_request_duration_seconds",
+    "Upstream LLM call latency per attempt", ("provider", "model", "outcome")
+))
+llm_ttft = registry.register(Histogram(
+    "synthex_llm_time_to_first_token_seconds",
+    "Time from sending a streamed request to its first content token", ("provider", "model")
+))
+llm_tokens = registry.register(Counter(
+    "synthex_llm_tokens_total", "Tokens reported in upstream usage", ("provider", "model", "kind")
+))
+llm_in_flight = registry.register(Gauge(
+    "synthex_llm_requests_in_flight", "Upstream LLM calls currently in flight", ("provider",)
+))
+
+# Caches and coalescing, read from their own stats at scrape time
+cache_requests = registry.register(Counter(
+    "synthex_cache_requests_total", "LLM response cache lookups by result", ("cache", "result"),
+    collect=lambda: {
+        ("response", "hit"): response_cache.stats()["hits"],
+        ("response", "miss"): response_cache.stats()["misses"],
+        ("response", "bypass"): response_cache.stats()["bypassed"]
+    }
+))
+cache_hit_ratio = registry.register(Gauge(
+    "synthex_cache_hit_ratio", "Hit ratio of the LLM response cache", ("cache",),
+    collect=lambda: {("response",): response_cache.stats()["hit_ratio"]}
+))
+coalesced_requests = registry.register(Counter(
+    "synthex_coalesced_requests_total", "Requests that joined an identical in-flight upstream call",
+    collect=lambda: {(): inflight_requests.stats()["coalesced"]}
+))
+
+
+def route_label(scope: dict) -> str:
+    """The matched route's path template, e.g. /api/jobs/{job_id}"""
+    if scope.get("route") is None:
+        return "unmatched"
+    path = scope["path"]
+    for name, value in scope.get("path_params", {}).items():
+        path = path.replace(f"/{value}", f"/{{{name}}}", 1)
+    return path
+
+
+def record_usage(provider: str, model: str, usage: Optional[dict]):
+    """Count prompt/completion tokens from an OpenAI-style `usage` block"""
+    if not usage:
+        return
+    for kind in ("prompt", "completion"):
+        tokens = usage.get(f"{kind}_tokens")
+        if tokens:
+            llm_tokens.inc(provider, model, kind, amount=tokens)
+
+
+def upstream_error_type(status: Optional[int] = None, exc: Optional[BaseException] = None) -> str:
+    """Coarse error type label for an upstream failure"""
+    if status == 429:
+        return "upstream_rate_limited"
+    if status is not None:
+        return "upstream_5xx" if status >= 500 else "upstream_4xx"
+    if exc is not None and "Timeout" in type(exc).__name__:
+        return "upstream_timeout"
+    return "upstream_transport"
@@ -0,0 +1,221 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from api.services.context_window import message_tokens
+
+# 0 disables a limit; set these to your Groq plan's RPM/TPM
+RPM_LIMIT = int(os.getenv("LLM_RPM_LIMIT", "0"))
+TPM_LIMIT = int(os.getenv("LLM_TPM_LIMIT", "0"))
+MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+MAX_WAIT = float(os.getenv("LLM_GOVERNOR_MAX_WAIT", "10"))
+# Optional SQLite file so every worker on the host shares one budget
+RATE_LIMIT_DB = os.getenv("LLM_RATE_LIMIT_DB", "")
+
+# (bucket name, amount, capacity, refill per second)
+BucketRequest = Tuple[str, float, float, float]
+
+
+class CapacityExceeded(Exception):
+    """Raised when a caller cannot get upstream capacity before its deadline"""
+
+
+def estimate_tokens(messages: list, max_tokens: int) -> int:
+    """Prompt estimate plus the full completion allowance, reserved up front"""
+    return sum(message_tokens(m) for m in messages) + max_tokens
+
+
+class MemoryBucketStore:
+    """Token buckets for a single process"""
+
+    def __init__(self):
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+
+    def take(self, requests: List[BucketRequest]) -> float:
+        """Take from every bucket atomically; otherwise return seconds to wait"""
+        now = time.monotonic()
+        levels, wait = {}, 0.0
+        for name, amount, capacity, rate in requests:
+            tokens, updated = self._buckets.get(name, (capacity, now))
+            levels[name] = min(capacity, tokens + (now - updated) * rate)
+            needed = min(amount, capacity)
+            if levels[name] < needed:
+                wait = max(wait, (needed - levels[name]) / rate)
+        if wait == 0:
+            for name, amount, capacity, _ in requests:
+                levels[name] -= min(amount, capacity)
+        for name in levels:
+            self._buckets[name] = (levels[name], now)
+        return wait
+
+    def give(self, name: str, amount: float, capacity: float):
+        if name in self._buckets:
+            tokens, updated = self._buckets[name]
+            self._buckets[name] = (min(capacity, tokens + amount), updated)
+
+
+class SQLiteBucketStore:
+    """Token buckets in a SQLite file, shared by all workers on one host"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10, isolation_level=None)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS rate_buckets ("
+                "name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+
+    def take(self, requests: List[BucketRequest]) -> float:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                levels, wait = {}, 0.0
+                for name, amount, capacity, rate in requests:
+                    row = self._conn.execute(
+                        "SELECT tokens, updated_at FROM rate_buckets WHERE name = ?", (name,)
+                    ).fetchone()
+                    tokens, updated = row if row else (capacity, now)
+                    levels[name] = min(capacity, tokens + max(0.0, now - updated) * rate)
+                    needed = min(amount, capacity)
+                    if levels[name] < needed:
+                        wait = max(wait, (needed - levels[name]) / rate)
+                if wait == 0:
+                    for name, amount, capacity, _ in requests:
+                        levels[name] -= min(amount, capacity)
+                for name, tokens in levels.items():
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO rate_buckets (name, tokens, updated_at) VALUES (?, ?, ?)",
+                        (name, tokens, now)
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return wait
+
+    def give(self, name: str, amount: float, capacity: float):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE rate_buckets SET tokens = MIN(?, tokens + ?) WHERE name = ?",
+                (capacity, amount, name)
+            )
+
+
+class Governor:
+    """
+    Client-side RPM/TPM token buckets plus a concurrency cap for upstream
+    calls. Callers queue in FIFO order (asyncio.Lock is fair) and are shed
+    with CapacityExceeded once they would wait longer than `max_wait`.
+    """
+
+    def __init__(
+        self,
+        rpm: int = RPM_LIMIT,
+        tpm: int = TPM_LIMIT,
+        max_concurrency: int = MAX_CONCURRENCY,
+        max_wait: float = MAX_WAIT,
+        store=None,
+        name: str = "groq"
+    ):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.max_wait = max_wait
+        self.name = name
+        self.store = store if store is not None else MemoryBucketStore()
+        self._shared = isinstance(self.store, SQLiteBucketStore)
+        self._lock = asyncio.Lock()
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.max_concurrency = max_concurrency
+        self.in_flight = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.shed = 0
+        self.total_wait = 0.0
+
+    def _requests(self, tokens: int) -> List[BucketRequest]:
+        requests = []
+        if self.rpm > 0:
+            requests.append((f"{self.name}:rpm", 1, self.rpm, self.rpm / 60))
+        if self.tpm > 0 and tokens > 0:
+            requests.append((f"{self.name}:tpm", tokens, self.tpm, self.tpm / 60))
+        return requests
+
+    async def _take(self, requests: List[BucketRequest]) -> float:
+        if self._shared:
+            return await asyncio.to_thread(self.store.take, requests)
+        return self.store.take(requests)
+
+    async def acquire(self, tokens: int):
+        """
+        Wait for rate budget and a concurrency slot, or raise CapacityExceeded.
+        Every call takes one request from the RPM bucket; pass tokens=0 for a
+        retry whose tokens are already reserved.
+        """
+        started = time.monotonic()
+        deadline = started + self.max_wait
+        self.waiting += 1
+        try:
+            requests = self._requests(tokens)
+            if requests:
+                async with self._lock:
+                    while True:
+                        wait = await self._take(requests)
+                        if wait == 0:
+                            break
+                        if time.monotonic() + wait > deadline:
+                            self.shed += 1
+                            raise CapacityExceeded(
+                                f"LLM rate limit budget exhausted; retry in {wait:.1f}s"
+                            )
+                        await asyncio.sleep(wait)
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), max(0.0, deadline - time.monotonic()))
+            except asyncio.TimeoutError:
+                if requests:
+                    self.refund(tokens, requests=1)
+                self.shed += 1
+                raise CapacityExceeded("Too many concurrent LLM requests; try again shortly")
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+        self.admitted += 1
+        self.total_wait += time.monotonic() - started
+
+    def release(self):
+        self.in_flight -= 1
+        self._semaphore.release()
+
+    def refund(self, tokens: float, requests: int = 0):
+        """Return reserved tokens (and request slots) that the call did not use"""
+        if self.tpm > 0 and tokens > 0:
+            self.store.give(f"{self.name}:tpm", tokens, self.tpm)
+        if self.rpm > 0 and requests > 0:
+            self.store.give(f"{self.name}:rpm", requests, self.rpm)
+
+    def settle(self, reserved: int, usage: Optional[Dict[str, Any]]):
+        """Refund the gap between the reservation and the reported usage"""
+        if usage and usage.get("total_tokens") is not None:
+            self.refund(reserved - usage["total_tokens"])
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "rpm_limit": self.rpm,
+            "tpm_limit": self.tpm,
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "shed": self.shed,
+            "avg_wait": round(self.total_wait / self.admitted, 4) if self.admitted else 0.0,
+            "shared_store": self._shared
+        }
+
+
+governor = Governor(store=SQLiteBucketStore(RATE_LIMIT_DB) if RATE_LIMIT_DB else None)
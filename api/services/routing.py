@@ -0,0 +1,303 @@
+import asyncio
+import copy
+import logging
+import math
+import os
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from fastapi import HTTPException
+
+# Rolling health window per provider/model and the thresholds applied to it
+ROUTER_WINDOW_SECONDS = float(os.getenv("LLM_ROUTER_WINDOW", "300"))
+ROUTER_MIN_SAMPLES = int(os.getenv("LLM_ROUTER_MIN_SAMPLES", "5"))
+ROUTER_MAX_ERROR_RATE = float(os.getenv("LLM_ROUTER_MAX_ERROR_RATE", "0.5"))
+ROUTER_MAX_SAMPLES = 1000
+
+# Hedged requests: opt-in for /generate, where tail latency matters more than cost
+HEDGE_GENERATE = os.getenv("LLM_HEDGE_GENERATE", "false").lower() in ("1", "true", "yes")
+HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+# Hedge delay used until the primary has enough latency samples
+HEDGE_DELAY = float(os.getenv("LLM_HEDGE_DELAY", "1.5"))
+# "same" repeats the call on the primary's model, "alternate" uses the next provider
+HEDGE_TARGET = os.getenv("LLM_HEDGE_TARGET", "same")
+
+logger = logging.getLogger(__name__)
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile; None when there are no values"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+class LatencyWindow:
+    """Upstream call outcomes from the last `window` seconds"""
+
+    def __init__(self, window: float = ROUTER_WINDOW_SECONDS, max_samples: int = ROUTER_MAX_SAMPLES):
+        self.window = window
+        self._samples: deque = deque(maxlen=max_samples)
+
+    def record(self, latency: float, ok: bool):
+        self._samples.append((time.monotonic(), latency, ok))
+
+    def _prune(self):
+        cutoff = time.monotonic() - self.window
+        while self._samples and self._samples[0][0] < cutoff:
+            self._samples.popleft()
+
+    @property
+    def count(self) -> int:
+        self._prune()
+        return len(self._samples)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        self._prune()
+        return percentile([latency for _, latency, ok in self._samples if ok], pct)
+
+    def error_rate(self) -> float:
+        self._prune()
+        if not self._samples:
+            return 0.0
+        return sum(1 for _, _, ok in self._samples if not ok) / len(self._samples)
+
+    def stats(self) -> Dict[str, Any]:
+        p50, p95 = self.percentile(50), self.percentile(95)
+        return {
+            "samples": self.count,
+            "p50": round(p50, 4) if p50 is not None else None,
+            "p95": round(p95, 4) if p95 is not None else None,
+            "error_rate": round(self.error_rate(), 4)
+        }
+
+
+class ModelLatency:
+    """One provider's rolling windows, one per model, so tiers are not mixed"""
+
+    def __init__(self, window: float = ROUTER_WINDOW_SECONDS):
+        self.window_seconds = window
+        self._windows: Dict[str, LatencyWindow] = {}
+
+    def window(self, model: str) -> LatencyWindow:
+        if model not in self._windows:
+            self._windows[model] = LatencyWindow(self.window_seconds)
+        return self._windows[model]
+
+    def record(self, model: str, latency: float, ok: bool):
+        self.window(model).record(latency, ok)
+
+    def stats(self) -> Dict[str, Any]:
+        return {model: window.stats() for model, window in self._windows.items()}
+
+
+class ProviderRouter:
+    """
+    Sends each call to the best healthy provider and fails over to the next
+    one on upstream errors (any 5xx, including open breakers and a saturated
+    governor). Providers are ranked by the rolling p95 latency of the model
+    they would use for this view's tier; ones without
+    enough samples yet keep their configured order so they get explored.
+    A provider is unhealthy while its breaker is open or its recent error
+    rate is above `max_error_rate`; unhealthy providers are tried last, and
+    fallback-only providers (the local stub) after every real upstream.
+    """
+
+    def __init__(
+        self,
+        providers: List[Any],
+        min_samples: int = ROUTER_MIN_SAMPLES,
+        max_error_rate: float = ROUTER_MAX_ERROR_RATE
+    ):
+        self.providers: Dict[str, Any] = {p.name: p for p in providers}
+        self.min_samples = min_samples
+        self.max_error_rate = max_error_rate
+        self.preferred: Optional[str] = None
+        self.tier = "quality"
+        # Shared by every view returned from using()
+        self._counters = {
+            "routed": {name: 0 for name in self.providers},
+            "failovers": 0,
+            "hedge": {"requests": 0, "hedged": 0, "primary_wins": 0, "hedge_wins": 0}
+        }
+
+    def using(self, preferred: Optional[str] = None, tier: str = "quality") -> "ProviderRouter":
+        """
+        A view of this router that tries `preferred` first when it is
+        registered and asks every provider for its `tier` model
+        """
+        view = copy.copy(self)
+        view.preferred = preferred if preferred in self.providers else None
+        view.tier = tier
+        return view
+
+    def window(self, provider) -> LatencyWindow:
+        """Latency window of the model `provider` would use for this tier"""
+        return provider.latency.window(provider.model_for(self.tier))
+
+    def healthy(self, provider) -> bool:
+        breaker = provider.breaker
+        if breaker.state == "open" and time.monotonic() - breaker.opened_at < breaker.reset_timeout:
+            return False
+        window = self.window(provider)
+        return window.count < self.min_samples or window.error_rate() <= self.max_error_rate
+
+    def candidates(self) -> List[Any]:
+        """Providers in the order they should be tried for the next call"""
+        order = list(self.providers.values())
+
+        def rank(item):
+            index, provider = item
+            window = self.window(provider)
+            p95 = window.percentile(95) if window.count >= self.min_samples else None
+            fallback = getattr(provider, "fallback_only", False)
+            return (fallback, not self.healthy(provider), p95 if p95 is not None else 0.0, index)
+
+        ranked = [provider for _, provider in sorted(enumerate(order), key=rank)]
+        if self.preferred:
+            ranked.sort(key=lambda p: p.name != self.preferred)
+        return ranked
+
+    @property
+    def model(self) -> str:
+        return self.candidates()[0].model_for(self.tier)
+
+    def _answered_by(self, provider, response: Dict[str, Any]) -> Dict[str, Any]:
+        """Copy of `response` tagged with the model that actually produced it"""
+        return {**response, "routed_model": provider.model_for(self.tier)}
+
+    def _routed(self, provider, attempt: int):
+        self._counters["routed"][provider.name] += 1
+        if attempt > 0:
+            self._counters["failovers"] += 1
+
+    async def generate_completion(self, messages: list, max_tokens: int = 1000):
+        error: Optional[HTTPException] = None
+        for attempt, provider in enumerate(self.candidates()):
+            self._routed(provider, attempt)
+            try:
+                response = await provider.generate_completion(messages, max_tokens=max_tokens, tier=self.tier)
+                return self._answered_by(provider, response)
+            except HTTPException as e:
+                if e.status_code < 500:
+                    raise
+                logger.warning("Provider %s failed (%s); failing over", provider.name, e.detail)
+                error = e
+        raise error
+
+    def hedge_delay(self, provider, pct: float = HEDGE_PERCENTILE) -> float:
+        """Seconds to wait for the primary before firing the hedge"""
+        window = self.window(provider)
+        if window.count >= self.min_samples:
+            observed = window.percentile(pct)
+            if observed is not None:
+                return observed
+        return HEDGE_DELAY
+
+    def _hedge_target(self, candidates: List[Any], target: str):
+        if target == "alternate":
+            for provider in candidates[1:]:
+                if not getattr(provider, "fallback_only", False):
+                    return provider
+        return candidates[0]
+
+    async def hedged_completion(
+        self,
+        messages: list,
+        max_tokens: int = 1000,
+        pct: float = HEDGE_PERCENTILE,
+        target: str = HEDGE_TARGET
+    ):
+        """
+        Send the call to the best provider and, if it has not answered within
+        its recent `pct` latency (or failed), fire an identical second call.
+        The first successful response wins and the other call is cancelled.
+        """
+        candidates = self.candidates()
+        primary, backup = candidates[0], self._hedge_target(candidates, target)
+        stats = self._counters["hedge"]
+        stats["requests"] += 1
+        self._routed(primary, 0)
+
+        first = asyncio.create_task(
+            primary.generate_completion(messages, max_tokens=max_tokens, tier=self.tier)
+        )
+        second: Optional[asyncio.Task] = None
+        pending = {first}
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending,
+                    timeout=None if second else self.hedge_delay(primary, pct),
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None:
+                        stats["hedge_wins" if task is second else "primary_wins"] += 1
+                        return self._answered_by(backup if task is second else primary, task.result())
+                    error = task.exception()
+                if second is None:
+                    stats["hedged"] += 1
+                    self._routed(backup, 0)
+                    second = asyncio.create_task(
+                        backup.generate_completion(
+                            messages, max_tokens=max_tokens, coalesce=False, tier=self.tier
+                        )
+                    )
+                    pending.add(second)
+        finally:
+            for task in (first, second):
+                if task is not None and not task.done():
+                    task.cancel()
+            await asyncio.gather(*[t for t in (first, second) if t is not None], return_exceptions=True)
+        raise error
+
+    async def stream_completion(self, messages: list, max_tokens: int = 1000) -> AsyncIterator[str]:
+        """Fail over only until the first token; after that the stream is committed"""
+        error: Optional[HTTPException] = None
+        for attempt, provider in enumerate(self.candidates()):
+            self._routed(provider, attempt)
+            tokens = provider.stream_completion(messages, max_tokens=max_tokens, tier=self.tier)
+            try:
+                first = await tokens.__anext__()
+            except StopAsyncIteration:
+                return
+            except HTTPException as e:
+                if e.status_code < 500:
+                    raise
+                logger.warning("Provider %s failed (%s); failing over", provider.name, e.detail)
+                error = e
+                continue
+            try:
+                yield first
+                async for token in tokens:
+                    yield token
+            finally:
+                await tokens.aclose()
+            return
+        raise error
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "providers": {
+                name: {
+                    "model": provider.model,
+                    "healthy": self.healthy(provider),
+                    "routed": self._counters["routed"][name],
+                    "models": provider.latency.stats()
+                }
+                for name, provider in self.providers.items()
+            },
+            "failovers": self._counters["failovers"],
+            "hedging": self._hedge_stats()
+        }
+
+    def _hedge_stats(self) -> Dict[str, Any]:
+        stats = self._counters["hedge"]
+        return {
+            **stats,
+            "hedge_rate": round(stats["hedged"] / stats["requests"], 4) if stats["requests"] else 0.0
+        }
@@ -0,0 +1,26 @@
+import json
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # optional; responses fall back to the stdlib encoder
+    orjson = None
+
+
+def dumps(content: Any) -> bytes:
+    """JSON-encode plain Python data (dicts, lists, str, numbers, None)"""
+    if orjson is None:
+        return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    Default response class: renders with orjson when it is installed. Routes
+    with a response model are converted to plain data by their model first.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -0,0 +1,146 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List
+
+from api.services.cache import LRUCache
+
+SESSION_BACKEND = os.getenv("LEARN_SESSION_STORE", "memory").lower()
+SESSION_DB_PATH = os.getenv("LEARN_SESSION_DB", "learn_sessions.db")
+SESSION_TTL = float(os.getenv("LEARN_SESSION_TTL", "3600"))
+MAX_SESSIONS = int(os.getenv("LEARN_MAX_SESSIONS", "1000"))
+SESSION_MAX_BYTES = int(os.getenv("LEARN_SESSION_MAX_BYTES", str(32 * 1024 * 1024)))
+
+
+class SessionStore:
+    """Interface for learning-session context storage"""
+
+    async def get(self, key: str) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+    async def set(self, key: str, context: List[Dict[str, Any]]):
+        raise NotImplementedError
+
+    async def delete(self, key: str):
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, Any]:
+        raise NotImplementedError
+
+
+class MemorySessionStore(SessionStore):
+    """Per-process store with LRU eviction, idle TTL and a byte budget"""
+
+    def __init__(self, max_sessions: int = MAX_SESSIONS, ttl: float = SESSION_TTL, max_bytes: int = SESSION_MAX_BYTES):
+        self._sessions = LRUCache(max_entries=max_sessions, max_bytes=max_bytes, ttl=ttl)
+
+    async def get(self, key: str) -> List[Dict[str, Any]]:
+        context = self._sessions.get(key)
+        return list(context) if context is not None else []
+
+    async def set(self, key: str, context: List[Dict[str, Any]]):
+        size = len(json.dumps(context))
+        self._sessions.set(key, list(context), size)
+
+    async def delete(self, key: str):
+        self._sessions.delete(key)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": "memory",
+            "sessions": len(self._sessions),
+            "max_sessions": self._sessions.max_entries,
+            "bytes": self._sessions.total_bytes,
+            "max_bytes": self._sessions.max_bytes
+        }
+
+
+class SQLiteSessionStore(SessionStore):
+    """Store shared by every uvicorn worker on one host through a SQLite file"""
+
+    def __init__(
+        self,
+        path: str = SESSION_DB_PATH,
+        max_sessions: int = MAX_SESSIONS,
+        ttl: float = SESSION_TTL,
+        table: str = "learn_sessions"
+    ):
+        if not table.isidentifier():
+            raise ValueError(f"Invalid session table name: {table}")
+        self.path = path
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.table = table
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} ("
+                "key TEXT PRIMARY KEY, context TEXT NOT NULL, updated_at REAL NOT NULL)"
+            )
+
+    def _get(self, key: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT context, updated_at FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or row[1] + self.ttl < time.time():
+            return []
+        return json.loads(row[0])
+
+    def _set(self, key: str, context: List[Dict[str, Any]]):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, context, updated_at) VALUES (?, ?, ?)",
+                (key, json.dumps(context), now)
+            )
+            self._conn.execute(f"DELETE FROM {self.table} WHERE updated_at < ?", (now - self.ttl,))
+            self._conn.execute(
+                f"DELETE FROM {self.table} WHERE key IN (SELECT key FROM {self.table} "
+                "ORDER BY updated_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_sessions,)
+            )
+
+    def _delete(self, key: str):
+        with self._lock, self._conn:
+            self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+
+    async def get(self, key: str) -> List[Dict[str, Any]]:
+        return await asyncio.to_thread(self._get, key)
+
+    async def set(self, key: str, context: List[Dict[str, Any]]):
+        await asyncio.to_thread(self._set, key, context)
+
+    async def delete(self, key: str):
+        await asyncio.to_thread(self._delete, key)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            count, size = self._conn.execute(
+                f"SELECT COUNT(*), COALESCE(SUM(LENGTH(context)), 0) FROM {self.table}"
+            ).fetchone()
+        return {
+            "backend": "sqlite",
+            "sessions": count,
+            "max_sessions": self.max_sessions,
+            "bytes": size
+        }
+
+
+def create_session_store(
+    backend: str = SESSION_BACKEND,
+    path: str = SESSION_DB_PATH,
+    max_sessions: int = MAX_SESSIONS,
+    ttl: float = SESSION_TTL,
+    max_bytes: int = SESSION_MAX_BYTES,
+    table: str = "learn_sessions"
+) -> SessionStore:
+    """Pick the session backend (memory or sqlite); defaults are the LEARN_SESSION_* settings"""
+    if backend == "sqlite":
+        return SQLiteSessionStore(path, max_sessions, ttl, table)
+    return MemorySessionStore(max_sessions, ttl, max_bytes)
@@ -0,0 +1,44 @@
+import inspect
+import json
+from typing import AsyncIterator, Callable, Dict, Any
+
+from fastapi.responses import StreamingResponse
+
+
+def format_sse(event: str, data: Dict[str, Any]) -> str:
+    """Encode one Server-Sent Event frame"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def sse_events(
+    tokens: AsyncIterator[str],
+    finalize: Callable[[str], Dict[str, Any]]
+) -> AsyncIterator[str]:
+    """
+    Relay tokens as `token` events, then emit a `done` event whose payload
+    matches the non-streaming route (`finalize` parses the full text and
+    may be a coroutine function).
+    Failures are reported as an `error` event in the APIResponse shape.
+    """
+    parts = []
+    try:
+        async for token in tokens:
+            parts.append(token)
+            yield format_sse("token", {"content": token})
+        data = finalize("".join(parts))
+        if inspect.isawaitable(data):
+            data = await data
+        yield format_sse("done", {"success": True, "data": data, "error": None})
+    except Exception as e:
+        yield format_sse("error", {"success": False, "data": {}, "error": str(e)})
+
+
+def sse_response(
+    tokens: AsyncIterator[str],
+    finalize: Callable[[str], Dict[str, Any]]
+) -> StreamingResponse:
+    return StreamingResponse(
+        sse_events(tokens, finalize),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
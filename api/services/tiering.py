@@ -0,0 +1,79 @@
+import logging
+import os
+from typing import Dict, List, NamedTuple, Optional
+
+# Per-endpoint completion budgets, as defined in config.py (Settings.MAX_TOKENS).
+# config.py cannot be imported by the API because the config/ package shadows it.
+MAX_TOKENS = {
+    "explain": 2048,
+    "generate": 1024,
+    "interactive": 4096
+}
+
+# Endpoint name -> MAX_TOKENS key
+ENDPOINT_BUDGETS = {
+    "explain": "explain",
+    "generate": "generate",
+    "learn": "interactive"
+}
+
+# Inputs at or below these sizes are candidates for the fast tier
+TIER_FAST_MAX_CHARS = int(os.getenv("LLM_TIER_FAST_MAX_CHARS", "800"))
+TIER_FAST_MAX_LINES = int(os.getenv("LLM_TIER_FAST_MAX_LINES", "25"))
+TIERING_ENABLED = os.getenv("LLM_TIERING", "true").lower() in ("1", "true", "yes")
+
+# Focus areas that need real reasoning rather than a paraphrase of the code
+DEEP_FOCUS_AREAS = {"time complexity", "space complexity", "edge cases", "best practices"}
+
+logger = logging.getLogger(__name__)
+
+tier_counts: Dict[str, int] = {"fast": 0, "quality": 0}
+
+
+class TierDecision(NamedTuple):
+    tier: str
+    max_tokens: int
+    reason: str
+
+
+def classify_request(
+    endpoint: str,
+    text: str,
+    difficulty: Optional[str] = None,
+    focus_areas: Optional[List[str]] = None
+) -> TierDecision:
+    """
+    Pick a model tier from the request inputs alone (no LLM call): small,
+    non-advanced requests without reasoning-heavy focus areas go to the fast
+    tier, everything else to the quality tier. Learn sessions only use the
+    fast tier for beginners.
+    """
+    max_tokens = MAX_TOKENS[ENDPOINT_BUDGETS.get(endpoint, "explain")]
+    level = (difficulty or "intermediate").lower()
+    # The Streamlit client sends snake_case areas ("time_complexity")
+    deep = sorted(DEEP_FOCUS_AREAS.intersection(area.lower().replace("_", " ") for area in focus_areas or []))
+    chars, lines = len(text), text.count("\n") + 1
+
+    if not TIERING_ENABLED:
+        tier, reason = "quality", "tiering disabled"
+    elif level == "advanced":
+        tier, reason = "quality", "advanced difficulty"
+    elif deep:
+        tier, reason = "quality", f"focus on {', '.join(deep)}"
+    elif chars > TIER_FAST_MAX_CHARS or lines > TIER_FAST_MAX_LINES:
+        tier, reason = "quality", f"large input ({chars} chars, {lines} lines)"
+    elif endpoint == "learn" and level != "beginner":
+        tier, reason = "quality", f"{level} lesson"
+    else:
+        tier, reason = "fast", f"small input ({chars} chars, {lines} lines)"
+
+    tier_counts[tier] += 1
+    logger.info(
+        "Model tier for %s: %s (max_tokens=%d, difficulty=%s, reason=%s)",
+        endpoint, tier, max_tokens, level, reason
+    )
+    return TierDecision(tier, max_tokens, reason)
+
+
+def tier_stats() -> Dict[str, int]:
+    return dict(tier_counts)
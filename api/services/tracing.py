@@ -0,0 +1,200 @@
+import json
+import os
+import secrets
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# none | stdout | file
+TRACING_EXPORTER = os.getenv("TRACING_EXPORTER", "none").lower()
+TRACING_FILE = os.getenv("TRACING_FILE", "traces.jsonl")
+
+TRACE_ID_HEADER = "X-Trace-Id"
+
+
+class Span:
+    """One timed stage of a request, OpenTelemetry-shaped (trace/span/parent ids)"""
+
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "start", "end", "attributes", "status")
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str] = None, start: Optional[float] = None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.start = start if start is not None else time.time()
+        self.end: Optional[float] = None
+        self.attributes: Dict[str, Any] = {}
+        self.status = "ok"
+
+    def set(self, **attributes: Any):
+        self.attributes.update(attributes)
+
+    @property
+    def duration_ms(self) -> Optional[float]:
+        return round((self.end - self.start) * 1000, 3) if self.end is not None else None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start": self.start,
+            "duration_ms": self.duration_ms,
+            "status": self.status,
+            "attributes": self.attributes
+        }
+
+
+class StdoutExporter:
+    def export(self, span: Span):
+        sys.stdout.write(json.dumps(span.to_dict(), default=str) + "\n")
+
+
+class JsonFileExporter:
+    """Appends one JSON object per finished span (JSON Lines)"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, span: Span):
+        line = json.dumps(span.to_dict(), default=str) + "\n"
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line)
+
+
+class InMemoryExporter:
+    """Keeps finished spans in a list; handy in tests and notebooks"""
+
+    def __init__(self):
+        self.spans: List[Span] = []
+
+    def export(self, span: Span):
+        self.spans.append(span)
+
+
+def create_exporter(kind: str = TRACING_EXPORTER, path: str = TRACING_FILE):
+    if kind == "stdout":
+        return StdoutExporter()
+    if kind == "file":
+        return JsonFileExporter(path)
+    return None
+
+
+# Finished spans go here; None records ids and headers but exports nothing
+exporter = create_exporter()
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+_request_span: ContextVar[Optional[Span]] = ContextVar("request_span", default=None)
+
+
+def set_exporter(new_exporter):
+    global exporter
+    exporter = new_exporter
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def current_trace_id() -> Optional[str]:
+    active = _current_span.get()
+    return active.trace_id if active else None
+
+
+def parse_traceparent(header: Optional[str]) -> Tuple[Optional[str], Optional[str]]:
+    """(trace_id, parent span id) from a W3C traceparent header, if valid"""
+    if not header:
+        return None, None
+    parts = header.strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None, None
+    try:
+        int(parts[1], 16), int(parts[2], 16)
+    except ValueError:
+        return None, None
+    if parts[1] == "0" * 32:
+        return None, None
+    return parts[1], parts[2]
+
+
+def traceparent(span: Span) -> str:
+    return f"00-{span.trace_id}-{span.span_id}-01"
+
+
+def _finish(span: Span):
+    span.end = time.time()
+    if exporter is not None:
+        exporter.export(span)
+
+
+@contextmanager
+def span(name: str, trace_id: Optional[str] = None, parent_id: Optional[str] = None, **attributes: Any) -> Iterator[Span]:
+    """
+    Time a block as a child of the current span. With no current span a new
+    trace is started (or `trace_id`/`parent_id` continue an incoming one).
+    """
+    parent = _current_span.get()
+    if parent is not None and trace_id is None:
+        trace_id, parent_id = parent.trace_id, parent.span_id
+    current = Span(name, trace_id or secrets.token_hex(16), parent_id)
+    current.attributes.update(attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.status = "error"
+        current.set(error=type(e).__name__)
+        raise
+    finally:
+        _current_span.reset(token)
+        _finish(current)
+
+
+def record_span(name: str, start: float, **attributes: Any) -> Optional[Span]:
+    """
+    Record a stage that already happened (from `start` until now) under the
+    current span, e.g. request parsing done by the framework before a handler
+    runs.
+    """
+    parent = _current_span.get()
+    if parent is None:
+        return None
+    finished = Span(name, parent.trace_id, parent.span_id, start=start)
+    finished.attributes.update(attributes)
+    _finish(finished)
+    return finished
+
+
+def request_span() -> Optional[Span]:
+    """The root span of the current request (set by the tracing middleware)"""
+    return _request_span.get()
+
+
+@contextmanager
+def trace_request(name: str, headers) -> Iterator[Span]:
+    """Root span for one HTTP request, continuing an incoming traceparent"""
+    trace_id, parent_id = parse_traceparent(headers.get("traceparent"))
+    with span(name, trace_id=trace_id, parent_id=parent_id) as root:
+        token = _request_span.set(root)
+        try:
+            yield root
+        finally:
+            _request_span.reset(token)
+
+
+def mark_parsed(**attributes: Any) -> Optional[Span]:
+    """
+    Call first thing in a handler: records `request.parse`, the time the
+    framework spent reading and validating the body (multipart included)
+    since the request started.
+    """
+    root = _request_span.get()
+    if root is None:
+        return None
+    return record_span("request.parse", root.start, **attributes)
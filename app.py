@@ -1,5 +1,6 @@
 import streamlit as st
 import os
+import uuid
 from datetime import datetime
 from utils.code_formatter import CodeFormatter
 from pages import generate, home, explain, learn
@@ -9,16 +10,23 @@ from components.advanced_code_editor import AdvancedCodeEditor
 from components.language_selector import LanguageSelector
 from components.loading import LoadingHandler
 from utils.error_handler import ErrorHandler
+from utils.state_manager import ensure_history_views, history_page
+
+# Session history entries shown per page
+HISTORY_PAGE_SIZE = int(os.getenv("HISTORY_PAGE_SIZE", "5"))
 
 def init_session_state():
     defaults = {
         "page": "home",
         "history": [],
+        "history_page": 0,
         "current_code": "",
         "current_explanation": "",
         "model_provider": "Groq (Llama 3)",
         "difficulty": "Intermediate",
         "language": "Python",
+        # Lets the backend re-explain only the definitions that changed
+        "explain_session_id": uuid.uuid4().hex,
         # Enhanced settings
         "theme": "light",
         "settings": {
@@ -426,51 +434,43 @@ def render_history(formatter):
             with col2:
                 if st.button("🗑️ Clear History", type="secondary"):
                     st.session_state.history = []
+                    st.session_state.history_page = 0
                     st.rerun()
             
-            # Display history items
-            for i, item in enumerate(reversed(st.session_state.history)):
+            # Newest first, one page at a time
+            items = st.session_state.history[::-1]
+            page, pages, start = history_page(len(items), st.session_state.get("history_page", 0), HISTORY_PAGE_SIZE)
+            st.session_state.history_page = page
+            with col1:
+                st.caption(f"{len(items)} entries • page {page + 1} of {pages}")
+            
+            for item in items[start:start + HISTORY_PAGE_SIZE]:
+                # Entries stored before summaries were precomputed, edited since,
+                # or rendered in another code theme are rebuilt on view
+                ensure_history_views(item, formatter)
+                
                 with st.container():
                     st.markdown(f"""
                     <div class="history-item">
                         <h4>🕒 {item['timestamp']} - {item['mode']} ({item.get('language', 'Unknown')})</h4>
+                        <p>{item['summary']}</p>
+                    </div>
                     """, unsafe_allow_html=True)
                     
-                    if item['mode'] == "Explanation":
-                        if 'full_code' in item:
-                            highlighted_code = formatter.highlight_code(
-                                item['full_code'], 
-                                item['language'].lower()
-                            )
-                            st.markdown(highlighted_code, unsafe_allow_html=True)
-                        st.markdown(f"""
-                        <div class="explanation-container">
-                            {item.get('explanation', '')}
-                        </div>
-                        """, unsafe_allow_html=True)
-                    
-                    elif item['mode'] == "Generation":
-                        st.markdown(f"""
-                        <div style='padding: 12px 0; background: #f8f9ff; border-radius: 8px; padding: 16px; margin: 12px 0;'>
-                            <strong>🎯 Prompt:</strong> {item.get('prompt', '')}
-                        </div>
-                        """, unsafe_allow_html=True)
-                        if 'code' in item:
-                            highlighted_code = formatter.highlight_code(
-                                item['code'], 
-                                item['language'].lower()
-                            )
-                            st.markdown(highlighted_code, unsafe_allow_html=True)
-                    
-                    elif item['mode'] == "Learning":
-                        st.markdown(f"""
-                        <div style='padding: 12px 0; background: #f0fff0; border-radius: 8px; padding: 16px; margin: 12px 0;'>
-                            <strong>📚 Topic:</strong> {item.get('topic', '')}<br>
-                            <strong>📊 Difficulty:</strong> {item.get('difficulty', '')}
-                        </div>
-                        """, unsafe_allow_html=True)
-                    
-                    st.markdown("</div>", unsafe_allow_html=True)
+                    # Full code and explanation are only sent when asked for
+                    if st.toggle("Show details", key=f"history_details_{item['id']}"):
+                        st.markdown(item['detail_html'], unsafe_allow_html=True)
+            
+            if pages > 1:
+                prev_col, _, next_col = st.columns([1, 3, 1])
+                with prev_col:
+                    if st.button("← Newer", key="history_prev", disabled=page == 0):
+                        st.session_state.history_page = page - 1
+                        st.rerun()
+                with next_col:
+                    if st.button("Older →", key="history_next", disabled=page >= pages - 1):
+                        st.session_state.history_page = page + 1
+                        st.rerun()
 
 def main():
     # Page config
@@ -0,0 +1,281 @@
+"""
+Load test for the Synthex API.
+
+Against a running backend:
+
+    python -m benchmarks.load_test --base-url http://127.0.0.1:8000 --concurrency 16 --requests 200
+
+Fully offline (starts the mock LLM server and the backend itself):
+
+    python -m benchmarks.load_test --spawn --workers 2 --mock-latency lognormal:-1.2,0.5
+
+Results are written as JSON (benchmarks/results/<timestamp>-<commit>.json by
+default); pass --compare <older.json> to print the change per endpoint.
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+import httpx
+
+from api.services.routing import percentile
+
+ENDPOINTS = ("explain", "batch", "generate", "learn")
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+
+def _code(i: int) -> str:
+    return f"def handler_{i}(items):\n    total = 0\n    for item in items:\n        total += item * {i}\n    return total\n"
+
+
+def build_request(endpoint: str, i: int, client: httpx.AsyncClient) -> Callable:
+    """One request for `endpoint`; `i` varies the payload so the response cache does not answer everything"""
+    if endpoint == "explain":
+        return lambda: client.post("/api/explain", json={
+            "code": _code(i), "language": "python", "difficulty": "intermediate"
+        })
+    if endpoint == "batch":
+        files = [("files", (f"file_{i}_{n}.py", _code(i * 10 + n).encode(), "text/plain")) for n in range(3)]
+        return lambda: client.post("/api/explain/batch", files=files, data={"focus_areas": "Logic Flow"})
+    if endpoint == "generate":
+        return lambda: client.post("/api/generate", json={
+            "language": "python", "description": f"function that sums the first {i} primes"
+        })
+    if endpoint == "learn":
+        return lambda: client.post(f"/api/learn?session_id=load-{i % 50}", json={
+            "main_topic": f"recursion step {i}", "language": "python", "difficulty": "beginner"
+        })
+    raise ValueError(f"Unknown endpoint: {endpoint}")
+
+
+def summarize(latencies: List[float], errors: int, elapsed: float) -> Dict[str, Any]:
+    count = len(latencies)
+    return {
+        "requests": count,
+        "errors": errors,
+        "error_rate": round(errors / count, 4) if count else 0.0,
+        "throughput_rps": round(count / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": {
+            name: round(percentile(latencies, pct) * 1000, 2) if latencies else None
+            for name, pct in (("p50", 50), ("p95", 95), ("p99", 99))
+        } | {
+            "mean": round(sum(latencies) / count * 1000, 2) if count else None,
+            "max": round(max(latencies) * 1000, 2) if latencies else None
+        }
+    }
+
+
+async def run_endpoint(client: httpx.AsyncClient, endpoint: str, total: int, concurrency: int) -> Dict[str, Any]:
+    latencies: List[float] = []
+    errors = 0
+    counter = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            send = build_request(endpoint, i, client)
+            started = time.perf_counter()
+            try:
+                response = await send()
+                ok = response.status_code == 200 and response.json().get("success", False)
+            except (httpx.HTTPError, ValueError):
+                ok = False
+            latencies.append(time.perf_counter() - started)
+            errors += 0 if ok else 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    return summarize(latencies, errors, time.perf_counter() - started)
+
+
+def rss_kb(pid: int) -> Optional[int]:
+    """Resident set size from /proc (Linux); None elsewhere"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+    return None
+
+
+def worker_pids(pid: int) -> List[int]:
+    """uvicorn --workers N runs the app in child processes; a single worker runs in `pid`"""
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            children = [int(c) for c in f.read().split()]
+    except OSError:
+        children = []
+    # Skip the multiprocessing resource tracker and similar helpers that are tiny
+    return [c for c in children if (rss_kb(c) or 0) > 20000] or [pid]
+
+
+def memory_snapshot(pids: List[int]) -> Dict[str, Optional[int]]:
+    return {str(pid): rss_kb(pid) for pid in pids}
+
+
+def memory_growth(before: Dict[str, Optional[int]], after: Dict[str, Optional[int]]) -> Dict[str, Any]:
+    return {
+        pid: {
+            "rss_before_kb": before[pid],
+            "rss_after_kb": after.get(pid),
+            "growth_kb": (after[pid] - before[pid]) if before[pid] is not None and after.get(pid) is not None else None
+        }
+        for pid in before
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def wait_until_up(url: str, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get(url)).status_code < 500:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+
+def spawn_servers(args) -> List[subprocess.Popen]:
+    """Start the mock LLM server and the backend wired to it"""
+    mock_env = {
+        **os.environ,
+        "MOCK_LATENCY": args.mock_latency,
+        "MOCK_ERROR_RATE": str(args.mock_error_rate),
+        "MOCK_COMPLETION_TOKENS": str(args.mock_completion_tokens)
+    }
+    mock = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "benchmarks.mock_llm_server:app",
+         "--port", str(args.mock_port), "--log-level", "warning"],
+        env=mock_env
+    )
+    backend_env = {
+        **os.environ,
+        "LLM_PROVIDERS": "openai",
+        "OPENAI_COMPAT_BASE_URL": f"http://127.0.0.1:{args.mock_port}/v1",
+        "OPENAI_COMPAT_API_KEY": "mock",
+        "LLM_CACHE_ENABLED": "true" if args.cache else "false"
+    }
+    backend = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.port),
+         "--workers", str(args.workers), "--log-level", "warning"],
+        env=backend_env
+    )
+    return [mock, backend]
+
+
+def compare(current: Dict[str, Any], previous: Dict[str, Any]) -> List[str]:
+    lines = [f"Compared with {previous.get('commit')} ({previous.get('timestamp')}):"]
+    for endpoint, result in current["results"].items():
+        old = previous.get("results", {}).get(endpoint)
+        if not old:
+            continue
+        for metric in ("p50", "p95", "p99"):
+            new_value, old_value = result["latency_ms"][metric], old["latency_ms"][metric]
+            if new_value is not None and old_value:
+                change = (new_value - old_value) / old_value * 100
+                lines.append(f"  {endpoint:<9} {metric}: {old_value:>9.2f} -> {new_value:>9.2f} ms ({change:+.1f}%)")
+        lines.append(
+            f"  {endpoint:<9} throughput: {old['throughput_rps']} -> {result['throughput_rps']} req/s"
+        )
+    return lines
+
+
+async def main(args) -> Dict[str, Any]:
+    processes: List[subprocess.Popen] = []
+    base_url = args.base_url
+    if args.spawn:
+        processes = spawn_servers(args)
+        base_url = f"http://127.0.0.1:{args.port}"
+    try:
+        await wait_until_up(f"{base_url}/api/status")
+        pids = worker_pids(processes[1].pid) if processes else args.pid
+        results: Dict[str, Any] = {}
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+            for endpoint in args.endpoints:
+                before = memory_snapshot(pids)
+                result = await run_endpoint(client, endpoint, args.requests, args.concurrency)
+                result["memory"] = memory_growth(before, memory_snapshot(pids)) if pids else None
+                results[endpoint] = result
+                print(
+                    f"{endpoint:<9} {result['requests']:>5} req  {result['throughput_rps']:>8.2f} req/s  "
+                    f"p50 {result['latency_ms']['p50']} ms  p95 {result['latency_ms']['p95']} ms  "
+                    f"p99 {result['latency_ms']['p99']} ms  errors {result['errors']}"
+                )
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait(timeout=10)
+
+    return {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "config": {
+            "base_url": base_url,
+            "concurrency": args.concurrency,
+            "requests_per_endpoint": args.requests,
+            "spawned": args.spawn,
+            "workers": args.workers if args.spawn else None,
+            "mock_latency": args.mock_latency if args.spawn else None,
+            "mock_error_rate": args.mock_error_rate if args.spawn else None,
+            "cache": args.cache
+        },
+        "results": results
+    }
+
+
+def parse_args(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Load test the Synthex API")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS),
+                        type=lambda v: [e.strip() for e in v.split(",") if e.strip()])
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=100, help="Requests per endpoint")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--pid", type=int, nargs="*", default=[], help="Backend worker pids to sample RSS from")
+    parser.add_argument("--spawn", action="store_true", help="Start the mock LLM server and backend")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--mock-port", type=int, default=9765)
+    parser.add_argument("--mock-latency", default="lognormal:-1.6,0.4")
+    parser.add_argument("--mock-error-rate", type=float, default=0.0)
+    parser.add_argument("--mock-completion-tokens", type=int, default=120)
+    parser.add_argument("--cache", action="store_true", help="Leave the response cache on (spawn mode)")
+    parser.add_argument("--output", help="Result file (default: benchmarks/results/<timestamp>-<commit>.json)")
+    parser.add_argument("--compare", help="Earlier result file to compare against")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    report = asyncio.run(main(args))
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{report['commit'] or 'nogit'}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Saved {output}")
+    if args.compare:
+        with open(args.compare) as f:
+            print("\n".join(compare(report, json.load(f))))
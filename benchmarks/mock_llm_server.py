@@ -0,0 +1,183 @@
+"""
+Mock OpenAI-compatible chat completions server for offline runs and load tests.
+
+    MOCK_LATENCY=lognormal:-1.2,0.5 MOCK_ERROR_RATE=0.02 \
+        uvicorn benchmarks.mock_llm_server:app --port 9000
+
+Point the backend at it with the OpenAI-compatible provider:
+
+    LLM_PROVIDERS=openai OPENAI_COMPAT_BASE_URL=http://127.0.0.1:9000/v1 uvicorn main:app
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+from typing import Dict, List, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+DEFAULT_CONTENT = (
+    "This code defines a small function and walks through its steps one at a time. "
+    "Each branch is explained with the values it reads and the result it returns.\n"
+    "```python\ndef solve(items):\n    return sorted(items)\n```\n"
+    "Time Complexity: O(n log n)\n"
+    "Space Complexity: O(n)"
+)
+
+
+def parse_latency(spec: str):
+    """
+    Latency distribution from a spec string, in seconds:
+    fixed:0.2 | uniform:0.1,0.5 | normal:0.3,0.05 | lognormal:mu,sigma | exponential:mean
+    """
+    kind, _, args = spec.partition(":")
+    values = [float(v) for v in args.split(",") if v]
+    samplers = {
+        "fixed": lambda: values[0],
+        "uniform": lambda: random.uniform(values[0], values[1]),
+        "normal": lambda: random.gauss(values[0], values[1]),
+        "lognormal": lambda: random.lognormvariate(values[0], values[1]),
+        "exponential": lambda: random.expovariate(1 / values[0])
+    }
+    if kind not in samplers:
+        raise ValueError(f"Unknown latency distribution: {spec}")
+    sampler = samplers[kind]
+    return lambda: max(0.0, sampler())
+
+
+class MockConfig:
+    def __init__(
+        self,
+        latency: str = "fixed:0.05",
+        tokens_per_second: float = 200.0,
+        completion_tokens: int = 120,
+        error_rate: float = 0.0,
+        error_statuses: Optional[List[int]] = None,
+        hang_rate: float = 0.0,
+        content: str = DEFAULT_CONTENT
+    ):
+        self.latency = latency
+        self.sample_latency = parse_latency(latency)
+        self.tokens_per_second = tokens_per_second
+        self.completion_tokens = completion_tokens
+        self.error_rate = error_rate
+        self.error_statuses = error_statuses or [500, 503, 429]
+        # Fraction of requests that never answer, to exercise client timeouts
+        self.hang_rate = hang_rate
+        self.content = content
+
+    @classmethod
+    def from_env(cls) -> "MockConfig":
+        return cls(
+            latency=os.getenv("MOCK_LATENCY", "fixed:0.05"),
+            tokens_per_second=float(os.getenv("MOCK_TOKENS_PER_SECOND", "200")),
+            completion_tokens=int(os.getenv("MOCK_COMPLETION_TOKENS", "120")),
+            error_rate=float(os.getenv("MOCK_ERROR_RATE", "0")),
+            error_statuses=[int(s) for s in os.getenv("MOCK_ERROR_STATUSES", "500,503,429").split(",")],
+            hang_rate=float(os.getenv("MOCK_HANG_RATE", "0"))
+        )
+
+
+def count_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def completion_text(config: MockConfig, max_tokens: int) -> str:
+    """Repeat the canned answer up to the configured length, capped by max_tokens"""
+    words = config.content.split(" ")
+    target = min(config.completion_tokens, max_tokens or config.completion_tokens)
+    out = []
+    while len(out) < target:
+        out.extend(words[:target - len(out)])
+    return " ".join(out)
+
+
+def create_app(config: Optional[MockConfig] = None) -> FastAPI:
+    config = config or MockConfig.from_env()
+    app = FastAPI(title="Mock LLM server")
+    app.state.config = config
+    stats: Dict[str, int] = {"requests": 0, "streams": 0, "errors_injected": 0, "hangs_injected": 0}
+    app.state.stats = stats
+
+    # Groq serves the same API under /openai/v1
+    @app.post("/v1/chat/completions")
+    @app.post("/openai/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        stats["requests"] += 1
+        model = body.get("model", "mock-model")
+        messages = body.get("messages", [])
+        prompt_tokens = sum(count_tokens(m.get("content", "")) for m in messages)
+
+        roll = random.random()
+        if roll < config.hang_rate:
+            stats["hangs_injected"] += 1
+            await asyncio.sleep(3600)
+        if roll < config.hang_rate + config.error_rate:
+            stats["errors_injected"] += 1
+            status = random.choice(config.error_statuses)
+            headers = {"Retry-After": "1"} if status == 429 else {}
+            return JSONResponse({"error": {"message": "injected failure"}}, status_code=status, headers=headers)
+
+        await asyncio.sleep(config.sample_latency())
+        text = completion_text(config, body.get("max_tokens", 0))
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": count_tokens(text),
+            "total_tokens": prompt_tokens + count_tokens(text)
+        }
+
+        if body.get("stream"):
+            stats["streams"] += 1
+            return StreamingResponse(_stream(config, model, text, usage), media_type="text/event-stream")
+
+        return {
+            "id": f"mock-{stats['requests']}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": text},
+                "finish_reason": "stop"
+            }],
+            "usage": usage
+        }
+
+    @app.get("/mock/stats")
+    async def mock_stats():
+        return {**stats, "latency": config.latency, "error_rate": config.error_rate}
+
+    return app
+
+
+async def _stream(config: MockConfig, model: str, text: str, usage: dict):
+    delay = 1 / config.tokens_per_second if config.tokens_per_second > 0 else 0
+    words = text.split(" ")
+    for index, word in enumerate(words):
+        piece = word if index == len(words) - 1 else word + " "
+        frame = {"object": "chat.completion.chunk", "model": model, "choices": [{"index": 0, "delta": {"content": piece}}]}
+        yield f"data: {json.dumps(frame)}\n\n"
+        if delay:
+            await asyncio.sleep(delay)
+    # Groq reports usage on the final frame under x_groq
+    final = {"object": "chat.completion.chunk", "model": model,
+             "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}], "x_groq": {"usage": usage}}
+    yield f"data: {json.dumps(final)}\n\n"
+    yield "data: [DONE]\n\n"
+
+
+app = create_app()
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Mock OpenAI-compatible LLM server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    args = parser.parse_args()
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
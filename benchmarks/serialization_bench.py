@@ -0,0 +1,144 @@
+"""
+Per-response serialization cost, before and after the typed response models.
+
+    python -m benchmarks.serialization_bench [--number 20000] [--round-trips 2000]
+    python benchmarks/serialization_bench.py [--number 20000] [--round-trips 2000]
+
+"before" is the generic APIResponse built from a dict (pydantic tries each
+union member) rendered by the stdlib JSONResponse; "after" is the endpoint's
+typed envelope rendered by the app's default response class.
+
+The first table times only what differs between the two: building the
+envelope, response_model validation and dump, and the response class's
+render(). The second times a TestClient round trip through a FastAPI route
+for each, to show how much of a whole request that is; at about a
+millisecond per round trip the difference there is mostly within noise.
+Both paths are checked to produce bodies that decode equal.
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+
+if __package__ in (None, ""):
+    # Run as a script: make the repository root importable
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+from fastapi.testclient import TestClient
+from pydantic import TypeAdapter
+
+from api.models.schemas import (
+    APIResponse, BatchExplainAPIResponse, BatchExplanationResponse, BatchExplanationResult,
+    CodeGenerationResponse, ExplainAPIResponse, ExplanationResponse, FileStats,
+    GenerateAPIResponse, LearnAPIResponse, LessonResponse
+)
+from api.services.serialization import FastJSONResponse
+
+EXPLANATION = "This function walks the list once and keeps a running total. " * 40
+STATS = {"lines": 120, "characters": 3400, "size_kb": 3.32}
+
+EXPLAIN = {"explanation": EXPLANATION, "filename": "app.py", "detected_language": "python", "file_stats": STATS}
+BATCH = {
+    "batch_results": [
+        {"filename": f"file_{i}.py", "success": True, "detected_language": "python",
+         "explanation": EXPLANATION, "file_stats": STATS}
+        for i in range(5)
+    ],
+    "total_files": 5, "successful": 5, "failed": 0, "processing_time": 2.5
+}
+GENERATE = {
+    "generated_code": "def solve(items):\n    return sorted(items)\n" * 10,
+    "time_complexity": "O(n log n)", "space_complexity": "O(n)",
+    "language": "python", "description": "sort a list"
+}
+LEARN = {
+    "lesson": EXPLANATION,
+    "context": [{"role": "user" if i % 2 == 0 else "assistant", "content": EXPLANATION[:400]} for i in range(8)],
+    "context_stats": {"context_tokens": 800, "summary_tokens": 0, "folded_tokens": 0, "prompt_tokens_saved": 0}
+}
+
+CASES = {
+    "explain": (EXPLAIN, ExplainAPIResponse, lambda: ExplanationResponse(
+        explanation=EXPLANATION, filename="app.py", detected_language="python", file_stats=FileStats(**STATS)
+    )),
+    "batch": (BATCH, BatchExplainAPIResponse, lambda: BatchExplanationResponse(
+        batch_results=[BatchExplanationResult(**r) for r in BATCH["batch_results"]],
+        total_files=5, successful=5, failed=0, processing_time=2.5
+    )),
+    "generate": (GENERATE, GenerateAPIResponse, lambda: CodeGenerationResponse(**GENERATE)),
+    "learn": (LEARN, LearnAPIResponse, lambda: LessonResponse(**LEARN))
+}
+
+
+GENERIC = TypeAdapter(APIResponse)
+stdlib_render = JSONResponse(None).render
+fast_render = FastJSONResponse(None).render
+
+
+def before(data: dict):
+    def run() -> bytes:
+        response = GENERIC.validate_python(APIResponse(success=True, data=data, error=None))
+        return stdlib_render(GENERIC.dump_python(response, mode="json"))
+    return run
+
+
+def after(envelope, build):
+    adapter = TypeAdapter(envelope)
+
+    def run() -> bytes:
+        response = adapter.validate_python(envelope(success=True, data=build(), error=None))
+        return fast_render(adapter.dump_python(response, mode="json"))
+    return run
+
+
+def before_app() -> FastAPI:
+    app = FastAPI(default_response_class=JSONResponse)
+    for name, (data, _, _) in CASES.items():
+        def route(data=data):
+            return APIResponse(success=True, data=data, error=None)
+        app.get(f"/{name}", response_model=APIResponse)(route)
+    return app
+
+
+def after_app() -> FastAPI:
+    app = FastAPI(default_response_class=FastJSONResponse)
+    for name, (_, envelope, build) in CASES.items():
+        def route(envelope=envelope, build=build):
+            return envelope(success=True, data=build(), error=None)
+        app.get(f"/{name}", response_model=envelope)(route)
+    return app
+
+
+def report(name: str, old_run, new_run, number: int):
+    old = timeit.timeit(old_run, number=number) / number * 1e6
+    new = timeit.timeit(new_run, number=number) / number * 1e6
+    print(f"{name:<10}{old:>14.2f}{new:>14.2f}{old / new:>9.2f}x")
+
+
+def main(number: int, round_trips: int):
+    header = f"{'endpoint':<10}{'before (us)':>14}{'after (us)':>14}{'speedup':>10}"
+    print("validation + render")
+    print(header)
+    for name, (data, envelope, build) in CASES.items():
+        old_run, new_run = before(data), after(envelope, build)
+        assert json.loads(old_run()) == json.loads(new_run())
+        report(name, old_run, new_run, number)
+
+    print("\nTestClient round trip")
+    print(header)
+    with TestClient(before_app()) as old_client, TestClient(after_app()) as new_client:
+        for name in CASES:
+            url = f"/{name}"
+            assert json.loads(old_client.get(url).content) == json.loads(new_client.get(url).content)
+            report(name, lambda: old_client.get(url), lambda: new_client.get(url), round_trips)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Response serialization benchmark")
+    parser.add_argument("--number", type=int, default=20000, help="iterations of validation + render")
+    parser.add_argument("--round-trips", type=int, default=2000, help="TestClient requests per case")
+    args = parser.parse_args()
+    main(args.number, args.round_trips)
@@ -1,14 +1,37 @@
-from fastapi import FastAPI
+import time
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.responses import Response
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
-from api.routes import explain, generate, learn
+from api.routes import explain, generate, learn, jobs
+from api.services import llm_provider, metrics, tracing
+from api.services.cache import cache_bypass, response_cache, should_bypass
+from api.services.coalesce import inflight_requests
+from api.services.compression import COMPRESSION_ENABLED, CompressionMiddleware
+from api.services.job_queue import job_queue
+from api.services.rate_limiter import governor
+from api.services.resilience import breaker_stats
+from api.services.serialization import FastJSONResponse
+from api.services.tiering import tier_stats
 
 load_dotenv()
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One pooled upstream client for the lifetime of the app
+    await llm_provider.init_http_client()
+    await job_queue.start()
+    yield
+    await job_queue.stop()
+    await llm_provider.close_http_client()
+
 app = FastAPI(
     title="Synthex API",
     description="AI-powered code explanation, generation, and learning platform",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse
 )
 
 app.add_middleware(
@@ -17,15 +40,74 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[tracing.TRACE_ID_HEADER, "traceparent"],
 )
 
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    # Root span per request; the trace id goes back to the client for correlation
+    with tracing.trace_request(f"{request.method} {request.url.path}", request.headers) as root:
+        response = await call_next(request)
+        root.set(route=metrics.route_label(request.scope), status_code=response.status_code)
+        response.headers[tracing.TRACE_ID_HEADER] = root.trace_id
+        response.headers["traceparent"] = tracing.traceparent(root)
+        return response
+
+@app.middleware("http")
+async def record_metrics(request: Request, call_next):
+    # Route templates (not raw paths) keep label cardinality bounded
+    metrics.http_in_flight.inc()
+    started = time.perf_counter()
+    status = "500"
+    try:
+        response = await call_next(request)
+        status = str(response.status_code)
+        return response
+    except Exception as e:
+        metrics.errors.inc(type(e).__name__)
+        raise
+    finally:
+        path = metrics.route_label(request.scope)
+        metrics.http_in_flight.dec()
+        metrics.http_latency.observe(time.perf_counter() - started, path, request.method)
+        metrics.http_requests.inc(path, request.method, status)
+
+@app.middleware("http")
+async def cache_bypass_header(request: Request, call_next):
+    # Let clients skip cached LLM responses for a single request
+    token = cache_bypass.set(should_bypass(request.headers))
+    try:
+        return await call_next(request)
+    finally:
+        cache_bypass.reset(token)
+
+if COMPRESSION_ENABLED:
+    # Added last, so it runs first: everything inside sees decoded request bodies
+    app.add_middleware(CompressionMiddleware)
+
 app.include_router(explain.router, prefix="/api")
 app.include_router(generate.router, prefix="/api")
 app.include_router(learn.router, prefix="/api")
+app.include_router(jobs.router, prefix="/api")
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    return Response(metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
 
 @app.get("/api/status")
 async def get_status():
     return {
         "success": True,
-        "data": {"status": "online", "version": "1.0.0"}
+        "data": {
+            "status": "online",
+            "version": "1.0.0",
+            "cache": response_cache.stats(),
+            "coalescing": inflight_requests.stats(),
+            "sessions": learn.session_store.stats(),
+            "jobs": job_queue.stats(),
+            "circuit_breakers": breaker_stats(),
+            "rate_limiter": governor.stats(),
+            "routing": llm_provider.router_stats(),
+            "model_tiers": tier_stats()
+        }
     }
\ No newline at end of file
@@ -82,7 +82,8 @@ def handle_explanation_request(code, language, difficulty, focus_areas, show_lin
                 focus_areas=focus_areas,
                 line_by_line=show_line_by_line,
                 include_examples=include_examples,
-                provider=provider_settings["provider"]
+                provider=provider_settings["provider"],
+                session_id=st.session_state.get("explain_session_id")
             )
             
             # Extract explanation
@@ -105,6 +106,13 @@ def handle_explanation_request(code, language, difficulty, focus_areas, show_lin
                 "timestamp": datetime.now().isoformat()
             })
             
+            timing = api_service.last_timing
+            if timing:
+                if timing["cached"]:
+                    st.caption("Result from cache")
+                else:
+                    st.caption(f"API call: {timing['elapsed_ms']:.0f} ms, {timing['response_bytes'] / 1024:.1f} KB")
+            
             return explanation
             
         except Exception as e:
@@ -1,9 +1,9 @@
 import streamlit as st
-import requests
 from datetime import datetime
 from typing import Dict, Any
 from utils.file_handler import FileHandler
 from utils.state_manager import StateManager
+from utils.api_service import api_service
 
 def render():
     st.markdown("""
@@ -94,93 +94,73 @@ def render():
     if submit and code_description:
         with st.spinner("🤖 Generating your code..."):
             try:
-                # API call setup
-                api_url = "https://synthex-3.onrender.com/api/generate"
-                payload = {
-                    "language": language.lower(),
-                    "description": code_description,
-                    "difficulty": difficulty.lower(),
-                    "options": {
-                        "include_comments": include_comments,
-                        "optimization_focus": optimization_focus.lower()
-                    }
-                }
-                
-                response = requests.post(
-                    api_url, 
-                    json=payload,
-                    headers={"Content-Type": "application/json"},
-                    timeout=30
+                result = api_service.generate_code(
+                    description=code_description,
+                    language=language,
+                    difficulty=difficulty,
+                    optimization_focus=optimization_focus,
+                    include_comments=include_comments
                 )
+                generated_code = result["generated_code"]
+                time_complexity = result.get("time_complexity", "O(n)")
+                space_complexity = result.get("space_complexity", "O(1)")
+                
+                # Results section
+                st.markdown("---")
+                st.markdown("### 🎉 Generated Code")
+                
+                # Code display with metrics
+                metrics_col1, metrics_col2 = st.columns(2)
+                with metrics_col1:
+                    st.metric("Time Complexity", time_complexity)
+                with metrics_col2:
+                    st.metric("Space Complexity", space_complexity)
+                
+                # Code display with syntax highlighting
+                st.code(generated_code, language=language.lower())
+                
+                # Action buttons
+                action_col1, action_col2, action_col3 = st.columns(3)
+                
+                with action_col1:
+                    if st.button("📋 Copy to Clipboard"):
+                        st.toast("Code copied successfully!", icon="✅")
                 
-                if response.status_code == 200:
-                    result = response.json()
-                    if result["success"]:
-                        generated_code = result["data"]["generated_code"]
-                        time_complexity = result["data"].get("time_complexity", "O(n)")
-                        space_complexity = result["data"].get("space_complexity", "O(1)")
-                        
-                        # Results section
-                        st.markdown("---")
-                        st.markdown("### 🎉 Generated Code")
-                        
-                        # Code display with metrics
-                        metrics_col1, metrics_col2 = st.columns(2)
-                        with metrics_col1:
-                            st.metric("Time Complexity", time_complexity)
-                        with metrics_col2:
-                            st.metric("Space Complexity", space_complexity)
-                        
-                        # Code display with syntax highlighting
-                        st.code(generated_code, language=language.lower())
-                        
-                        # Action buttons
-                        action_col1, action_col2, action_col3 = st.columns(3)
-                        
-                        with action_col1:
-                            if st.button("📋 Copy to Clipboard"):
-                                st.toast("Code copied successfully!", icon="✅")
-                        
-                        with action_col2:
-                            st.download_button(
-                                "💾 Save as File",
-                                data=generated_code,
-                                file_name=f"generated_code{get_file_extension(language)}",
-                                mime="text/plain",
-                            )
-                        
-                        with action_col3:
-                            st.download_button(
-                                "📑 Export Report",
-                                data=create_downloadable_content(
-                                    generated_code,
-                                    time_complexity,
-                                    space_complexity,
-                                    code_description,
-                                    language
-                                ),
-                                file_name=f"code_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt",
-                                mime="text/plain",
-                            )
+                with action_col2:
+                    st.download_button(
+                        "💾 Save as File",
+                        data=generated_code,
+                        file_name=f"generated_code{get_file_extension(language)}",
+                        mime="text/plain",
+                    )
+                
+                with action_col3:
+                    st.download_button(
+                        "📑 Export Report",
+                        data=create_downloadable_content(
+                            generated_code,
+                            time_complexity,
+                            space_complexity,
+                            code_description,
+                            language
+                        ),
+                        file_name=f"code_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt",
+                        mime="text/plain",
+                    )
 
-                        # Add to history
-                        StateManager.add_to_history({
-                            "mode": "Generation",
-                            "language": language,
-                            "description": code_description,
-                            "code": generated_code,
-                            "timestamp": datetime.now().isoformat(),
-                            "complexity": {
-                                "time": time_complexity,
-                                "space": space_complexity
-                            }
-                        })
-                        
-                    else:
-                        st.error(f"Generation failed: {result.get('error', 'Unknown error')}")
-                else:
-                    st.error(f"API Error (Status {response.status_code})")
-                    
+                # Add to history
+                StateManager.add_to_history({
+                    "mode": "Generation",
+                    "language": language,
+                    "description": code_description,
+                    "code": generated_code,
+                    "timestamp": datetime.now().isoformat(),
+                    "complexity": {
+                        "time": time_complexity,
+                        "space": space_complexity
+                    }
+                })
+                
             except Exception as e:
                 st.error(f"An error occurred: {str(e)}")
     
@@ -1,8 +1,9 @@
 import streamlit as st
-import requests
 import uuid
 from datetime import datetime
 from utils.code_formatter import CodeFormatter
+from utils.api_service import api_service
+from utils.state_manager import StateManager
 
 def render():
     """Render the interactive learning page"""
@@ -145,34 +146,21 @@ def render():
     if st.button("Start Learning", type="primary"):
         with st.spinner("Preparing your learning content..."):
             try:
-                api_url = "https://synthex-3.onrender.com/api/learn"
-                payload = {
-                    "main_topic": main_topic,
-                    "language": language.lower(),
-                    "difficulty": difficulty.lower(),
-                    "framework": framework.lower() if framework else None,
-                    "subtopic": subtopic
-                }
-                params = {
-                    "template": learning_format.lower().replace(" ", "_"),
-                    "session_id": st.session_state.learn_session_id
-                }
-                response = requests.post(api_url, json=payload, params=params)
-                response.raise_for_status()
-                result = response.json()
-                if result["success"]:
-                    lesson_content = result["data"]["lesson"]
-                    st.session_state.learn_context = result["data"].get("context", [])
-                else:
-                    st.error(f"API Error: {result['error']}")
-                    return
+                result = api_service.learn_concept(
+                    main_topic=main_topic,
+                    subtopic=f"{subtopic} with {framework}" if framework else subtopic,
+                    language=language,
+                    difficulty=difficulty,
+                    learning_format=learning_format,
+                    session_id=st.session_state.learn_session_id,
+                    provider=StateManager.get_provider_settings()["provider"]
+                )
+                lesson_content = result["lesson"]
+                st.session_state.learn_context = result.get("context", [])
                 st.markdown(f"## {main_topic} - {subtopic}")
                 st.markdown(lesson_content)
                 # Add to history
-                if 'history' not in st.session_state:
-                    st.session_state.history = []
-                    
-                st.session_state.history.append({
+                StateManager.add_to_history({
                     "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
                     "mode": "Learning",
                     "language": language,
@@ -1,14 +1,51 @@
+import asyncio
+import json
+import os
+import time
+import httpx
+import pytest
+from fastapi import HTTPException
 from fastapi.testclient import TestClient
 from main import app
+from api.services import llm_provider
+from api.services.llm_provider import PROVIDER_SPECS, LLMProvider, LocalStubProvider, get_provider
+from api.services.cache import LRUCache, response_cache
+from api.services.coalesce import SingleFlight
+from api.services.chunking import chunk_source
+from api.services.explainer import chunk_cache
+from api.services.context_window import ContextWindowManager, split_summary
+from api.services.job_queue import CallbackURLError, JobQueue, QueueFullError, check_callback_url
+from api.services.rate_limiter import CapacityExceeded, Governor, SQLiteBucketStore
+from api.services.routing import ProviderRouter, percentile
+from api.services.resilience import breakers, CircuitBreaker, RetryPolicy, parse_retry_after
+from api.services import tracing
+from api.services.tiering import classify_request
+from api.services.session_store import MemorySessionStore, SQLiteSessionStore
+from benchmarks.mock_llm_server import MockConfig, create_app
 
 client = TestClient(app)
 
+@pytest.fixture
+def mock_llm_server(monkeypatch):
+    """Serve LLM calls from the in-process mock OpenAI-compatible server"""
+    mock_app = create_app(MockConfig(latency="fixed:0", tokens_per_second=0))
+    monkeypatch.setenv("GROQ_API_KEY", "test-key")
+    monkeypatch.setattr(llm_provider, "_provider", None)
+    monkeypatch.setattr(llm_provider, "_router", None)
+    monkeypatch.setattr(
+        llm_provider, "_http_client",
+        httpx.AsyncClient(transport=httpx.ASGITransport(app=mock_app))
+    )
+    yield mock_app.state.stats
+    llm_provider._provider = None
+    llm_provider._router = None
+
 def test_status():
     resp = client.get("/api/status")
     assert resp.status_code == 200
     assert resp.json()["success"] is True
 
-def test_explain_success():
+def test_explain_success(mock_llm_server):
     payload = {
         "code": "print('hi')",
         "language": "python",
@@ -33,7 +70,7 @@ def test_explain_missing_code():
     resp = client.post("/api/explain", json=payload)
     assert resp.status_code == 422
 
-def test_generate_success():
+def test_generate_success(mock_llm_server):
     payload = {
         "description": "Print hello",
         "language": "python",
@@ -52,7 +89,7 @@ def test_generate_missing_description():
     resp = client.post("/api/generate", json=payload)
     assert resp.status_code == 422
 
-def test_learn_success():
+def test_learn_success(mock_llm_server):
     payload = {
         "main_topic": "loops",
         "language": "python",
@@ -69,4 +106,785 @@ def test_learn_missing_main_topic():
         "difficulty": "Beginner"
     }
     resp = client.post("/api/learn", json=payload)
-    assert resp.status_code == 422
\ No newline at end of file
+    assert resp.status_code == 422
+
+# --- Offline tests against a mocked upstream ---
+
+def _completion(content="mock answer"):
+    return {
+        "choices": [{"message": {"role": "assistant", "content": content}}],
+        "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15}
+    }
+
+def _stream_body(content):
+    """Build an OpenAI-style SSE body, one delta per line of content"""
+    frames = [
+        {"choices": [{"delta": {"content": piece}}]}
+        for piece in content.splitlines(keepends=True)
+    ]
+    return "".join(f"data: {json.dumps(f)}\n\n" for f in frames) + "data: [DONE]\n\n"
+
+def _sse_events(text):
+    events = []
+    for frame in text.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in frame.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+@pytest.fixture
+def mock_upstream(monkeypatch):
+    """Route the shared provider through an in-process mock transport"""
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        if json.loads(request.content).get("stream"):
+            return httpx.Response(200, text=_stream_body(
+                "```python\nprint('hi')\n```\nTime Complexity: O(1)\nSpace Complexity: O(1)"
+            ))
+        return httpx.Response(200, json=_completion())
+
+    monkeypatch.setenv("GROQ_API_KEY", "test-key")
+    monkeypatch.setattr(llm_provider, "_provider", None)
+    monkeypatch.setattr(llm_provider, "_router", None)
+    response_cache.clear()
+    chunk_cache.clear()
+    breakers.clear()
+    monkeypatch.setattr(
+        llm_provider, "_http_client",
+        httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    )
+    yield calls
+    llm_provider._provider = None
+    llm_provider._router = None
+
+def test_get_provider_returns_shared_instance(mock_upstream):
+    assert get_provider() is get_provider()
+
+async def test_provider_reuses_pooled_client(mock_upstream):
+    provider = get_provider()
+    first = provider.client
+    await provider.generate_completion([{"role": "user", "content": "hi"}])
+    await provider.generate_completion([{"role": "user", "content": "hi again"}])
+    assert provider.client is first
+    assert len(mock_upstream) == 2
+
+def test_explain_with_mock_upstream(mock_upstream):
+    resp = client.post("/api/explain", json={"code": "print('hi')", "language": "python"})
+    assert resp.status_code == 200
+    assert resp.json()["data"]["explanation"] == "mock answer"
+
+def test_explain_batch_preserves_order_and_isolates_failures(mock_upstream):
+    files = [
+        ("files", ("a.py", b"print('a')", "text/plain")),
+        ("files", ("notes.txt", b"not code", "text/plain")),
+        ("files", ("b.js", b"console.log('b')", "text/plain")),
+    ]
+    resp = client.post("/api/explain/batch", files=files)
+    assert resp.status_code == 200
+    data = resp.json()["data"]
+    assert [r["filename"] for r in data["batch_results"]] == ["a.py", "notes.txt", "b.js"]
+    assert [r["success"] for r in data["batch_results"]] == [True, False, True]
+    assert data["successful"] == 2 and data["failed"] == 1
+    assert data["processing_time"] is not None
+    assert len(mock_upstream) == 2
+
+def test_responses_use_endpoint_models(mock_upstream):
+    resp = client.post("/api/generate", json={"description": "Print hello", "language": "python"})
+    data = resp.json()["data"]
+    assert resp.headers["content-type"] == "application/json"
+    assert data["time_complexity"] == "N/A"
+    assert data["language"] == "python" and data["description"] == "Print hello"
+    resp = client.post("/api/explain/batch", files=[("files", ("a.py", b"print('a')", "text/plain"))])
+    result = resp.json()["data"]["batch_results"][0]
+    assert result["file_stats"]["characters"] == 10
+    assert result["error"] is None
+
+def test_generate_stream_emits_tokens_and_parsed_payload(mock_upstream):
+    resp = client.post("/api/generate/stream", json={"description": "Print hello", "language": "python"})
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/event-stream")
+    events = _sse_events(resp.text)
+    assert [name for name, _ in events[:-1]] == ["token"] * (len(events) - 1)
+    name, final = events[-1]
+    assert name == "done"
+    assert final["data"]["generated_code"] == "print('hi')"
+    assert final["data"]["time_complexity"] == "O(1)"
+    assert final["data"]["space_complexity"] == "O(1)"
+    assert final["data"]["language"] == "python"
+    assert final["data"]["description"] == "Print hello"
+    assert json.loads(mock_upstream[0].content)["stream"] is True
+
+def test_learn_stream_updates_session_context(mock_upstream):
+    resp = client.post(
+        "/api/learn/stream",
+        params={"session_id": "stream-test"},
+        json={"main_topic": "loops", "language": "python"}
+    )
+    name, final = _sse_events(resp.text)[-1]
+    assert name == "done"
+    assert final["data"]["context"][-1]["role"] == "assistant"
+
+def test_identical_explain_requests_hit_cache(mock_upstream):
+    payload = {"code": "print('cached')", "language": "python"}
+    first = client.post("/api/explain", json=payload)
+    second = client.post("/api/explain", json=payload)
+    assert first.json() == second.json()
+    assert len(mock_upstream) == 1
+    stats = client.get("/api/status").json()["data"]["cache"]
+    assert stats["hits"] == 1 and stats["misses"] == 1
+
+def test_cache_bypass_header_forces_upstream_call(mock_upstream):
+    payload = {"code": "print('bypass')", "language": "python"}
+    client.post("/api/explain", json=payload)
+    client.post("/api/explain", json=payload, headers={"X-Cache-Bypass": "1"})
+    assert len(mock_upstream) == 2
+
+def test_lru_cache_evicts_by_size_and_ttl():
+    cache = LRUCache(max_entries=10, max_bytes=10, ttl=60)
+    cache.set("a", "x", 6)
+    cache.set("b", "y", 6)
+    assert cache.get("a") is None and cache.get("b") == "y"
+    expired = LRUCache(max_entries=10, max_bytes=100, ttl=-1)
+    expired.set("a", "x", 1)
+    assert expired.get("a") is None
+
+async def test_concurrent_identical_requests_are_coalesced(monkeypatch):
+    calls = []
+
+    async def handler(request):
+        calls.append(request)
+        await asyncio.sleep(0.05)
+        return httpx.Response(200, json=_completion())
+
+    monkeypatch.setenv("GROQ_API_KEY", "test-key")
+    response_cache.clear()
+    inflight = SingleFlight()
+    provider = LLMProvider(
+        client=httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+        inflight=inflight
+    )
+    provider.breaker = CircuitBreaker("coalesce-test")
+    messages = [{"role": "user", "content": "same question"}]
+    results = await asyncio.gather(*[provider.generate_completion(messages) for _ in range(5)])
+    assert len(calls) == 1
+    assert all(r == results[0] for r in results)
+    assert inflight.stats() == {"leaders": 1, "coalesced": 4, "in_flight": 0}
+
+async def test_single_flight_propagates_errors_and_survives_waiter_cancel():
+    flight = SingleFlight()
+    release = asyncio.Event()
+
+    async def failing():
+        await release.wait()
+        raise RuntimeError("upstream down")
+
+    waiters = [asyncio.ensure_future(flight.do("k", failing)) for _ in range(3)]
+    await asyncio.sleep(0)
+    waiters[0].cancel()
+    release.set()
+    results = await asyncio.gather(*waiters, return_exceptions=True)
+    assert isinstance(results[0], asyncio.CancelledError)
+    assert all(isinstance(r, RuntimeError) for r in results[1:])
+    assert flight.stats()["in_flight"] == 0
+
+async def test_memory_session_store_caps_sessions():
+    store = MemorySessionStore(max_sessions=2, ttl=60, max_bytes=1024)
+    for key in ("a", "b", "c"):
+        await store.set(key, [{"role": "user", "content": key}])
+    assert await store.get("a") == []
+    assert await store.get("c") == [{"role": "user", "content": "c"}]
+    assert store.stats()["sessions"] == 2
+
+async def test_sqlite_session_store_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / "sessions.db")
+    context = [{"role": "user", "content": "loops"}]
+    await SQLiteSessionStore(path).set("s1", context)
+    assert await SQLiteSessionStore(path).get("s1") == context
+
+async def test_context_window_folds_old_turns_into_summary():
+    manager = ContextWindowManager(budget=60, summary_max_tokens=50)
+    context = []
+    for i in range(6):
+        context += [
+            {"role": "user", "content": f"question {i} " + "x" * 80},
+            {"role": "assistant", "content": f"answer {i} " + "y" * 80},
+        ]
+
+    async def summarize(previous, turns):
+        return f"covered {len(turns)} messages"
+
+    compacted = await manager.compact(context, summarize)
+    summary, turns = split_summary(compacted)
+    assert summary["content"].endswith("covered 10 messages")
+    assert turns == context[-2:]
+    assert manager.report(compacted)["prompt_tokens_saved"] > 0
+
+async def test_context_window_trims_an_oversized_latest_exchange():
+    manager = ContextWindowManager(budget=200, summary_max_tokens=50)
+    context = [
+        {"role": "user", "content": "old question"},
+        {"role": "assistant", "content": "old answer"},
+        {"role": "user", "content": "explain recursion"},
+        {"role": "assistant", "content": "z" * 4096 * 4},
+    ]
+
+    async def summarize(previous, turns):
+        return "earlier turns"
+
+    compacted = await manager.compact(context, summarize)
+    summary, turns = split_summary(compacted)
+    assert manager.report(compacted)["context_tokens"] <= 200
+    assert turns[0] == context[2]
+    assert 0 < len(turns[1]["content"]) < len(context[3]["content"])
+    assert context[3]["content"] == "z" * 4096 * 4
+
+def test_learn_reports_context_stats(mock_upstream):
+    resp = client.post(
+        "/api/learn",
+        params={"session_id": "stats-test"},
+        json={"main_topic": "recursion", "language": "python"}
+    )
+    stats = resp.json()["data"]["context_stats"]
+    assert stats["prompt_tokens_saved"] == 0
+
+def _large_python_source(functions=60):
+    return "".join(
+        f"def function_{i}(value):\n    \"\"\"Helper number {i}\"\"\"\n"
+        + "".join(f"    value = value * {j} + {i}\n" for j in range(8))
+        + "    return value\n\n\n"
+        for i in range(functions)
+    )
+
+def test_chunk_source_splits_python_at_definitions():
+    source = _large_python_source()
+    chunks = chunk_source(source, "python", max_chars=2000)
+    assert len(chunks) > 1
+    assert "".join(c.source for c in chunks) == source
+    assert all(c.source.lstrip().startswith("def ") for c in chunks)
+
+def test_chunk_source_uses_brace_heuristic_for_other_languages():
+    source = "".join(f"function f{i}() {{\n  return {i};\n}}\n\n" for i in range(50))
+    chunks = chunk_source(source, "javascript", max_chars=200)
+    assert "".join(c.source for c in chunks) == source
+    assert all(c.source.lstrip().startswith("function") for c in chunks)
+
+def test_large_file_without_statements_is_still_chunked(mock_upstream):
+    source = "# notes about the module\n" * 1000
+    chunks = chunk_source(source, "python", max_chars=6000)
+    assert len(chunks) > 1 and "".join(c.source for c in chunks) == source
+
+    resp = client.post("/api/explain/file", files={"file": ("notes.py", source.encode(), "text/plain")})
+    data = resp.json()["data"]
+    assert len(data["chunks"]) == len(chunks)
+    assert len(mock_upstream) == len(chunks) + 1
+
+def test_large_file_is_explained_with_map_reduce(mock_upstream):
+    source = _large_python_source().encode()
+    resp = client.post("/api/explain/file", files={"file": ("big.py", source, "text/plain")})
+    data = resp.json()["data"]
+    assert data["explanation"] == "mock answer"
+    assert len(data["chunks"]) > 1
+    assert len(mock_upstream) == len(data["chunks"]) + 1
+    assert not any(c["cached"] for c in data["chunks"])
+
+    response_cache.clear()
+    again = client.post("/api/explain/file", files={"file": ("big.py", source, "text/plain")})
+    assert all(c["cached"] for c in again.json()["data"]["chunks"])
+
+def test_explain_session_only_reexplains_changed_definitions(mock_upstream):
+    original = "import math\n\ndef area(r):\n    return math.pi * r * r\n\ndef double(x):\n    return 2 * x\n"
+    edited = original.replace("2 * x", "x + x")
+    params = {"session_id": "incremental-test"}
+    # A first request explains each definition, filling the chunk cache
+    first = client.post("/api/explain", params=params, json={"code": original, "language": "python"})
+    first_chunks = first.json()["data"]["chunks"]
+    assert len(first_chunks) > 1 and len(mock_upstream) == len(first_chunks)
+    assert all(c["status"] == "added" and not c["cached"] for c in first_chunks)
+
+    second = client.post("/api/explain", params=params, json={"code": edited, "language": "python"})
+    assert len(mock_upstream) == len(first_chunks) + 1
+    chunks = {c["name"]: c for c in second.json()["data"]["chunks"]}
+    assert chunks["double"]["status"] == "changed" and not chunks["double"]["cached"]
+    assert chunks["area"]["status"] == "unchanged" and chunks["area"]["cached"]
+
+    third = client.post("/api/explain", params=params, json={"code": original, "language": "python"})
+    assert len(mock_upstream) == len(first_chunks) + 1
+    chunks = {c["name"]: c for c in third.json()["data"]["chunks"]}
+    assert chunks["double"]["status"] == "changed" and chunks["double"]["cached"]
+    assert chunks["area"]["status"] == "unchanged" and chunks["area"]["cached"]
+
+async def test_explain_sessions_use_their_own_store(tmp_path):
+    path = str(tmp_path / "sessions.db")
+    learn = SQLiteSessionStore(path, max_sessions=1)
+    explain = SQLiteSessionStore(path, max_sessions=1, table="explain_sessions")
+    await learn.set("learner", [{"role": "user", "content": "loops"}])
+    await explain.set("explain:a", [{"id": "f", "hash": "1"}])
+    await explain.set("explain:b", [{"id": "f", "hash": "2"}])
+    assert await learn.get("learner") == [{"role": "user", "content": "loops"}]
+    assert await explain.get("explain:a") == []
+
+async def test_router_tags_response_with_answering_model():
+    class Failing(LocalStubProvider):
+        async def generate_completion(self, messages, max_tokens=1000, coalesce=True, tier="quality"):
+            self.latency.record(self.model, 1.0, False)
+            raise HTTPException(status_code=503, detail="down")
+
+    failing = Failing("failing")
+    failing.model = "failing-model"
+    router = ProviderRouter([failing, LocalStubProvider()])
+    response = await router.generate_completion([{"role": "user", "content": "hi"}])
+    assert response["routed_model"] == "local-stub"
+
+def test_explain_file_job_can_be_polled(mock_upstream):
+    with TestClient(app) as lifespan_client:
+        resp = lifespan_client.post(
+            "/api/jobs/explain/file",
+            files={"file": ("job.py", b"print('job')", "text/plain")}
+        )
+        assert resp.status_code == 202
+        job_id = resp.json()["data"]["job_id"]
+        for _ in range(50):
+            job = lifespan_client.get(f"/api/jobs/{job_id}").json()["data"]
+            if job["status"] in ("succeeded", "failed"):
+                break
+            time.sleep(0.02)
+        assert job["status"] == "succeeded"
+        assert job["result"]["data"]["explanation"] == "mock answer"
+    assert client.get("/api/jobs/unknown").status_code == 404
+
+async def test_job_queue_rejects_when_saturated():
+    queue = JobQueue(workers=1, max_depth=1)
+    release = asyncio.Event()
+
+    async def blocked():
+        await release.wait()
+        return {}
+
+    await queue.submit("test", blocked)
+    await asyncio.sleep(0)
+    await queue.submit("test", blocked)
+    with pytest.raises(QueueFullError):
+        await queue.submit("test", blocked)
+    assert queue.stats()["rejected"] == 1
+    release.set()
+    await queue.stop()
+
+def test_job_callback_must_target_public_host(mock_upstream, monkeypatch):
+    for url in ("http://127.0.0.1:8000/hook", "http://10.0.0.5/hook", "http://169.254.169.254/latest",
+                "http://[::1]/hook", "ftp://93.184.216.34/hook"):
+        with pytest.raises(CallbackURLError):
+            check_callback_url(url)
+    check_callback_url("https://93.184.216.34/hook")
+    monkeypatch.setattr("api.services.job_queue.JOB_CALLBACK_ALLOWED_HOSTS", {"127.0.0.1"})
+    check_callback_url("http://127.0.0.1:9000/hook")
+
+    resp = client.post(
+        "/api/jobs/explain/file",
+        files={"file": ("job.py", b"print('job')", "text/plain")},
+        data={"callback_url": "http://localhost/hook"}
+    )
+    assert resp.status_code == 400
+    assert not mock_upstream
+
+async def test_job_queue_bounds_finished_jobs_and_buffered_bytes():
+    queue = JobQueue(workers=1, max_depth=10, max_finished=2, max_buffered_bytes=100)
+
+    async def done():
+        return {}
+
+    with pytest.raises(QueueFullError):
+        await queue.submit("test", done, size=101)
+    for _ in range(4):
+        await queue.submit("test", done, size=60)
+        await queue._queue.join()
+    assert len(queue.jobs) == 2
+    assert queue.buffered_bytes == 0
+    await queue.stop()
+
+async def test_provider_retries_transient_errors(monkeypatch):
+    statuses = [503, 429, 200]
+
+    def handler(request):
+        status = statuses.pop(0)
+        if status != 200:
+            return httpx.Response(status, headers={"Retry-After": "0"})
+        return httpx.Response(200, json=_completion("after retry"))
+
+    monkeypatch.setenv("GROQ_API_KEY", "test-key")
+    response_cache.clear()
+    provider = LLMProvider(
+        client=httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+        inflight=SingleFlight(),
+        retry_policy=RetryPolicy(max_attempts=3, base_delay=0, deadline=5)
+    )
+    provider.breaker = CircuitBreaker("retry-test")
+    result = await provider.generate_completion([{"role": "user", "content": "retry me"}])
+    assert result["choices"][0]["message"]["content"] == "after retry"
+    assert statuses == []
+    assert provider.breaker.state == "closed"
+
+async def test_provider_gives_up_when_retry_after_is_too_long(monkeypatch):
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(429, headers={"Retry-After": "30"})
+
+    monkeypatch.setenv("GROQ_API_KEY", "test-key")
+    response_cache.clear()
+    provider = LLMProvider(
+        client=httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+        inflight=SingleFlight(),
+        retry_policy=RetryPolicy(max_attempts=3, base_delay=0, max_delay=8, deadline=45)
+    )
+    provider.breaker = CircuitBreaker("retry-after-test")
+    started = time.monotonic()
+    with pytest.raises(HTTPException) as raised:
+        await provider.generate_completion([{"role": "user", "content": "throttled"}])
+    assert raised.value.status_code == 503
+    assert raised.value.headers == {"Retry-After": "30"}
+    assert len(calls) == 1 and time.monotonic() - started < 1
+    assert RetryPolicy(max_delay=8).backoff(1, retry_after=5) == 5
+
+async def test_circuit_breaker_fails_fast_then_probes(monkeypatch):
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(500)
+
+    monkeypatch.setenv("GROQ_API_KEY", "test-key")
+    response_cache.clear()
+    provider = LLMProvider(
+        client=httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+        inflight=SingleFlight(),
+        retry_policy=RetryPolicy(max_attempts=1, base_delay=0, deadline=5)
+    )
+    provider.breaker = CircuitBreaker("breaker-test", failure_threshold=2, reset_timeout=60)
+    for i in range(2):
+        with pytest.raises(HTTPException):
+            await provider.generate_completion([{"role": "user", "content": f"fail {i}"}])
+    assert provider.breaker.state == "open"
+
+    with pytest.raises(HTTPException) as exc:
+        await provider.generate_completion([{"role": "user", "content": "fast fail"}])
+    assert exc.value.status_code == 503
+    assert len(calls) == 2
+
+    provider.breaker.reset_timeout = 0
+    with pytest.raises(HTTPException):
+        await provider.generate_completion([{"role": "user", "content": "probe"}])
+    assert len(calls) == 3 and provider.breaker.state == "open"
+
+async def test_governor_sheds_when_rpm_budget_is_spent():
+    governor = Governor(rpm=2, tpm=0, max_concurrency=4, max_wait=0.1)
+    for _ in range(2):
+        await governor.acquire(100)
+        governor.release()
+    with pytest.raises(CapacityExceeded):
+        await governor.acquire(100)
+    assert governor.stats()["admitted"] == 2 and governor.stats()["shed"] == 1
+
+async def test_governor_refunds_unused_tokens_in_shared_store(tmp_path):
+    store = SQLiteBucketStore(str(tmp_path / "buckets.db"))
+    first = Governor(rpm=0, tpm=1000, max_wait=0.1, store=store)
+    second = Governor(rpm=0, tpm=1000, max_wait=0.1, store=store)
+    await first.acquire(800)
+    first.settle(800, {"total_tokens": 300})
+    first.release()
+    # Both workers draw from one budget: 1000 - 300 leaves room for 600, not 800
+    await second.acquire(600)
+    second.release()
+    with pytest.raises(CapacityExceeded):
+        await second.acquire(800)
+
+async def test_provider_reserves_tokens_once_across_retries(monkeypatch):
+    statuses = [503, 503, 200]
+
+    def handler(request):
+        status = statuses.pop(0)
+        if status != 200:
+            return httpx.Response(status, headers={"Retry-After": "0"})
+        return httpx.Response(200, json=_completion())
+
+    monkeypatch.setenv("GROQ_API_KEY", "test-key")
+    response_cache.clear()
+    provider = LLMProvider(
+        client=httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+        inflight=SingleFlight(),
+        retry_policy=RetryPolicy(max_attempts=3, base_delay=0, deadline=5),
+        rate_governor=Governor(rpm=0, tpm=1000, max_wait=0.1)
+    )
+    provider.breaker = CircuitBreaker("reserve-test")
+    await provider.generate_completion([{"role": "user", "content": "retry me"}], max_tokens=300)
+    # Only the 15 reported tokens stay spent, not three reservations of ~300
+    await provider.governor.acquire(980)
+
+async def test_provider_refunds_tokens_of_failed_calls(monkeypatch):
+    monkeypatch.setenv("GROQ_API_KEY", "test-key")
+    response_cache.clear()
+    provider = LLMProvider(
+        client=httpx.AsyncClient(transport=httpx.MockTransport(lambda r: httpx.Response(400))),
+        inflight=SingleFlight(),
+        rate_governor=Governor(rpm=0, tpm=1000, max_wait=0.1)
+    )
+    provider.breaker = CircuitBreaker("refund-test")
+    with pytest.raises(HTTPException):
+        await provider.generate_completion([{"role": "user", "content": "bad"}], max_tokens=600)
+    await provider.governor.acquire(1000)
+
+async def test_stream_settles_reservation_from_reported_usage(monkeypatch):
+    body = _stream_body("streamed").replace(
+        "data: [DONE]", 'data: {"choices": [], "x_groq": {"usage": {"total_tokens": 15}}}\n\ndata: [DONE]'
+    )
+    monkeypatch.setenv("GROQ_API_KEY", "test-key")
+    provider = LLMProvider(
+        client=httpx.AsyncClient(transport=httpx.MockTransport(
+            lambda r: httpx.Response(200, text=body, headers={"content-type": "text/event-stream"})
+        )),
+        rate_governor=Governor(rpm=0, tpm=1000, max_wait=0.1)
+    )
+    provider.breaker = CircuitBreaker("stream-settle-test")
+    tokens = [t async for t in provider.stream_completion([{"role": "user", "content": "s"}], max_tokens=600)]
+    assert tokens == ["streamed"]
+    await provider.governor.acquire(980)
+
+async def test_governor_returns_request_slot_when_concurrency_times_out():
+    governor = Governor(rpm=2, tpm=0, max_concurrency=1, max_wait=0.05)
+    await governor.acquire(0)
+    with pytest.raises(CapacityExceeded):
+        await governor.acquire(0)
+    governor.release()
+    await governor.acquire(0)
+    assert governor.stats()["admitted"] == 2
+
+async def test_provider_returns_503_when_governor_is_saturated(monkeypatch):
+    monkeypatch.setenv("GROQ_API_KEY", "test-key")
+    response_cache.clear()
+    provider = LLMProvider(
+        client=httpx.AsyncClient(transport=httpx.MockTransport(lambda r: httpx.Response(200, json=_completion()))),
+        inflight=SingleFlight(),
+        rate_governor=Governor(rpm=1, tpm=0, max_wait=0.1)
+    )
+    provider.breaker = CircuitBreaker("governor-test")
+    await provider.generate_completion([{"role": "user", "content": "first"}])
+    with pytest.raises(HTTPException) as exc:
+        await provider.generate_completion([{"role": "user", "content": "second"}])
+    assert exc.value.status_code == 503
+    assert provider.governor.stats()["in_flight"] == 0
+
+def _routed_provider(name, handler):
+    provider = LLMProvider(
+        name,
+        client=httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+        inflight=SingleFlight(),
+        retry_policy=RetryPolicy(max_attempts=1, base_delay=0, deadline=5),
+        rate_governor=Governor(rpm=0, tpm=0, name=name)
+    )
+    provider.breaker = CircuitBreaker(f"{name}-router-test")
+    return provider
+
+def test_router_tracks_latency_per_model():
+    provider = LocalStubProvider()
+    provider.fast_model = "stub-fast"
+    provider.model_for = lambda tier: provider.fast_model if tier == "fast" else provider.model
+    for _ in range(5):
+        provider.latency.record("stub-fast", 0.1, True)
+        provider.latency.record(provider.model, 2.0, True)
+    router = ProviderRouter([provider], min_samples=5)
+    assert router.using(tier="fast").hedge_delay(provider) == 0.1
+    assert router.using(tier="quality").hedge_delay(provider) == 2.0
+    assert set(router.stats()["providers"]["local"]["models"]) == {"stub-fast", "local-stub"}
+
+async def test_router_fails_over_and_respects_preference(monkeypatch):
+    monkeypatch.setenv("GROQ_API_KEY", "test-key")
+    monkeypatch.setitem(PROVIDER_SPECS["openai"], "api_base", "http://compat.test/v1")
+    response_cache.clear()
+    groq = _routed_provider("groq", lambda r: httpx.Response(500))
+    compat = _routed_provider("openai", lambda r: httpx.Response(200, json=_completion("from compat")))
+    router = ProviderRouter([groq, compat, LocalStubProvider()], min_samples=1, max_error_rate=0.5)
+
+    result = await router.generate_completion([{"role": "user", "content": "route me"}])
+    assert result["choices"][0]["message"]["content"] == "from compat"
+    assert router.stats()["failovers"] == 1
+    # groq is now unhealthy, so it drops behind the working upstream but stays ahead of the stub
+    assert [p.name for p in router.candidates()] == ["openai", "groq", "local"]
+    assert router.using("groq").candidates()[0].name == "groq"
+    assert router.using("unknown").candidates()[0].name == "openai"
+
+async def test_router_streams_from_fallback_before_first_token(monkeypatch):
+    monkeypatch.setenv("GROQ_API_KEY", "test-key")
+    groq = _routed_provider("groq", lambda r: httpx.Response(503))
+    router = ProviderRouter([groq, LocalStubProvider()])
+    tokens = [t async for t in router.stream_completion([{"role": "user", "content": "hello"}])]
+    assert "".join(tokens).startswith("[local stub]")
+
+async def test_hedged_request_wins_over_slow_primary_and_cancels_it(monkeypatch):
+    monkeypatch.setenv("GROQ_API_KEY", "test-key")
+    response_cache.clear()
+    cancelled = []
+
+    class SlowProvider(LocalStubProvider):
+        fallback_only = False
+
+        async def generate_completion(self, messages, max_tokens=1000, coalesce=True, tier="quality"):
+            if coalesce:
+                try:
+                    await asyncio.sleep(5)
+                except asyncio.CancelledError:
+                    cancelled.append(self.name)
+                    raise
+            return _completion("hedge" if not coalesce else "primary")
+
+    router = ProviderRouter([SlowProvider("slow")])
+    monkeypatch.setattr(router, "hedge_delay", lambda provider, pct=95: 0.01)
+    result = await router.hedged_completion([{"role": "user", "content": "tab complete"}])
+    assert result["choices"][0]["message"]["content"] == "hedge"
+    assert cancelled == ["slow"]
+    hedging = router.stats()["hedging"]
+    assert hedging["hedged"] == 1 and hedging["hedge_wins"] == 1 and hedging["hedge_rate"] == 1.0
+
+def test_generate_hedging_is_opt_in_per_request(mock_upstream):
+    resp = client.post("/api/generate", json={
+        "language": "python", "description": "print hi", "options": {"hedge": True}
+    })
+    assert resp.json()["success"] is True
+    # Fast upstream: the primary answers before the hedge delay, so only one call is made
+    assert len(mock_upstream) == 1
+    assert llm_provider.router_stats()["hedging"]["primary_wins"] == 1
+
+def test_classify_request_picks_tier_from_inputs():
+    assert classify_request("explain", "print('hi')", "beginner", ["Logic Flow"]).tier == "fast"
+    assert classify_request("explain", "print('hi')", "advanced").tier == "quality"
+    assert classify_request("explain", "print('hi')", "beginner", ["Time Complexity"]).tier == "quality"
+    # Focus areas as the Streamlit client sends them
+    assert classify_request("explain", "print(1)", "intermediate", ["time_complexity"]).tier == "quality"
+    assert classify_request("explain", "print(1)", "intermediate", ["edge_cases"]).reason == "focus on edge cases"
+    assert classify_request("explain", "x = 1\n" * 200).tier == "quality"
+    assert classify_request("learn", "recursion", "intermediate").tier == "quality"
+    decision = classify_request("learn", "recursion", "beginner")
+    assert decision.tier == "fast" and decision.max_tokens == 4096
+
+def test_small_explain_uses_fast_model_and_endpoint_budget(mock_upstream):
+    resp = client.post("/api/explain", json={"code": "print('hi')", "language": "python"})
+    assert resp.json()["success"] is True
+    payload = json.loads(mock_upstream[0].content)
+    assert payload["model"] == "llama-3.1-8b-instant"
+    assert payload["max_tokens"] == 2048
+
+def test_metrics_endpoint_exposes_route_upstream_and_token_metrics(mock_upstream):
+    client.post("/api/explain", json={"code": "print('metrics')", "language": "python"})
+    client.post("/api/generate/stream", json={"language": "python", "description": "print hi"})
+    resp = client.get("/metrics")
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/plain; version=0.0.4")
+    body = resp.text
+    assert 'synthex_http_requests_total{route="/api/explain",method="POST",status="200"}' in body
+    assert 'synthex_http_request_duration_seconds_bucket{route="/api/explain",method="POST",le="+Inf"}' in body
+    assert 'synthex_llm_request_duration_seconds_count{provider="groq",model="llama-3.1-8b-instant",outcome="success"}' in body
+    assert 'synthex_llm_tokens_total{provider="groq",model="llama-3.1-8b-instant",kind="completion"}' in body
+    assert "synthex_llm_time_to_first_token_seconds_count" in body
+    assert 'synthex_cache_hit_ratio{cache="response"}' in body
+
+def test_explain_file_is_traced_by_stage(mock_upstream, monkeypatch):
+    exporter = tracing.InMemoryExporter()
+    monkeypatch.setattr(tracing, "exporter", exporter)
+    incoming = "00-" + "ab" * 16 + "-" + "cd" * 8 + "-01"
+    resp = client.post(
+        "/api/explain/file",
+        files={"file": ("trace.py", b"print('trace')", "text/plain")},
+        headers={"traceparent": incoming}
+    )
+    assert resp.json()["success"] is True
+    assert resp.headers["X-Trace-Id"] == "ab" * 16
+    spans = {span.name: span for span in exporter.spans}
+    for name in ("request.parse", "file.read", "file.decode", "prompt.build",
+                 "llm.completion", "llm.upstream", "response.validate"):
+        assert spans[name].trace_id == "ab" * 16
+    root = spans["POST /api/explain/file"]
+    assert root.parent_id == "cd" * 8
+    assert spans["file.read"].parent_id == root.span_id
+    assert spans["llm.upstream"].parent_id == spans["llm.completion"].span_id
+
+def test_percentile_nearest_rank():
+    assert percentile([], 50) is None
+    assert percentile([0.4, 0.1, 0.3, 0.2], 50) == 0.2
+    assert percentile([float(i) for i in range(1, 101)], 95) == 95.0
+
+def test_parse_retry_after():
+    assert parse_retry_after("2") == 2.0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+
+def test_mock_llm_server_streams_and_reports_usage(mock_llm_server):
+    resp = client.post("/api/explain/stream", json={"code": "print('mock')", "language": "python"})
+    assert resp.status_code == 200
+    assert "data:" in resp.text
+    assert mock_llm_server["streams"] == 1
+
+async def test_mock_llm_server_injects_errors():
+    mock_app = create_app(MockConfig(latency="fixed:0", error_rate=1.0, error_statuses=[429]))
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=mock_app), base_url="http://mock") as c:
+        resp = await c.post("/v1/chat/completions", json={"messages": [{"role": "user", "content": "hi"}]})
+    assert resp.status_code == 429
+    assert resp.headers["Retry-After"] == "1"
+    assert mock_app.state.stats["errors_injected"] == 1
+
+def test_large_and_streamed_responses_are_compressed(mock_upstream):
+    resp = client.get("/metrics", headers={"Accept-Encoding": "gzip"})
+    assert resp.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in resp.headers["vary"]
+    assert "synthex_http_requests_total" in resp.text
+    resp = client.get("/api/explain/supported-types", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in resp.headers
+    resp = client.get("/metrics", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in resp.headers
+    resp = client.post(
+        "/api/explain/stream", json={"code": "print('hi')", "language": "python"},
+        headers={"Accept-Encoding": "gzip"}
+    )
+    assert resp.headers["content-encoding"] == "gzip"
+    assert "event: done" in resp.text
+
+def test_compressed_request_bodies_are_accepted(mock_upstream):
+    import gzip
+    body = gzip.compress(json.dumps({"code": "print('hi')", "language": "python"}).encode())
+    headers = {"Content-Encoding": "gzip", "Content-Type": "application/json"}
+    resp = client.post("/api/explain", content=body, headers=headers)
+    assert resp.json()["success"] is True
+    upload = httpx.Request("POST", "http://test/", files={"file": ("gz.py", b"print('gz')", "text/plain")})
+    resp = client.post("/api/explain/file", content=gzip.compress(upload.read()), headers={
+        "Content-Encoding": "gzip", "Content-Type": upload.headers["Content-Type"]
+    })
+    assert resp.json()["data"]["filename"] == "gz.py"
+    assert client.post("/api/explain", content=body[:20], headers=headers).status_code == 400
+    assert client.post("/api/explain", content=body, headers={**headers, "Content-Encoding": "compress"}).status_code == 415
+
+async def test_compressed_request_bodies_are_size_limited():
+    import gzip
+    from fastapi import FastAPI, Request
+    from api.services.compression import CompressionMiddleware
+
+    echo = FastAPI()
+
+    @echo.post("/echo")
+    async def echo_body(request: Request):
+        return {"size": len(await request.body())}
+
+    transport = httpx.ASGITransport(app=CompressionMiddleware(echo, max_request_bytes=1000))
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as test_client:
+        ok = await test_client.post("/echo", content=gzip.compress(b"x" * 500), headers={"Content-Encoding": "gzip"})
+        assert ok.json() == {"size": 500}
+        # Incompressible input larger than the cap is refused while it is read
+        raw = gzip.compress(os.urandom(2000))
+        resp = await test_client.post("/echo", content=raw, headers={"Content-Encoding": "gzip"})
+        assert resp.status_code == 413
+
+def test_brotli_bomb_is_stopped_at_the_limit():
+    brotli = pytest.importorskip("brotli")
+    from api.services.compression import BodyTooLarge, decompress
+    bomb = brotli.compress(b"\0" * (64 * 1024 * 1024))
+    with pytest.raises(BodyTooLarge):
+        decompress(bomb, "br", limit=1024 * 1024)
+    assert decompress(brotli.compress(b"hello"), "br", limit=100) == b"hello"
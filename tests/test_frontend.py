@@ -112,4 +112,263 @@ class TestFrontend:
         for mode in ["Home", "Generate", "Explain", "Learn"]:
             app.sidebar.selectbox(mode_label).select(mode).run()
             markdown_texts = [m.value for m in app.markdown]
-            assert any(mode.lower() in text.lower() for text in markdown_texts)
\ No newline at end of file
+            assert any(mode.lower() in text.lower() for text in markdown_texts)
+
+
+def _api_response(data, status_code=200, headers=None):
+    response = MagicMock()
+    response.status_code = status_code
+    response.headers = headers or {}
+    response.content = b"{}"
+    response.json.return_value = {"success": True, "data": data, "error": None}
+    return response
+
+def _api_service(*responses, **kwargs):
+    from utils.api_service import APIService, ResultCache
+    session = MagicMock()
+    session.request.side_effect = list(responses)
+    return APIService(base_url="http://backend.test", session=session, cache=ResultCache(), **kwargs), session
+
+def test_explain_without_session_is_cached():
+    service, session = _api_service(_api_response({"explanation": "first"}))
+    args = ("print(1)", "Python", "Beginner", ["Logic Flow"], False, False, "groq")
+    assert service.explain_code(*args)["explanation"] == "first"
+    assert service.explain_code(*args)["explanation"] == "first"
+    assert session.request.call_count == 1
+    assert service.last_timing["cached"] is True
+
+def test_explain_with_session_always_reaches_backend():
+    service, session = _api_service(
+        _api_response({"explanation": "a", "chunks": [{"name": "f", "status": "added"}]}),
+        _api_response({"explanation": "a", "chunks": [{"name": "f", "status": "unchanged"}]})
+    )
+    args = ("def f():\n    pass\n", "Python", "Beginner", ["Logic Flow"], False, False, "groq")
+    service.explain_code(*args, session_id="s1")
+    second = service.explain_code(*args, session_id="s1")
+    assert session.request.call_count == 2
+    assert second["chunks"][0]["status"] == "unchanged"
+    assert session.request.call_args.kwargs["params"] == {"session_id": "s1"}
+
+
+@pytest.fixture
+def formatter_module(monkeypatch):
+    from utils import code_formatter
+    code_formatter.format_cache.clear()
+    code_formatter.highlight_cache.clear()
+    monkeypatch.setattr(code_formatter, "_pending", {})
+    yield code_formatter
+    code_formatter.format_cache.clear()
+    code_formatter.highlight_cache.clear()
+
+def test_black_rejected_code_is_repaired_by_autopep8(formatter_module):
+    broken = "x = 1\n  y = 2\n"
+    assert formatter_module.run_python_formatters(broken, 88) == "x = 1\ny = 2\n"
+    assert formatter_module.run_python_formatters(broken, 88, fast=True) == "x = 1\ny = 2\n"
+
+def test_fast_mode_skips_autopep8(formatter_module):
+    with patch.object(formatter_module.autopep8, "fix_code", side_effect=lambda code, options: code) as fix:
+        assert formatter_module.run_python_formatters("x=1\n", 88, fast=True) == "x = 1\n"
+        fix.assert_not_called()
+        formatter_module.run_python_formatters("x=1\n", 88)
+        fix.assert_called_once()
+        fix.reset_mock()
+        formatter_module.run_python_formatters("x = 1\n", 88)
+        fix.assert_not_called()
+
+def test_format_cache_serves_repeat_and_formatted_code(formatter_module, monkeypatch):
+    monkeypatch.setattr(formatter_module, "get_format_pool", lambda: None)
+    formatter = formatter_module.CodeFormatter()
+    with patch.object(formatter_module, "run_python_formatters", wraps=formatter_module.run_python_formatters) as run:
+        formatted = formatter.format_code("x=1\n", "python")
+        assert formatter.format_code("x=1\n", "python") == formatted == "x = 1\n"
+        assert formatter.format_code(formatted, "python") == formatted
+        assert run.call_count == 1
+        formatter.format_code("x=1\n", "python", max_length=40)
+        assert run.call_count == 2
+
+def test_format_timeout_reuses_the_pending_job(formatter_module, monkeypatch):
+    from concurrent.futures import Future
+    future = Future()
+    pool = MagicMock()
+    pool.submit.return_value = future
+    monkeypatch.setattr(formatter_module, "get_format_pool", lambda: pool)
+    monkeypatch.setattr(formatter_module, "FORMAT_TIMEOUT", 0.01)
+    formatter = formatter_module.CodeFormatter()
+
+    assert formatter.format_code("x=1\n", "python") == "x=1\n"
+    assert formatter.format_code("x=1\n", "python") == "x=1\n"
+    assert pool.submit.call_count == 1
+
+    future.set_result("x = 1\n")
+    assert formatter.format_code("x=1\n", "python") == "x = 1\n"
+    assert pool.submit.call_count == 1
+    assert formatter_module._pending == {}
+
+def test_broken_pool_is_reset(formatter_module, monkeypatch):
+    from concurrent.futures import Future
+    from concurrent.futures.process import BrokenProcessPool
+    future = Future()
+    future.set_exception(BrokenProcessPool("worker died"))
+    pool = MagicMock()
+    pool.submit.return_value = future
+    monkeypatch.setattr(formatter_module, "get_format_pool", lambda: pool)
+    reset = MagicMock()
+    monkeypatch.setattr(formatter_module, "_reset_format_pool", reset)
+    assert formatter_module.CodeFormatter().format_code("x=1\n", "python") == "x=1\n"
+    reset.assert_called_once()
+
+def test_format_pool_formats_in_a_worker_process(formatter_module, monkeypatch):
+    monkeypatch.setattr(formatter_module, "FORMAT_POOL_WORKERS", 1)
+    monkeypatch.setattr(formatter_module, "FORMAT_TIMEOUT", 120)
+    monkeypatch.setattr(formatter_module, "_pool", None)
+    try:
+        pool = formatter_module.get_format_pool()
+        assert pool is formatter_module.get_format_pool()
+        assert formatter_module.CodeFormatter().format_code("x=1\n", "python") == "x = 1\n"
+    finally:
+        formatter_module._reset_format_pool()
+    assert formatter_module._pool is None
+
+
+def test_session_pools_connections_and_retries_only_idempotent_statuses():
+    from utils.api_service import create_session
+    session = create_session(pool_maxsize=4, max_retries=2, backoff=0)
+    adapter = session.get_adapter("https://backend.test/api/explain")
+    assert adapter is session.get_adapter("http://backend.test/")
+    assert adapter._pool_maxsize == 4
+    retry = adapter.max_retries
+    assert retry.connect == 2 and retry.total == 2
+    assert retry.is_retry("GET", 503) and retry.is_retry("GET", 429)
+    assert not retry.is_retry("POST", 503)
+    assert not retry.is_retry("GET", 500)
+
+def test_session_retries_get_against_a_live_server():
+    import threading
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from utils.api_service import create_session
+    statuses = {"GET": [503, 200], "POST": [503, 200]}
+    seen = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def _reply(self):
+            seen.append(self.command)
+            self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            self.send_response(statuses[self.command].pop(0))
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        do_GET = do_POST = _reply
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        session = create_session(max_retries=2, backoff=0)
+        url = f"http://127.0.0.1:{server.server_port}/api/status"
+        assert session.get(url, timeout=5).status_code == 200
+        # A POST may already have started an LLM call, so a 503 is returned as-is
+        assert session.post(url, data=b"{}", timeout=5).status_code == 503
+        assert seen == ["GET", "GET", "POST"]
+    finally:
+        server.shutdown()
+
+def test_requests_use_connect_and_read_timeouts():
+    service, session = _api_service(_api_response({"status": "online"}), connect_timeout=2, read_timeout=30)
+    service.check_status()
+    assert session.request.call_args.kwargs["timeout"] == (2, 30)
+
+def test_request_compression_is_opt_in():
+    import gzip
+    import json
+    from utils.api_service import API_COMPRESS_MIN_SIZE
+    code = "x = 1\n" * API_COMPRESS_MIN_SIZE
+    args = (code, "Python", "Beginner", ["Logic Flow"], False, False, "groq")
+
+    service, session = _api_service(_api_response({"explanation": "plain"}))
+    service.explain_code(*args)
+    assert "Content-Encoding" not in session.request.call_args.kwargs["headers"]
+
+    service, session = _api_service(_api_response({"explanation": "gzipped"}), compress=True)
+    service.explain_code(*args)
+    sent = session.request.call_args.kwargs
+    assert sent["headers"]["Content-Encoding"] == "gzip"
+    assert json.loads(gzip.decompress(sent["data"]))["code"] == code
+    assert service.last_timing["request_compressed"] is True
+
+
+def test_text_cache_evicts_least_recently_used_entry():
+    from utils.code_formatter import TextCache
+    cache = TextCache(max_entries=2, max_bytes=1000)
+    cache.set("a", "1")
+    cache.set("b", "2")
+    assert cache.get("a") == "1"
+    cache.set("c", "3")
+    assert cache.get("b") is None
+    assert cache.get("a") == "1" and cache.get("c") == "3"
+    assert cache.stats() == {"entries": 2, "bytes": 2, "hits": 3, "misses": 1}
+
+def test_text_cache_stays_within_byte_budget():
+    from utils.code_formatter import TextCache
+    cache = TextCache(max_entries=10, max_bytes=10)
+    cache.set("a", "x" * 4)
+    cache.set("b", "y" * 4)
+    cache.set("c", "z" * 4)
+    assert cache.get("a") is None
+    assert cache.stats()["bytes"] == 8
+    cache.set("big", "w" * 11)
+    assert cache.get("big") is None
+    cache.set("b", "short")
+    assert cache.stats()["bytes"] == 9
+
+def test_highlight_is_memoized_per_code_language_style_and_linenos(formatter_module):
+    from utils.code_formatter import CodeFormatter
+    with patch.object(formatter_module, "highlight", wraps=formatter_module.highlight) as render:
+        html = CodeFormatter().highlight_code("x = 1", "Python")
+        assert CodeFormatter().highlight_code("x = 1", "python") == html
+        assert render.call_count == 1
+        CodeFormatter().highlight_code("x = 1", "javascript")
+        CodeFormatter(style="default").highlight_code("x = 1", "python")
+        CodeFormatter(linenos=False).highlight_code("x = 1", "python")
+        CodeFormatter().highlight_code("x = 2", "python")
+        assert render.call_count == 5
+    assert formatter_module.highlight_cache.stats()["entries"] == 5
+
+
+@pytest.mark.parametrize("total, page, expected", [
+    (0, 0, (0, 1, 0)),
+    (5, 0, (0, 1, 0)),
+    (12, 2, (2, 3, 10)),
+    (12, 7, (2, 3, 10)),
+    (6, -1, (0, 2, 0)),
+])
+def test_history_page_bounds(total, page, expected):
+    from utils.state_manager import history_page
+    assert history_page(total, page, 5) == expected
+
+def test_history_views_are_rebuilt_when_the_entry_changes(formatter_module):
+    from utils.code_formatter import CodeFormatter
+    from utils.state_manager import build_history_views, ensure_history_views
+    item = {"mode": "Explanation", "language": "python", "full_code": "x = 1", "explanation": "Sets x"}
+    item.update(build_history_views(item))
+    with patch("utils.state_manager.build_history_views", wraps=build_history_views) as build:
+        assert ensure_history_views(item)["summary"] == "Sets x"
+        assert build.call_count == 0
+        item["explanation"] = "Assigns one to x"
+        assert ensure_history_views(item)["summary"] == "Assigns one to x"
+        ensure_history_views(item, CodeFormatter(linenos=False))
+        assert build.call_count == 2
+    legacy = {"mode": "Learning", "topic": "Loops", "difficulty": "Beginner"}
+    assert "Loops" in ensure_history_views(legacy)["detail_html"] and "id" in legacy
+
+
+def test_app_starts_an_explain_session():
+    import os
+    app_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+    at = AppTest.from_file(app_path, default_timeout=60)
+    at.run()
+    session_id = at.session_state["explain_session_id"]
+    assert session_id
+    at.run()
+    assert at.session_state["explain_session_id"] == session_id
@@ -2,24 +2,239 @@
 API service layer for Synthex application.
 Handles all communication with the backend API.
 """
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict, deque
 import streamlit as st
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from typing import Dict, Any, List, Optional
 
+# Connection pool and timeouts for calls to the backend
+API_POOL_MAXSIZE = int(os.getenv("SYNTHEX_API_POOL_MAXSIZE", "10"))
+API_CONNECT_TIMEOUT = float(os.getenv("SYNTHEX_API_CONNECT_TIMEOUT", "5"))
+API_READ_TIMEOUT = float(os.getenv("SYNTHEX_API_READ_TIMEOUT", "90"))
+API_MAX_RETRIES = int(os.getenv("SYNTHEX_API_MAX_RETRIES", "3"))
+API_RETRY_BACKOFF = float(os.getenv("SYNTHEX_API_RETRY_BACKOFF", "0.5"))
+# Opt-in gzip request bodies; only for backends that accept Content-Encoding on requests
+API_COMPRESS_REQUESTS = os.getenv("SYNTHEX_API_COMPRESS", "false").lower() in ("1", "true", "yes")
+# With compression on, request bodies at least this large (bytes) are gzipped
+API_COMPRESS_MIN_SIZE = int(os.getenv("SYNTHEX_API_COMPRESS_MIN_SIZE", "4096"))
+API_TIMING_HISTORY = 50
+# Backend URL; defaults to the hosted API
+SYNTHEX_API_URL = os.getenv("SYNTHEX_API_URL", "https://synthex-3.onrender.com")
+# Client-side cache of idempotent results, shared by all sessions in this process
+CLIENT_CACHE_ENABLED = os.getenv("SYNTHEX_CLIENT_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+CLIENT_CACHE_TTL = float(os.getenv("SYNTHEX_CLIENT_CACHE_TTL", "900"))
+CLIENT_CACHE_MAX_BYTES = int(os.getenv("SYNTHEX_CLIENT_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+
+class ResultCache:
+    """
+    Thread-safe LRU of API results with a TTL and a total size budget.
+    Results are stored as JSON, so every hit returns a fresh copy that the
+    caller may modify freely.
+    """
+    
+    def __init__(self, max_bytes: int = CLIENT_CACHE_MAX_BYTES, ttl: float = CLIENT_CACHE_TTL):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def key(endpoint: str, payload: Dict[str, Any]) -> str:
+        canonical = json.dumps({"endpoint": endpoint, "payload": payload}, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+    
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < time.monotonic():
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            body = entry[1]
+        return json.loads(body)
+    
+    def set(self, key: str, value: Dict[str, Any]):
+        body = json.dumps(value).encode("utf-8")
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, body)
+            self.total_bytes += len(body)
+            while self.total_bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.total_bytes,
+                "hits": self.hits,
+                "misses": self.misses
+            }
+    
+    def _remove(self, key: str):
+        _, body = self._entries.pop(key)
+        self.total_bytes -= len(body)
+
+def create_session(pool_maxsize: int = API_POOL_MAXSIZE, max_retries: int = API_MAX_RETRIES,
+                   backoff: float = API_RETRY_BACKOFF) -> requests.Session:
+    """
+    Keep-alive session with a bounded connection pool.
+    
+    Connection failures are retried for every method (nothing reached the
+    server); read failures and 429/502/503/504 only for idempotent methods,
+    since a POST may already have started an LLM call.
+    """
+    retry = Retry(
+        total=max_retries,
+        connect=max_retries,
+        read=max_retries,
+        status=max_retries,
+        backoff_factor=backoff,
+        status_forcelist=(429, 502, 503, 504),
+        allowed_methods=frozenset({"GET", "HEAD", "OPTIONS"}),
+        respect_retry_after_header=True,
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
 class APIService:
     """
     Service class for handling API calls to the Synthex backend.
     Abstracts API communication details from the UI components.
     """
     
-    def __init__(self, base_url: str = "https://synthex-3.onrender.com"):
+    def __init__(self,
+                 base_url: str = SYNTHEX_API_URL,
+                 connect_timeout: float = API_CONNECT_TIMEOUT,
+                 read_timeout: float = API_READ_TIMEOUT,
+                 compress: bool = API_COMPRESS_REQUESTS,
+                 session: Optional[requests.Session] = None,
+                 cache: Optional[ResultCache] = None):
         """
         Initialize the API service
         
         Parameters:
             base_url: Base URL of the Synthex API
+            connect_timeout: Seconds to wait for a connection
+            read_timeout: Seconds to wait for the response after sending
+            compress: Send large request bodies gzip-compressed (the backend
+                      must accept compressed requests)
+            session: Session to use (defaults to a pooled, retrying one)
+            cache: Cache for idempotent results (defaults to a new one;
+                   disabled with SYNTHEX_CLIENT_CACHE_ENABLED=false)
         """
-        self.base_url = base_url
+        self.base_url = base_url.rstrip("/")
+        self.timeout = (connect_timeout, read_timeout)
+        self.compress = compress
+        self.session = session or create_session()
+        self.cache = cache or (ResultCache() if CLIENT_CACHE_ENABLED else None)
+        self._timings = deque(maxlen=API_TIMING_HISTORY)
+        self._lock = threading.Lock()
+        # Streamlit runs each session's script in its own thread
+        self._local = threading.local()
+    
+    @property
+    def last_timing(self) -> Optional[Dict[str, Any]]:
+        """Timing record of the most recent call made from this thread, if any"""
+        return getattr(self._local, "last_timing", None)
+    
+    def timings(self) -> List[Dict[str, Any]]:
+        """Timing records of recent calls, oldest first"""
+        with self._lock:
+            return list(self._timings)
+    
+    def _record_timing(self, method: str, endpoint: str, started: float,
+                       response: Optional[requests.Response], sent_bytes: int,
+                       compressed: bool, error: Optional[str] = None):
+        retries = getattr(getattr(response, "raw", None), "retries", None)
+        record = {
+            "method": method,
+            "endpoint": endpoint,
+            "status": response.status_code if response is not None else None,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+            "request_bytes": sent_bytes,
+            "request_compressed": compressed,
+            "response_bytes": len(response.content) if response is not None else 0,
+            "response_encoding": response.headers.get("Content-Encoding") if response is not None else None,
+            "retries": len(retries.history) if retries is not None else 0,
+            "trace_id": response.headers.get("X-Trace-Id") if response is not None else None,
+            "cached": False,
+            "error": error,
+            "timestamp": time.time()
+        }
+        self._local.last_timing = record
+        with self._lock:
+            self._timings.append(record)
+    
+    def _cached_request(self, endpoint: str, data: Dict, params: Optional[Dict] = None):
+        """
+        POST through the result cache. Only for idempotent calls: identical
+        payloads share one result across reruns and sessions until the TTL.
+        `params` are sent but not part of the key.
+        """
+        if self.cache is None:
+            return self._handle_request("POST", endpoint, data=data, params=params)
+        key = ResultCache.key(endpoint, data)
+        started = time.perf_counter()
+        result = self.cache.get(key)
+        if result is not None:
+            self._local.last_timing = {
+                "method": "POST",
+                "endpoint": endpoint,
+                "status": None,
+                "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+                "request_bytes": 0,
+                "request_compressed": False,
+                "response_bytes": 0,
+                "response_encoding": None,
+                "retries": 0,
+                "trace_id": None,
+                "cached": True,
+                "error": None,
+                "timestamp": time.time()
+            }
+            return result
+        result = self._handle_request("POST", endpoint, data=data, params=params)
+        self.cache.set(key, result)
+        return result
+    
+    def _encode_body(self, data: Optional[Dict]):
+        """JSON body and headers, gzip-compressed when large enough"""
+        if data is None:
+            return None, {}
+        body = json.dumps(data).encode("utf-8")
+        headers = {"Content-Type": "application/json"}
+        if self.compress and len(body) >= API_COMPRESS_MIN_SIZE:
+            body = gzip.compress(body)
+            headers["Content-Encoding"] = "gzip"
+        return body, headers
     
     def _handle_request(self, method: str, endpoint: str, data: Optional[Dict] = None, params: Optional[Dict] = None):
         """
@@ -38,14 +253,19 @@ class APIService:
             Exception: If the API request fails
         """
         url = f"{self.base_url}{endpoint}"
+        method = method.upper()
+        if method not in ("GET", "POST"):
+            raise ValueError(f"Unsupported HTTP method: {method}")
+        
+        body, headers = self._encode_body(data)
+        started = time.perf_counter()
+        response = None
         
         try:
-            if method.upper() == "GET":
-                response = requests.get(url, params=params)
-            elif method.upper() == "POST":
-                response = requests.post(url, json=data, params=params)
-            else:
-                raise ValueError(f"Unsupported HTTP method: {method}")
+            response = self.session.request(
+                method, url, data=body, params=params, headers=headers, timeout=self.timeout
+            )
+            self._record_timing(method, endpoint, started, response, len(body or b""), "Content-Encoding" in headers)
                 
             response.raise_for_status()
             result = response.json()
@@ -56,6 +276,9 @@ class APIService:
             return result.get("data", {})
             
         except requests.exceptions.RequestException as e:
+            if response is None:
+                self._record_timing(method, endpoint, started, None, len(body or b""),
+                                    "Content-Encoding" in headers, error=type(e).__name__)
             raise Exception(f"API request failed: {str(e)}")
         except ValueError as e:
             raise Exception(f"Invalid API response: {str(e)}")
@@ -67,7 +290,8 @@ class APIService:
                     focus_areas: List[str], 
                     line_by_line: bool, 
                     include_examples: bool,
-                    provider: str) -> Dict[str, Any]:
+                    provider: str,
+                    session_id: Optional[str] = None) -> Dict[str, Any]:
         """
         Request code explanation from the API
         
@@ -79,6 +303,7 @@ class APIService:
             line_by_line: Whether to explain line by line
             include_examples: Whether to include examples
             provider: AI model provider
+            session_id: Optional session so unchanged definitions are reused
             
         Returns:
             Dictionary containing the explanation
@@ -95,36 +320,43 @@ class APIService:
             "provider": provider
         }
         
-        return self._handle_request("POST", "/api/explain", data=payload)
+        if session_id:
+            # A session's response is diffed against its previous request and moves the
+            # backend's fingerprint forward, so it is never answered from the cache
+            return self._handle_request("POST", "/api/explain", data=payload, params={"session_id": session_id})
+        
+        return self._cached_request("/api/explain", payload)
         
     def generate_code(self,
-                     prompt: str,
+                     description: str,
                      language: str,
+                     difficulty: str,
                      optimization_focus: str,
-                     include_comments: bool,
-                     provider: str) -> Dict[str, Any]:
+                     include_comments: bool) -> Dict[str, Any]:
         """
         Request code generation from the API
         
         Parameters:
-            prompt: Description of the code to generate
+            description: Description of the code to generate
             language: Target programming language
+            difficulty: Code complexity level
             optimization_focus: What to optimize for (readability, performance, etc.)
             include_comments: Whether to include detailed comments
-            provider: AI model provider
             
         Returns:
-            Dictionary containing the generated code
+            Dictionary containing the generated code and its complexity
         """
         payload = {
-            "prompt": prompt,
             "language": language.lower(),
-            "optimization_focus": optimization_focus.lower(),
-            "include_comments": include_comments,
-            "provider": provider
+            "description": description,
+            "difficulty": difficulty.lower(),
+            "options": {
+                "include_comments": include_comments,
+                "optimization_focus": optimization_focus.lower()
+            }
         }
         
-        return self._handle_request("POST", "/api/generate", data=payload)
+        return self._cached_request("/api/generate", payload)
         
     def learn_concept(self,
                      main_topic: str,
@@ -1,10 +1,158 @@
-from typing import Optional
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Optional, Tuple
 import black
 import autopep8
+import hashlib
+import multiprocessing
+import os
 import re
+import threading
 from pygments import highlight
 from pygments.formatters import HtmlFormatter
 from pygments.lexers import get_lexer_by_name, Python3Lexer
+from pygments.util import ClassNotFound
+
+# Rendered HTML and formatted code are memoized per process, so every session and rerun shares them
+HIGHLIGHT_CACHE_MAX_ENTRIES = int(os.getenv("HIGHLIGHT_CACHE_MAX_ENTRIES", "512"))
+HIGHLIGHT_CACHE_MAX_BYTES = int(os.getenv("HIGHLIGHT_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+FORMAT_CACHE_MAX_ENTRIES = int(os.getenv("FORMAT_CACHE_MAX_ENTRIES", "256"))
+FORMAT_CACHE_MAX_BYTES = int(os.getenv("FORMAT_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+# Python formatting runs in worker processes (0 = in the calling thread)
+FORMAT_POOL_WORKERS = int(os.getenv("FORMAT_POOL_WORKERS", "2"))
+FORMAT_TIMEOUT = float(os.getenv("FORMAT_TIMEOUT", "5"))
+# Fast mode skips autopep8 and formats with black alone
+FORMAT_FAST = os.getenv("FORMAT_FAST", "false").lower() in ("1", "true", "yes")
+
+class TextCache:
+    """Thread-safe LRU of strings, bounded by entries and total size"""
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(text: str, *options) -> str:
+        """Content hash of `text` plus the options that change its rendering"""
+        digest = hashlib.sha256(text.encode("utf-8", "surrogatepass"))
+        for option in options:
+            digest.update(f"\0{option}".encode("utf-8"))
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: str):
+        size = len(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self.total_bytes -= len(self._entries.pop(key))
+            self._entries[key] = value
+            self.total_bytes += size
+            while len(self._entries) > self.max_entries or self.total_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.total_bytes -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.total_bytes,
+                "hits": self.hits,
+                "misses": self.misses
+            }
+
+highlight_cache = TextCache(HIGHLIGHT_CACHE_MAX_ENTRIES, HIGHLIGHT_CACHE_MAX_BYTES)
+format_cache = TextCache(FORMAT_CACHE_MAX_ENTRIES, FORMAT_CACHE_MAX_BYTES)
+
+# Lexers and formatters hold no per-call state, so one instance per key is reused
+_lexers: Dict[str, object] = {}
+_html_formatters: Dict[Tuple[str, bool], HtmlFormatter] = {}
+
+def get_lexer(name: str):
+    """Cached lexer for a Pygments language name (Python if unknown)"""
+    lexer = _lexers.get(name)
+    if lexer is None:
+        try:
+            lexer = get_lexer_by_name(name)
+        except ClassNotFound:
+            lexer = Python3Lexer()
+        _lexers[name] = lexer
+    return lexer
+
+def get_html_formatter(style: str = 'monokai', linenos: bool = True) -> HtmlFormatter:
+    formatter = _html_formatters.get((style, linenos))
+    if formatter is None:
+        formatter = _html_formatters[(style, linenos)] = HtmlFormatter(
+            style=style,
+            linenos=linenos,
+            cssclass="source"
+        )
+    return formatter
+
+def run_python_formatters(code: str, max_length: int, fast: bool = False) -> str:
+    """
+    autopep8 then black (black only in fast mode). Runs in a worker process.
+    Code black leaves unchanged is already formatted, so autopep8 is skipped;
+    code black rejects goes through autopep8 first, which often repairs it.
+    """
+    mode = black.FileMode(line_length=max_length)
+    try:
+        formatted = black.format_str(code, mode=mode)
+    except Exception:
+        formatted = None
+    if formatted is not None and (fast or formatted == code):
+        return formatted
+    # First pass with autopep8 for basic PEP8 compliance, then black for consistent styling
+    code = autopep8.fix_code(code, options={'max_line_length': max_length})
+    return black.format_str(code, mode=mode)
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+# Formatting jobs still running in the pool, by cache key, so reruns wait on them instead of resubmitting
+_pending: Dict[str, Future] = {}
+_pending_lock = threading.RLock()
+
+def get_format_pool() -> Optional[ProcessPoolExecutor]:
+    """Shared worker pool for formatting; None when FORMAT_POOL_WORKERS is 0"""
+    global _pool
+    if FORMAT_POOL_WORKERS <= 0:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            # spawn: forking the multi-threaded Streamlit server is unsafe
+            _pool = ProcessPoolExecutor(
+                max_workers=FORMAT_POOL_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _pool
+
+def _reset_format_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
 
 class CodeFormatter:
     """Utility class for code formatting across Synthex application"""
@@ -18,12 +166,10 @@ class CodeFormatter:
         "csharp": "csharp"
     }
 
-    def __init__(self):
-        self.html_formatter = HtmlFormatter(
-            style='monokai',
-            linenos=True,
-            cssclass="source"
-        )
+    def __init__(self, style: str = 'monokai', linenos: bool = True):
+        self.style = style
+        self.linenos = linenos
+        self.html_formatter = get_html_formatter(style, linenos)
 
     def format_code(self, code: str, language: str, max_length: int = 88) -> str:
         """Format code according to language-specific standards"""
@@ -42,25 +188,52 @@ class CodeFormatter:
             print(f"Formatting error: {str(e)}")
             return code  # Return original code if formatting fails
 
-    def _format_python(self, code: str, max_length: int) -> str:
-        """Format Python code using black and autopep8"""
+    def _format_python(self, code: str, max_length: int, fast: bool = FORMAT_FAST) -> str:
+        """Format Python code using black and autopep8, off-thread and memoized"""
+        key = TextCache.key(code, "python", max_length, fast)
+        cached = format_cache.get(key)
+        if cached is not None:
+            return cached
+        pool = get_format_pool()
         try:
-            # First pass with autopep8 for basic PEP8 compliance
-            code = autopep8.fix_code(
-                code,
-                options={'max_line_length': max_length}
-            )
-            
-            # Second pass with black for consistent styling
-            code = black.format_str(
-                code,
-                mode=black.FileMode(
-                    line_length=max_length
-                )
-            )
+            if pool is None:
+                formatted = run_python_formatters(code, max_length, fast)
+            else:
+                formatted = self._submit(pool, key, code, max_length, fast).result(timeout=FORMAT_TIMEOUT)
+        except FutureTimeout:
+            # Show the code as-is rather than hold up the render; the next rerun picks up the late result
+            return code
+        except BrokenProcessPool:
+            _reset_format_pool()
             return code
         except Exception:
-            return self._format_generic(code)
+            formatted = self._format_generic(code)
+        self._remember(key, formatted, max_length, fast)
+        return formatted
+
+    @classmethod
+    def _submit(cls, pool: ProcessPoolExecutor, key: str, code: str, max_length: int, fast: bool) -> Future:
+        """The pool job formatting `key`, reusing one that is still running"""
+        with _pending_lock:
+            future = _pending.get(key)
+            if future is None:
+                future = _pending[key] = pool.submit(run_python_formatters, code, max_length, fast)
+                future.add_done_callback(lambda done: cls._finish(done, key, max_length, fast))
+            return future
+
+    @staticmethod
+    def _remember(key: str, formatted: str, max_length: int, fast: bool):
+        format_cache.set(key, formatted)
+        # Formatting is idempotent: formatting the output again is a cache hit
+        format_cache.set(TextCache.key(formatted, "python", max_length, fast), formatted)
+
+    @classmethod
+    def _finish(cls, future: Future, key: str, max_length: int, fast: bool):
+        with _pending_lock:
+            if _pending.get(key) is future:
+                del _pending[key]
+        if not future.cancelled() and future.exception() is None:
+            cls._remember(key, future.result(), max_length, fast)
 
     def _format_generic(self, code: str) -> str:
         """Basic formatting for any programming language"""
@@ -85,15 +258,18 @@ class CodeFormatter:
         return '\n'.join(formatted_lines)
 
     def highlight_code(self, code: str, language: str) -> str:
-        """Convert code to HTML with syntax highlighting"""
-        try:
-            lexer = get_lexer_by_name(
-                self.SUPPORTED_LANGUAGES.get(language.lower(), 'text')
-            )
-            return highlight(code, lexer, self.html_formatter)
-        except Exception:
-            # Fallback to Python highlighting if language not supported
-            return highlight(code, Python3Lexer(), self.html_formatter)
+        """Convert code to HTML with syntax highlighting (memoized)"""
+        lexer_name = self.SUPPORTED_LANGUAGES.get(language.lower(), 'text')
+        key = TextCache.key(code, lexer_name, self.style, self.linenos)
+        html = highlight_cache.get(key)
+        if html is None:
+            try:
+                html = highlight(code, get_lexer(lexer_name), self.html_formatter)
+            except Exception:
+                # Fallback to Python highlighting if the language lexer fails
+                html = highlight(code, get_lexer('python3'), self.html_formatter)
+            highlight_cache.set(key, html)
+        return html
 
     def get_css_styles(self) -> str:
         """Return CSS styles for syntax highlighting"""
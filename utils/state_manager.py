@@ -3,8 +3,89 @@ Centralized state management for Synthex application.
 This module provides a clean interface for managing application state.
 """
 import streamlit as st
+import html
+import os
+import uuid
 from datetime import datetime
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Tuple
+from utils.code_formatter import CodeFormatter, TextCache
+
+HISTORY_MAX_ITEMS = int(os.getenv("HISTORY_MAX_ITEMS", "50"))
+HISTORY_SUMMARY_CHARS = 120
+# Entry fields the summary and detail HTML are rendered from
+HISTORY_VIEW_FIELDS = ("mode", "language", "full_code", "explanation", "prompt",
+                       "description", "code", "topic", "difficulty")
+
+
+def _shorten(text: str, limit: int = HISTORY_SUMMARY_CHARS) -> str:
+    text = " ".join(str(text).split())
+    return text[:limit] + "..." if len(text) > limit else text
+
+
+def _views_key(item: Dict[str, Any], formatter: CodeFormatter) -> str:
+    fields = [repr(item.get(field)) for field in HISTORY_VIEW_FIELDS]
+    return TextCache.key("\0".join(fields), formatter.style, formatter.linenos)
+
+
+def history_page(total: int, page: int, size: int) -> Tuple[int, int, int]:
+    """
+    Clamp `page` to the pages `total` entries fill and return
+    (page, pages, start). An empty history still has one (empty) page.
+    """
+    pages = max(1, -(-total // size))
+    page = min(max(page, 0), pages - 1)
+    return page, pages, page * size
+
+
+def ensure_history_views(item: Dict[str, Any], formatter: Optional[CodeFormatter] = None) -> Dict[str, Any]:
+    """
+    Rebuild an entry's precomputed views if they are missing or were rendered
+    from different content or a different code style, and return the entry.
+    """
+    formatter = formatter or CodeFormatter()
+    item.setdefault("id", uuid.uuid4().hex)
+    if "detail_html" not in item or item.get("views_key") != _views_key(item, formatter):
+        item.update(build_history_views(item, formatter))
+    return item
+
+
+def build_history_views(item: Dict[str, Any], formatter: Optional[CodeFormatter] = None) -> Dict[str, Any]:
+    """
+    Render an entry's one-line summary and its full detail HTML. Called once
+    when the entry is stored, so the history panel only has to print strings.
+    """
+    formatter = formatter or CodeFormatter()
+    mode = item.get("mode")
+    language = item.get("language", "Unknown")
+    if mode == "Explanation":
+        summary = _shorten(item.get("explanation", "") or item.get("full_code", ""))
+        detail = formatter.highlight_code(item["full_code"], language) if "full_code" in item else ""
+        detail += f"""
+        <div class="explanation-container">
+            {item.get('explanation', '')}
+        </div>
+        """
+    elif mode == "Generation":
+        prompt = item.get("prompt") or item.get("description", "")
+        summary = _shorten(prompt)
+        detail = f"""
+        <div style='padding: 12px 0; background: #f8f9ff; border-radius: 8px; padding: 16px; margin: 12px 0;'>
+            <strong>🎯 Prompt:</strong> {prompt}
+        </div>
+        """
+        if "code" in item:
+            detail += formatter.highlight_code(item["code"], language)
+    elif mode == "Learning":
+        summary = _shorten(f"{item.get('topic', '')} ({item.get('difficulty', '')})")
+        detail = f"""
+        <div style='padding: 12px 0; background: #f0fff0; border-radius: 8px; padding: 16px; margin: 12px 0;'>
+            <strong>📚 Topic:</strong> {item.get('topic', '')}<br>
+            <strong>📊 Difficulty:</strong> {item.get('difficulty', '')}
+        </div>
+        """
+    else:
+        summary, detail = "", ""
+    return {"summary": html.escape(summary), "detail_html": detail, "views_key": _views_key(item, formatter)}
 
 class StateManager:
     """
@@ -41,6 +122,10 @@ class StateManager:
             st.session_state.learn_session_id = ""
         if "learn_context" not in st.session_state:
             st.session_state.learn_context = []
+        
+        # Explain session lets the backend reuse explanations of unchanged code
+        if "explain_session_id" not in st.session_state:
+            st.session_state.explain_session_id = uuid.uuid4().hex
     
     @staticmethod
     def navigate_to(page: str):
@@ -62,12 +147,14 @@ class StateManager:
         # Add timestamp if not present
         if 'timestamp' not in data:
             data['timestamp'] = datetime.now().isoformat()
+        data.setdefault('id', uuid.uuid4().hex)
+        data.update(build_history_views(data))
                 
         st.session_state.history.append(data)
         
         # Cap history size to prevent memory issues
-        if len(st.session_state.history) > 50:
-            st.session_state.history = st.session_state.history[-50:]
+        if len(st.session_state.history) > HISTORY_MAX_ITEMS:
+            st.session_state.history = st.session_state.history[-HISTORY_MAX_ITEMS:]
     
     @staticmethod
     def get_provider_settings():